@@ -1,14 +1,48 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import Depends, FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from typing import Optional
-from app.utils.openai_client import get_openai_response
-from app.utils.file_handler import save_upload_file_temporarily
+from app.utils.openai_client import answer_question, get_fast_path_stats
+from app.utils.file_handler import save_upload_file_temporarily, save_upload_stream
+from app.utils.http_client import open_http_clients, close_http_clients
+from app.utils.executor import shutdown_executors
+from app.utils.prettier import close_prettier_daemon
+from app.utils.answer_cache import (
+    answer_cache,
+    is_cacheable,
+    make_cache_key,
+    track_answer_ttl,
+)
+from app.utils.tool_registry import TOOL_HANDLERS, call_tool
+from app.utils.semantic_router import semantic_router
+from app.utils.workspace import (
+    RequestWorkspace,
+    request_workspace,
+    start_workspace_sweeper,
+    stop_workspace_sweeper,
+)
 
 # Import the functions you want to test directly
 from app.utils.functions import *
 
-app = FastAPI(title="IITM Assignment API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Share pooled HTTP clients across requests so the AI Proxy and scraper
+    # connections are reused instead of re-handshaking on every call
+    await open_http_clients()
+    # Leftover scratch files are swept by age and against a disk quota
+    start_workspace_sweeper()
+    yield
+    await stop_workspace_sweeper()
+    await shutdown_executors()
+    close_prettier_daemon()
+    await close_http_clients()
+
+
+app = FastAPI(title="IITM Assignment API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -20,30 +54,89 @@ app.add_middleware(
 )
 
 
+async def cancel_on_disconnect(request: Request, awaitable, poll_interval: float = 1.0):
+    """
+    Await a solver, cancelling it if the client disconnects first
+
+    Cancellation reaches the solver's task, which kills any subprocess it is
+    running instead of leaving it to finish for nobody.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
 @app.post("/api/")
 async def process_question(
-    question: str = Form(...), file: Optional[UploadFile] = File(None)
+    request: Request,
+    question: str = Form(...),
+    file: Optional[UploadFile] = File(None),
+    workspace: RequestWorkspace = Depends(request_workspace),
 ):
     try:
         # Save file temporarily if provided
         temp_file_path = None
+        file_hash = None
         if file:
-            temp_file_path = await save_upload_file_temporarily(file)
-
-        # Get answer from OpenAI
-        answer = await get_openai_response(question, temp_file_path)
+            # The hash is computed while the upload streams to disk
+            upload = await save_upload_stream(file)
+            temp_file_path = upload.path
+            file_hash = upload.sha256
+
+        # Repeated question + attachment pairs are answered from the cache
+        cache_key = make_cache_key(question, file_hash)
+        cached_answer = await answer_cache.get_async(cache_key)
+        if cached_answer is not None:
+            return {"answer": cached_answer}
+
+        # Answer known templates locally, otherwise ask OpenAI
+        ttl_limits = track_answer_ttl()
+        answer = await cancel_on_disconnect(
+            request, answer_question(question, temp_file_path)
+        )
+
+        # Answers from time-varying tools are kept only as long as they allow
+        if is_cacheable(answer, temp_file_path):
+            await answer_cache.set_async(
+                cache_key, answer, ttl=min(ttl_limits, default=None)
+            )
 
         return {"answer": answer}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/debug/stats")
+async def debug_stats():
+    """
+    Hit rates of the fast-path router, semantic router and answer cache
+    """
+    return {
+        "fast_path": get_fast_path_stats(),
+        "semantic_router": semantic_router.stats(),
+        "answer_cache": answer_cache.stats(),
+    }
+
+
 # New endpoint for testing specific functions
 @app.post("/debug/{function_name}")
 async def debug_function(
+    request: Request,
     function_name: str,
     file: Optional[UploadFile] = File(None),
     params: str = Form("{}"),
+    workspace: RequestWorkspace = Depends(request_workspace),
 ):
     """
     Debug endpoint to test specific functions directly
@@ -67,8 +160,10 @@ async def debug_function(
             parameters["file_path"] = temp_file_path
 
         # Call the appropriate function based on function_name
-        if function_name == "analyze_sales_with_phonetic_clustering":
-            result = await analyze_sales_with_phonetic_clustering(**parameters)
+        if function_name in TOOL_HANDLERS:
+            result = await cancel_on_disconnect(
+                request, call_tool(function_name, parameters, temp_file_path)
+            )
             return {"result": result}
         elif function_name == "calculate_prettier_sha256":
             # For calculate_prettier_sha256, we need to pass the filename parameter
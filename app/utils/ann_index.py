@@ -0,0 +1,301 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.disk_cache import evict_lru, private_cache_dir
+from app.utils.similarity import normalize_rows
+
+# ANN index settings, overridable from the environment
+ANN_MIN_DOCS = int(os.getenv("ANN_MIN_DOCS", "20000"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+ANN_INDEX_DIR = os.getenv(
+    "ANN_INDEX_DIR", os.path.join(tempfile.gettempdir(), "iitm-api-cache", "ann")
+)
+ANN_INDEX_MAX_BYTES = int(os.getenv("ANN_INDEX_MAX_BYTES", str(1024**3)))
+ANN_INDEX_CACHE_SIZE = int(os.getenv("ANN_INDEX_CACHE_SIZE", "4"))
+
+# Bump when the on-disk layout changes
+_INDEX_VERSION = 1
+
+# Indexes opened or built recently, by corpus key
+_indexes: "OrderedDict[str, IVFFlatIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _kmeans(
+    unit: np.ndarray, n_lists: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    # Spherical k-means: assign by largest dot product, centroids are the
+    # normalised means of their members
+    centroids = unit[rng.choice(len(unit), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(unit @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, unit)
+        counts = np.bincount(assignment, minlength=n_lists)
+        # Empty lists restart from a random point instead of dying out
+        empty = counts == 0
+        sums[empty] = unit[rng.choice(len(unit), int(empty.sum()))]
+        centroids = normalize_rows(sums).astype(np.float32)
+    return centroids
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # Indices of the k best scores, best first
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file index over unit vectors for approximate cosine search
+
+    Vectors are clustered with k-means; each vector is stored in the list of
+    its nearest centroid, with the lists laid out contiguously. A query scores
+    the centroids, then only the vectors in its nprobe closest lists. nprobe is
+    the recall/latency knob: nprobe == n_lists is an exact search.
+
+    Usage:
+        index = IVFFlatIndex.build(doc_vectors)
+        index.save(path)
+        index = IVFFlatIndex.load(path)  # vectors memory-mapped
+        ids, scores = index.search(query_vector, k=3, nprobe=8)
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        offsets: np.ndarray,
+    ):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors,
+        n_lists: Optional[int] = None,
+        iterations: int = 10,
+        train_size: int = 100000,
+        seed: int = 0,
+    ) -> "IVFFlatIndex":
+        """
+        Cluster vectors and build the inverted lists
+
+        Args:
+            vectors: n x d embeddings
+            n_lists: Number of clusters (default: about sqrt(n))
+            iterations: k-means iterations
+            train_size: Most vectors k-means is trained on
+            seed: Random seed, for reproducible indexes
+
+        Returns:
+            The index; ids in search results are row numbers of vectors
+        """
+        unit = normalize_rows(vectors).astype(np.float32)
+        n = len(unit)
+        if n == 0:
+            raise ValueError("Cannot index an empty set of vectors")
+        n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+
+        rng = np.random.default_rng(seed)
+        sample = unit
+        if n > train_size:
+            sample = unit[rng.choice(n, train_size, replace=False)]
+        centroids = _kmeans(sample, n_lists, iterations, rng)
+
+        # Assign in blocks so the n x n_lists score matrix stays small
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 8192):
+            block = unit[start : start + 8192] @ centroids.T
+            assignment[start : start + 8192] = np.argmax(block, axis=1)
+
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(centroids, unit[order], order.astype(np.int64), offsets)
+
+    def search(
+        self, query, k: int = 3, nprobe: int = ANN_NPROBE
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k vectors most similar to query
+
+        Args:
+            query: d-dimensional query embedding
+            k: Number of results
+            nprobe: Lists to scan; higher is slower and more accurate
+
+        Returns:
+            (ids, cosine similarities), best first
+        """
+        q = normalize_rows([query])[0].astype(np.float32)
+        lists = _top_k(self.centroids @ q, min(nprobe, self.n_lists))
+
+        # Gather the probed lists; slices of the (possibly mmapped) matrix
+        ranges = [(self.offsets[c], self.offsets[c + 1]) for c in lists]
+        rows = np.concatenate([np.arange(a, b) for a, b in ranges])
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = np.concatenate([self.vectors[a:b] @ q for a, b in ranges])
+        best = _top_k(scores, k)
+        return self.ids[rows[best]], scores[best]
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to a directory atomically
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=parent)
+        try:
+            for name in ("centroids", "vectors", "ids", "offsets"):
+                np.save(os.path.join(staging, f"{name}.npy"), getattr(self, name))
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump({"version": _INDEX_VERSION}, f)
+            os.rename(staging, path)
+        except OSError:
+            # Another worker may have saved the same index first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IVFFlatIndex":
+        """
+        Open a saved index; with mmap the vectors are paged in on demand
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            if json.load(f).get("version") != _INDEX_VERSION:
+                raise ValueError(f"Unsupported index version in {path}")
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+            for name in ("centroids", "vectors", "ids", "offsets")
+        }
+        return cls(**arrays)
+
+
+def _remember(key: str, index: IVFFlatIndex) -> None:
+    with _lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > ANN_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+
+
+def find_index(key: str, index_dir: str = ANN_INDEX_DIR) -> Optional[IVFFlatIndex]:
+    """
+    Return the index saved under key, from memory or disk, or None
+
+    Args:
+        key: Corpus key, e.g. EmbeddingBackend.corpus_key(docs); it depends on
+            the documents and the backend only, so every query against the
+            same documents finds the same index
+        index_dir: Directory indexes are saved in
+    """
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    path = os.path.join(index_dir, f"{key}-v{_INDEX_VERSION}")
+    if not os.path.isdir(path):
+        return None
+    try:
+        # Only trust indexes in a directory no other user can write to
+        private_cache_dir(index_dir)
+    except OSError as e:
+        print(f"Ignoring saved ANN indexes: {e}")
+        return None
+    try:
+        index = IVFFlatIndex.load(path)
+    except (OSError, ValueError):
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+    # Mark the entry as recently used for the size-based eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    _remember(key, index)
+    return index
+
+
+def build_index(key: str, vectors, index_dir: str = ANN_INDEX_DIR) -> IVFFlatIndex:
+    """
+    Build the index for a corpus and save it under key
+
+    The saved indexes are kept within ANN_INDEX_MAX_BYTES, least recently used
+    first out.
+    """
+    index = IVFFlatIndex.build(vectors)
+    _remember(key, index)
+    try:
+        private_cache_dir(index_dir)
+        index.save(os.path.join(index_dir, f"{key}-v{_INDEX_VERSION}"))
+        evict_lru(index_dir, ANN_INDEX_MAX_BYTES)
+    except OSError as e:
+        print(f"Could not save ANN index: {e}")
+    return index
+
+
+def _benchmark(n: int = 50000, dim: int = 128, queries: int = 200) -> List[dict]:
+    import time
+
+    # Clustered synthetic corpus, like embeddings of documents on a few topics
+    rng = np.random.default_rng(42)
+    topics = rng.normal(size=(200, dim))
+    docs = topics[rng.integers(0, len(topics), n)] + 0.6 * rng.normal(size=(n, dim))
+    docs = normalize_rows(docs).astype(np.float32)
+    probes = docs[rng.choice(n, queries)] + 0.3 * rng.normal(size=(queries, dim))
+
+    started = time.perf_counter()
+    unit_probes = normalize_rows(probes).astype(np.float32)
+    exact = [set(_top_k(docs @ q, 3).tolist()) for q in unit_probes]
+    exact_qps = queries / (time.perf_counter() - started)
+    rows = [{"method": "exact", "recall@3": 1.0, "qps": round(exact_qps)}]
+
+    started = time.perf_counter()
+    index = IVFFlatIndex.build(docs)
+    build_seconds = time.perf_counter() - started
+    for nprobe in (1, 2, 4, 8, 16, 32):
+        started = time.perf_counter()
+        found = [set(index.search(q, 3, nprobe)[0].tolist()) for q in probes]
+        qps = queries / (time.perf_counter() - started)
+        recall = np.mean([len(f & e) / 3 for f, e in zip(found, exact)])
+        rows.append(
+            {
+                "method": f"ivf nprobe={nprobe}/{index.n_lists}",
+                "recall@3": round(float(recall), 3),
+                "qps": round(qps),
+                "build_seconds": round(build_seconds, 2),
+            }
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    for row in _benchmark():
+        print(row)
@@ -0,0 +1,221 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from app.utils.workspace import WORKSPACE_ROOT
+
+# Cache settings, overridable from the environment
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 60 * 60)))
+ANSWER_CACHE_DB = os.getenv("ANSWER_CACHE_DB")  # e.g. /var/cache/iitm/answers.db
+
+
+# TTL limits of the solvers that ran for the current request. Tool calls run in
+# child tasks with a copy of the context, so they append to the request's list.
+_ttl_limits: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar(
+    "answer_ttl_limits", default=None
+)
+
+
+def track_answer_ttl() -> List[float]:
+    """
+    Start collecting the cache TTL limits of the tools answering this request
+
+    Returns:
+        The list record_answer_ttl appends to; min() of it is the TTL the
+        answer may be cached for, an empty list means the default
+    """
+    limits: List[float] = []
+    _ttl_limits.set(limits)
+    return limits
+
+
+def record_answer_ttl(ttl: Optional[float]) -> None:
+    """
+    Limit how long the current request's answer may be cached (None: no limit)
+    """
+    limits = _ttl_limits.get()
+    if ttl is not None and limits is not None:
+        limits.append(ttl)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Collapse whitespace so that re-pasted copies of a question hash the same
+    """
+    return " ".join(question.split())
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Hash a file in fixed-size chunks without loading it into memory
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(question: str, file_hash: Optional[str] = None) -> str:
+    """
+    Build a content-addressed key from the question and the uploaded file's hash
+    """
+    digest = hashlib.sha256(normalize_question(question).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((file_hash or "").encode("ascii"))
+    return digest.hexdigest()
+
+
+# Reply used when the model returned neither content nor a tool call; it is a
+# failure, not an answer, so it must not be cached
+NO_ANSWER = "No answer could be generated."
+
+
+def is_cacheable(answer: Any, file_path: Optional[str] = None) -> bool:
+    """
+    Only cache real answers: no errors, and nothing pointing into a temp directory
+    that will be gone by the next request
+    """
+    if answer is None or answer == NO_ANSWER:
+        return False
+    text = answer if isinstance(answer, str) else json.dumps(answer, default=str)
+    if text.lstrip().startswith("Error"):
+        return False
+    if file_path and os.path.dirname(file_path) in text:
+        return False
+    if WORKSPACE_ROOT in text:
+        return False
+    return True
+
+
+class AnswerCache:
+    """
+    In-memory LRU cache with a TTL, optionally backed by a SQLite file so that
+    answers survive restarts and are shared between workers on the same host
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        db_path: Optional[str] = ANSWER_CACHE_DB,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers "
+                "(key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS answers_expiry ON answers (expires_at)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the cached answer for the key, or None on a miss or expiry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                answer, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return answer
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT answer, expires_at FROM answers WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    answer = json.loads(row[0])
+                    self._remember(key, answer, row[1])
+                    self.hits += 1
+                    return answer
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, answer: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store an answer under the key
+
+        Args:
+            key: Cache key from make_cache_key
+            answer: The answer to store
+            ttl: Seconds to keep it instead of the cache's TTL; 0 or less
+                leaves the answer uncached
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, answer, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers (key, answer, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(answer, default=str), expires_at),
+                )
+                self._db.execute(
+                    "DELETE FROM answers WHERE expires_at <= ?", (time.time(),)
+                )
+                self._db.commit()
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """
+        get() for the event loop; SQLite lookups run on a worker thread
+        """
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, answer: Any, ttl: Optional[float] = None):
+        """
+        set() for the event loop; SQLite writes and commits run on a worker thread
+        """
+        if self._db is None:
+            return self.set(key, answer, ttl)
+        return await asyncio.to_thread(self.set, key, answer, ttl)
+
+    def _remember(self, key: str, answer: Any, expires_at: float) -> None:
+        self._entries[key] = (answer, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters for monitoring
+        """
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Shared cache used by the /api/ endpoint
+answer_cache = AnswerCache()
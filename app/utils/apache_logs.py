@@ -0,0 +1,670 @@
+import io
+import os
+import re
+import gzip
+import json
+import shutil
+import calendar
+import tempfile
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.answer_cache import file_sha256
+from app.utils.calendars import weekday_of_days
+from app.utils.disk_cache import evict_lru, private_cache_dir
+from app.utils.executor import get_process_pool
+
+# Parsed-log cache settings, overridable from the environment
+LOG_CACHE_DIR = os.getenv(
+    "LOG_CACHE_DIR", os.path.join(tempfile.gettempdir(), "iitm-api-cache", "logs")
+)
+LOG_CACHE_MAX_BYTES = int(os.getenv("LOG_CACHE_MAX_BYTES", str(4 * 1024**3)))
+
+# Parallel parsing settings, overridable from the environment
+LOG_PARSE_WORKERS = int(os.getenv("LOG_PARSE_WORKERS", str(os.cpu_count() or 1)))
+LOG_PARSE_CHUNK_BYTES = int(os.getenv("LOG_PARSE_CHUNK_BYTES", str(32 * 1024**2)))
+
+# Leading fields of a combined-format line: IP, logname, user, [time], "request",
+# status and size. Quoted fields may contain backslash-escaped quotes.
+_LINE_RE = re.compile(r'(\S*) \S* \S* \[([^\]]*)\] "((?:[^"\\]|\\.)*)" (\S*) (\S*)')
+
+# Trailing quoted fields, only parsed when a query asks for them
+_TAIL_RE = re.compile(r' "((?:[^"\\]|\\.)*)" "((?:[^"\\]|\\.)*)"')
+
+_MONTHS = {name: num for num, name in enumerate(calendar.month_abbr) if name}
+
+
+def _status_code(raw: str) -> int:
+    # Lines with a "-" or otherwise unusable status are kept rather than
+    # counted as errors; 0 never matches a status range
+    code = int(raw) if raw.isdigit() else 0
+    return code if code <= 0xFFFF else 0
+
+
+# Fields a query can ask for; anything else on the line is skipped
+ALL_FIELDS = frozenset(
+    ["ip", "time", "method", "url", "status", "size", "referer", "user_agent"]
+)
+
+SECONDS_PER_DAY = 86400
+
+
+class LogRecord(NamedTuple):
+    """
+    The fields of one log line that a query asked for; the rest are None
+
+    time is the wall-clock time in the requested timezone (or the log's own
+    timezone) as seconds since 1970-01-01 00:00, so day, hour and weekday are
+    plain integer arithmetic.
+    """
+
+    ip: Optional[str]
+    time: Optional[int]
+    method: Optional[str]
+    url: Optional[str]
+    status: Optional[int]
+    size: Optional[int]
+    referer: Optional[str]
+    user_agent: Optional[str]
+
+
+@lru_cache(maxsize=4096)
+def _day_number(date_prefix: str) -> int:
+    # "01/May/2024" -> days since 1970-01-01, computed once per distinct date
+    day, month, year = date_prefix.split("/")
+    return (
+        calendar.timegm((int(year), _MONTHS[month], int(day), 0, 0, 0))
+        // SECONDS_PER_DAY
+    )
+
+
+@lru_cache(maxsize=64)
+def parse_tz_offset(offset: str) -> int:
+    """
+    Convert an offset like '+0530' or '-0500' to minutes east of UTC
+    """
+    sign = -1 if offset[0] == "-" else 1
+    return sign * (int(offset[1:3]) * 60 + int(offset[3:5]))
+
+
+def parse_log_time(time_str: str) -> tuple:
+    """
+    Parse '01/May/2024:00:00:01 -0500' into (wall-clock seconds, tz minutes)
+
+    Raises:
+        ValueError: if the timestamp is malformed
+    """
+    try:
+        seconds = (
+            _day_number(time_str[:11]) * SECONDS_PER_DAY
+            + int(time_str[12:14]) * 3600
+            + int(time_str[15:17]) * 60
+            + int(time_str[18:20])
+        )
+        return seconds, parse_tz_offset(time_str[21:26])
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Invalid log timestamp: {time_str}") from e
+
+
+def day_number(seconds: int) -> int:
+    """
+    Days since 1970-01-01 of a wall-clock time
+    """
+    return seconds // SECONDS_PER_DAY
+
+
+def hour_of_day(seconds: int) -> int:
+    return (seconds % SECONDS_PER_DAY) // 3600
+
+
+def weekday(seconds: int) -> int:
+    """
+    Monday is 0 and Sunday is 6, as in datetime.weekday()
+    """
+    return weekday_of_days(seconds // SECONDS_PER_DAY)
+
+
+def open_log(file_path: str):
+    """
+    Open a plain or gzipped log as text, replacing undecodable bytes
+    """
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, "rt", encoding="utf-8", errors="replace")
+    return open(file_path, "r", encoding="utf-8", errors="replace")
+
+
+class LogParser:
+    """
+    Single-pass parser shared by the Apache log analysers
+
+    Each line is matched once against a precompiled pattern, timestamps are
+    converted with a per-date cache instead of building datetime objects, and
+    only the requested fields are decoded. Lines that cannot be parsed are
+    counted in `errors` and skipped.
+
+    Usage:
+        parser = LogParser(fields={"ip", "url", "size"})
+        for record in parser.parse(file_path):
+            ...
+        print(parser.total, parser.errors)
+    """
+
+    def __init__(
+        self,
+        fields: Iterable[str] = ALL_FIELDS,
+        timezone_offset: Optional[str] = None,
+    ):
+        self.fields = frozenset(fields)
+        unknown = self.fields - ALL_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown log fields: {', '.join(sorted(unknown))}")
+        self.target_tz = parse_tz_offset(timezone_offset) if timezone_offset else None
+        self.total = 0
+        self.errors = 0
+
+    def parse_line(self, line: str) -> Optional[LogRecord]:
+        """
+        Parse one line, returning None when it is malformed
+        """
+        match = _LINE_RE.match(line)
+        if not match:
+            return None
+        fields = self.fields
+
+        time = None
+        if "time" in fields:
+            try:
+                time, log_tz = parse_log_time(match.group(2))
+            except ValueError:
+                return None
+            # Shift to the requested timezone's wall clock
+            if self.target_tz is not None and self.target_tz != log_tz:
+                time += (self.target_tz - log_tz) * 60
+
+        method = url = None
+        if "method" in fields or "url" in fields:
+            parts = match.group(3).split()
+            if len(parts) < 2:
+                return None
+            method, url = parts[0], parts[1]
+
+        status = None
+        if "status" in fields:
+            status = _status_code(match.group(4))
+
+        size = None
+        if "size" in fields:
+            raw_size = match.group(5)
+            size = int(raw_size) if raw_size.isdigit() else 0
+
+        referer = user_agent = None
+        if "referer" in fields or "user_agent" in fields:
+            tail = _TAIL_RE.match(line, match.end())
+            if tail:
+                referer, user_agent = tail.groups()
+
+        return LogRecord(
+            match.group(1) if "ip" in fields else None,
+            time,
+            method,
+            url,
+            status,
+            size,
+            referer,
+            user_agent,
+        )
+
+    def parse_lines(self, lines: Iterable[str]) -> Iterator[LogRecord]:
+        """
+        Parse an iterable of lines, counting totals and errors as it goes
+        """
+        parse_line = self.parse_line
+        for line in lines:
+            self.total += 1
+            record = parse_line(line)
+            if record is None:
+                self.errors += 1
+                continue
+            yield record
+
+    def parse(self, file_path: str) -> Iterator[LogRecord]:
+        """
+        Parse a plain or gzipped log file
+        """
+        with open_log(file_path) as f:
+            yield from self.parse_lines(f)
+
+
+@dataclass
+class LogColumns:
+    """
+    A whole log parsed once into NumPy columns, so every filter is a vectorised
+    mask instead of a Python loop over lines
+
+    Times are stored as UTC epoch seconds plus each line's own offset, so any
+    timezone's wall clock can be derived without re-parsing. Method, URL and IP
+    are categorical: small integer codes into a table of distinct values, which
+    lets string predicates run once per distinct value.
+    """
+
+    utc: np.ndarray  # int64 epoch seconds
+    tz: np.ndarray  # int16 minutes east of UTC
+    status: np.ndarray  # uint16, "-" and other non-numeric values stored as 0
+    size: np.ndarray  # int64 bytes, "-" stored as 0
+    method_codes: np.ndarray  # int32 codes into methods
+    url_codes: np.ndarray  # int32 codes into urls
+    ip_codes: np.ndarray  # int32 codes into ips
+    methods: List[str]
+    urls: List[str]
+    ips: List[str]
+    total: int = 0
+    errors: int = 0
+
+    def __len__(self) -> int:
+        return len(self.utc)
+
+    def local_time(self, timezone_offset: Optional[str] = None) -> np.ndarray:
+        """
+        Wall-clock seconds in the given timezone, or in each line's own timezone
+        """
+        offset = parse_tz_offset(timezone_offset) if timezone_offset else self.tz
+        return self.utc + np.asarray(offset, dtype=np.int64) * 60
+
+    def url_mask(self, section_path: str, prefix: bool = False) -> np.ndarray:
+        """
+        Rows whose URL contains (or, with prefix=True, starts with) section_path
+        """
+        if prefix:
+            matches = [url.startswith(section_path) for url in self.urls]
+        else:
+            matches = [section_path in url for url in self.urls]
+        return np.array(matches, dtype=bool)[self.url_codes]
+
+    def method_mask(self, method: str) -> np.ndarray:
+        method = method.upper()
+        matches = [m.upper() == method for m in self.methods]
+        return np.array(matches, dtype=bool)[self.method_codes]
+
+    def filter(
+        self,
+        section_path: Optional[str] = None,
+        section_prefix: bool = False,
+        weekday: Optional[int] = None,
+        start_hour: Optional[int] = None,
+        end_hour: Optional[int] = None,
+        day: Optional[int] = None,
+        method: Optional[str] = None,
+        status_range: Optional[Sequence[int]] = None,
+        timezone_offset: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Boolean mask of the rows matching every given predicate
+
+        Args:
+            section_path: URL section to match
+            section_prefix: Match section_path as a prefix instead of a substring
+            weekday: Day of week, Monday is 0
+            start_hour: First hour of the window (inclusive)
+            end_hour: End of the window (exclusive)
+            day: Day number since 1970-01-01
+            method: HTTP method, case-insensitive
+            status_range: Inclusive (min, max) status codes
+            timezone_offset: Timezone whose wall clock the time filters use
+
+        Returns:
+            Boolean array with one entry per parsed line
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if section_path:
+            mask &= self.url_mask(section_path, section_prefix)
+        if method:
+            mask &= self.method_mask(method)
+        if status_range:
+            mask &= (self.status >= status_range[0]) & (self.status <= status_range[1])
+
+        if (
+            weekday is not None
+            or start_hour is not None
+            or end_hour is not None
+            or (day is not None)
+        ):
+            local = self.local_time(timezone_offset)
+            days = local // SECONDS_PER_DAY
+            if weekday is not None:
+                mask &= weekday_of_days(days) == weekday
+            if day is not None:
+                mask &= days == day
+            if start_hour is not None or end_hour is not None:
+                hours = (local % SECONDS_PER_DAY) // 3600
+                if start_hour is not None:
+                    mask &= hours >= start_hour
+                if end_hour is not None:
+                    mask &= hours < end_hour
+        return mask
+
+    def bytes_by_ip(self, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Group the masked rows by IP
+
+        Returns:
+            (total bytes, request count) arrays indexed by IP code
+        """
+        codes = self.ip_codes[mask]
+        count = np.bincount(codes, minlength=len(self.ips))
+        total = np.zeros(len(self.ips), dtype=np.int64)
+        np.add.at(total, codes, self.size[mask])
+        return total, count
+
+
+class _Categories:
+    # Incrementally assigns integer codes to distinct strings
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def parse_columns(lines: Iterable[str]) -> LogColumns:
+    """
+    Parse lines into a LogColumns table
+
+    Numeric columns are accumulated in compact typed arrays rather than lists of
+    Python ints, so memory stays close to the final NumPy size.
+    """
+    utc, tz = array("q"), array("h")
+    status, size = array("H"), array("q")
+    method_codes, url_codes, ip_codes = array("i"), array("i"), array("i")
+    methods, urls, ips = _Categories(), _Categories(), _Categories()
+    total = errors = 0
+
+    for line in lines:
+        total += 1
+        match = _LINE_RE.match(line)
+        if not match:
+            errors += 1
+            continue
+        ip, time_str, request, raw_status, raw_size = match.groups()
+        parts = request.split()
+        if len(parts) < 2:
+            errors += 1
+            continue
+        try:
+            wall, offset = parse_log_time(time_str)
+        except ValueError:
+            errors += 1
+            continue
+        code = _status_code(raw_status)
+
+        utc.append(wall - offset * 60)
+        tz.append(offset)
+        status.append(code)
+        size.append(int(raw_size) if raw_size.isdigit() else 0)
+        method_codes.append(methods.code(parts[0]))
+        url_codes.append(urls.code(parts[1]))
+        ip_codes.append(ips.code(ip))
+
+    return LogColumns(
+        utc=np.frombuffer(utc, dtype=np.int64).copy(),
+        tz=np.frombuffer(tz, dtype=np.int16).copy(),
+        status=np.frombuffer(status, dtype=np.uint16).copy(),
+        size=np.frombuffer(size, dtype=np.int64).copy(),
+        method_codes=np.frombuffer(method_codes, dtype=np.int32).copy(),
+        url_codes=np.frombuffer(url_codes, dtype=np.int32).copy(),
+        ip_codes=np.frombuffer(ip_codes, dtype=np.int32).copy(),
+        methods=methods.values,
+        urls=urls.values,
+        ips=ips.values,
+        total=total,
+        errors=errors,
+    )
+
+
+def merge_columns(parts: Sequence[LogColumns]) -> LogColumns:
+    """
+    Concatenate columns parsed from consecutive chunks of one log
+
+    Each chunk numbers its categories independently, so codes are remapped onto
+    merged category tables before the arrays are joined.
+    """
+    if len(parts) == 1:
+        return parts[0]
+
+    merged = {}
+    for codes_name, values_name in (
+        ("method_codes", "methods"),
+        ("url_codes", "urls"),
+        ("ip_codes", "ips"),
+    ):
+        categories = _Categories()
+        remapped = []
+        for part in parts:
+            mapping = np.fromiter(
+                (categories.code(value) for value in getattr(part, values_name)),
+                dtype=np.int32,
+                count=len(getattr(part, values_name)),
+            )
+            remapped.append(mapping[getattr(part, codes_name)])
+        merged[codes_name] = np.concatenate(remapped)
+        merged[values_name] = categories.values
+
+    for name in ("utc", "tz", "status", "size"):
+        merged[name] = np.concatenate([getattr(part, name) for part in parts])
+
+    return LogColumns(
+        **merged,
+        total=sum(part.total for part in parts),
+        errors=sum(part.errors for part in parts),
+    )
+
+
+def _parse_bytes(data: bytes) -> LogColumns:
+    # Universal newlines, as when the file is opened in text mode
+    text = io.StringIO(data.decode("utf-8", errors="replace"), newline=None)
+    return parse_columns(text)
+
+
+def _parse_byte_range(file_path: str, start: int, end: int) -> LogColumns:
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        return _parse_bytes(f.read(end - start))
+
+
+def _line_aligned_ranges(file_path: str, chunk_bytes: int) -> List[Tuple[int, int]]:
+    # Split the file into ranges of about chunk_bytes that end just after a newline
+    size = os.path.getsize(file_path)
+    ranges = []
+    with open(file_path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_log_file(
+    file_path: str,
+    workers: int = LOG_PARSE_WORKERS,
+    chunk_bytes: int = LOG_PARSE_CHUNK_BYTES,
+) -> LogColumns:
+    """
+    Parse a log file into columns, spreading the regex work over CPU cores
+
+    Plain files are split into newline-aligned byte ranges that worker
+    processes read and parse independently. Gzip streams cannot be seeked, so
+    they are decompressed here in line-aligned blocks that are handed to the
+    workers as they are produced, keeping at most two blocks per worker in
+    flight. Small files, or workers=1, are parsed in this process.
+
+    Args:
+        file_path: Path to the plain or gzipped log file
+        workers: Worker processes to use
+        chunk_bytes: Approximate uncompressed bytes per chunk
+
+    Returns:
+        The merged LogColumns, in file order
+    """
+    gzipped = file_path.endswith(".gz")
+    if workers <= 1 or (not gzipped and os.path.getsize(file_path) <= chunk_bytes):
+        with open_log(file_path) as f:
+            return parse_columns(f)
+
+    pool = get_process_pool()
+    if not gzipped:
+        futures = [
+            pool.submit(_parse_byte_range, file_path, start, end)
+            for start, end in _line_aligned_ranges(file_path, chunk_bytes)
+        ]
+        return merge_columns([future.result() for future in futures])
+
+    parts = []
+    pending = deque()
+    with gzip.open(file_path, "rb") as f:
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block += f.readline()
+            pending.append(pool.submit(_parse_bytes, block))
+            if len(pending) >= 2 * workers:
+                parts.append(pending.popleft().result())
+    parts.extend(future.result() for future in pending)
+    if not parts:
+        return _parse_bytes(b"")
+    return merge_columns(parts)
+
+
+# Array columns of LogColumns, each saved as its own .npy file
+_ARRAY_COLUMNS = (
+    "utc",
+    "tz",
+    "status",
+    "size",
+    "method_codes",
+    "url_codes",
+    "ip_codes",
+)
+
+# Bump when the on-disk layout or the parsing rules change
+_CACHE_VERSION = 2
+
+
+def _cache_path(file_hash: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{file_hash}-v{_CACHE_VERSION}")
+
+
+def save_log_columns(columns: LogColumns, path: str) -> None:
+    """
+    Write columns to a cache directory atomically: readers either see the
+    complete entry or none at all
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=parent)
+    try:
+        for name in _ARRAY_COLUMNS:
+            np.save(os.path.join(staging, f"{name}.npy"), getattr(columns, name))
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "methods": columns.methods,
+                    "urls": columns.urls,
+                    "ips": columns.ips,
+                    "total": columns.total,
+                    "errors": columns.errors,
+                },
+                f,
+            )
+        os.rename(staging, path)
+    except OSError:
+        # Another worker may have won the race; its entry is just as good
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+
+def open_log_columns(path: str) -> LogColumns:
+    """
+    Open cached columns with every array memory-mapped read-only
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in _ARRAY_COLUMNS
+    }
+    # Mark the entry as recently used for the size-based eviction
+    os.utime(path)
+    return LogColumns(**arrays, **meta)
+
+
+def evict_log_cache(
+    cache_dir: str = LOG_CACHE_DIR, max_bytes: int = LOG_CACHE_MAX_BYTES
+) -> int:
+    """
+    Remove the least recently used entries until the cache fits in max_bytes
+
+    Returns:
+        Number of entries removed
+    """
+    return evict_lru(cache_dir, max_bytes)
+
+
+def load_log_columns(
+    file_path: str, use_cache: bool = True, cache_dir: str = LOG_CACHE_DIR
+) -> LogColumns:
+    """
+    Parse a plain or gzipped log file into columns, reusing an earlier parse
+    of the same content when there is one
+
+    Parsed columns are cached on disk keyed by the file's SHA-256, so the same
+    log uploaded again with a different question skips parsing entirely and
+    only memory-maps the arrays.
+
+    Args:
+        file_path: Path to the log file
+        use_cache: Read and populate the on-disk cache
+        cache_dir: Cache directory
+
+    Returns:
+        LogColumns, memory-mapped when served from the cache
+    """
+    if use_cache:
+        # The default directory is in the shared temp dir, where another user
+        # could plant entries keyed by a known file hash
+        try:
+            private_cache_dir(cache_dir)
+        except OSError as e:
+            print(f"Log cache disabled: {e}")
+            use_cache = False
+    if not use_cache:
+        return parse_log_file(file_path)
+
+    path = _cache_path(file_sha256(file_path), cache_dir)
+    if os.path.isdir(path):
+        try:
+            return open_log_columns(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            # Damaged entry: drop it and parse again
+            shutil.rmtree(path, ignore_errors=True)
+
+    columns = parse_log_file(file_path)
+    try:
+        save_log_columns(columns, path)
+        evict_log_cache(cache_dir)
+    except OSError as e:
+        print(f"Could not cache parsed log {file_path}: {e}")
+    return columns
@@ -0,0 +1,145 @@
+import io
+import zipfile
+import posixpath
+from dataclasses import dataclass
+from typing import IO, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ArchiveMember:
+    """
+    One entry of a zip archive, as recorded in its central directory
+    """
+
+    name: str
+    size: int
+    compress_size: int
+    is_dir: bool
+
+    @property
+    def basename(self) -> str:
+        return posixpath.basename(self.name.rstrip("/"))
+
+    @property
+    def parent(self) -> str:
+        return posixpath.dirname(self.name.rstrip("/"))
+
+
+@dataclass(frozen=True)
+class ArchiveIndex:
+    """
+    Member listing of an archive, read from its central directory
+    """
+
+    members: Tuple[ArchiveMember, ...]
+
+    def files(self) -> List[ArchiveMember]:
+        return [m for m in self.members if not m.is_dir]
+
+    def directories(self) -> List[str]:
+        """
+        Every directory in the archive, including ones only implied by member paths
+        """
+        dirs = set()
+        for member in self.members:
+            path = member.name.rstrip("/") if member.is_dir else member.parent
+            while path:
+                dirs.add(path)
+                path = posixpath.dirname(path)
+        return sorted(dirs)
+
+
+def _build_index(zip_file: zipfile.ZipFile) -> ArchiveIndex:
+    members = tuple(
+        ArchiveMember(
+            name=info.filename,
+            size=info.file_size,
+            compress_size=info.compress_size,
+            is_dir=info.is_dir(),
+        )
+        for info in zip_file.infolist()
+    )
+    return ArchiveIndex(members=members)
+
+
+class ZipArchive:
+    """
+    Read-only view of a zip archive that never extracts to disk
+
+    The member index comes from the central directory zipfile already reads on
+    open, and members are only decompressed when a caller opens them, streaming
+    straight into whatever reads them (pandas, csv, a text decoder).
+
+    Usage:
+        with ZipArchive(file_path) as archive:
+            for member in archive.find(suffix=".csv"):
+                df = archive.read_csv(member.name)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "r")
+
+        self.index = _build_index(self._zip)
+
+    def __enter__(self) -> "ZipArchive":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def find(
+        self,
+        name: Optional[str] = None,
+        suffix: Optional[str] = None,
+        top_level: bool = False,
+    ) -> List[ArchiveMember]:
+        """
+        Select file members by exact base name and/or suffix
+
+        Args:
+            name: Base name the member must have, e.g. "a.txt"
+            suffix: Ending the member name must have, e.g. ".csv"
+            top_level: Only consider members at the archive root
+
+        Returns:
+            Matching members in archive order
+        """
+        matches = []
+        for member in self.index.files():
+            if top_level and member.parent:
+                continue
+            if name is not None and member.basename != name:
+                continue
+            if suffix is not None and not member.name.endswith(suffix):
+                continue
+            matches.append(member)
+        return matches
+
+    def open(self, name: str) -> IO[bytes]:
+        """
+        Open a member as a binary stream, decompressed on the fly
+        """
+        return self._zip.open(name, "r")
+
+    def open_text(self, name: str, encoding: Optional[str] = None) -> IO[str]:
+        """
+        Open a member as text with universal newlines, like open(path, "r")
+        """
+        return io.TextIOWrapper(self.open(name), encoding=encoding)
+
+    def read_text(self, name: str, encoding: Optional[str] = None) -> str:
+        with self.open_text(name, encoding) as f:
+            return f.read()
+
+    def read_csv(self, name: str, **kwargs):
+        """
+        Parse a member with pandas.read_csv without writing it to disk
+        """
+        import pandas as pd
+
+        with self.open(name) as f:
+            return pd.read_csv(f, **kwargs)
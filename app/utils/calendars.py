@@ -0,0 +1,139 @@
+from datetime import date, datetime
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+
+WEEKDAYS = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+
+# Full names and three-letter abbreviations, lower-cased
+_WEEKDAY_NUMBERS = {name.lower(): i for i, name in enumerate(WEEKDAYS)}
+_WEEKDAY_NUMBERS.update({name[:3].lower(): i for i, name in enumerate(WEEKDAYS)})
+
+DateLike = Union[str, date, datetime, np.datetime64]
+
+
+def parse_weekday(day: Union[str, int]) -> int:
+    """
+    Weekday number of a day name, Monday is 0 and Sunday is 6
+
+    Accepts full names or three-letter abbreviations in any case, or an
+    already numeric weekday.
+
+    Raises:
+        ValueError: not a day of the week
+    """
+    if isinstance(day, (int, np.integer)) and 0 <= day <= 6:
+        return int(day)
+    number = _WEEKDAY_NUMBERS.get(str(day).strip().lower())
+    if number is None:
+        raise ValueError(f"Invalid day of week: {day}")
+    return number
+
+
+def weekday_of_days(days):
+    """
+    Weekday of a day number (days since 1970-01-01, a Thursday)
+
+    Works on ints and on NumPy arrays alike, so the same arithmetic serves a
+    single timestamp and a whole column of them.
+    """
+    return (days + 3) % 7
+
+
+def to_date(value: DateLike) -> date:
+    """
+    A date from an ISO string (YYYY-MM-DD), date, datetime or datetime64
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, np.datetime64):
+        return value.astype("datetime64[D]").astype(date)
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _weekday_set(weekdays: Union[str, int, Iterable]) -> frozenset:
+    if isinstance(weekdays, (str, int, np.integer)):
+        weekdays = [weekdays]
+    return frozenset(parse_weekday(day) for day in weekdays)
+
+
+def count_weekdays(
+    start: DateLike,
+    end: DateLike,
+    weekdays: Union[str, int, Iterable] = WEEKDAYS,
+    holidays: Iterable[DateLike] = (),
+) -> int:
+    """
+    Count the days from start to end (both inclusive) falling on the given
+    weekdays, in constant time
+
+    The range is split into whole weeks, each containing every weekday once,
+    plus a remainder of fewer than seven days that is checked directly.
+    Holidays on a counted weekday inside the range are then subtracted.
+
+    Args:
+        start: First day of the range
+        end: Last day of the range
+        weekdays: Day names or numbers to count (Monday is 0)
+        holidays: Days that do not count
+
+    Returns:
+        Number of matching days; 0 if end is before start
+    """
+    start, end = to_date(start), to_date(end)
+    wanted = _weekday_set(weekdays)
+    total_days = (end - start).days + 1
+    if total_days <= 0 or not wanted:
+        return 0
+
+    full_weeks, remainder = divmod(total_days, 7)
+    first = start.weekday()
+    count = full_weeks * len(wanted)
+    count += sum((first + i) % 7 in wanted for i in range(remainder))
+
+    for holiday in {to_date(h) for h in holidays}:
+        if start <= holiday <= end and holiday.weekday() in wanted:
+            count -= 1
+    return count
+
+
+def count_weekdays_batch(
+    starts: Sequence[DateLike],
+    ends: Sequence[DateLike],
+    weekdays: Union[str, int, Iterable] = WEEKDAYS,
+    holidays: Optional[Iterable[DateLike]] = None,
+) -> np.ndarray:
+    """
+    count_weekdays for many ranges at once with np.busday_count
+
+    Args:
+        starts: First day of each range
+        ends: Last day of each range (inclusive)
+        weekdays: Day names or numbers to count
+        holidays: Days that do not count, shared by every range
+
+    Returns:
+        Integer array with one count per range
+    """
+    wanted = _weekday_set(weekdays)
+    # ISO strings, dates and datetime64 all convert without a Python loop
+    begin = np.asarray(starts, dtype="datetime64[D]")
+    stop = np.asarray(ends, dtype="datetime64[D]") + 1
+    if not wanted:
+        return np.zeros(len(begin), dtype=np.int64)
+
+    weekmask = [day in wanted for day in range(7)]
+    holiday_days = np.asarray(list(holidays or ()), dtype="datetime64[D]")
+    counts = np.busday_count(begin, stop, weekmask=weekmask, holidays=holiday_days)
+    # busday_count counts backwards (negative) for reversed ranges
+    return np.maximum(counts, 0).astype(np.int64)
@@ -0,0 +1,140 @@
+import os
+import signal
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+# Shell command limits, overridable from the environment
+COMMAND_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", "30"))
+COMMAND_MAX_OUTPUT = int(os.getenv("COMMAND_MAX_OUTPUT", str(1024 * 1024)))
+COMMAND_CONCURRENCY = int(os.getenv("COMMAND_CONCURRENCY", "4"))
+
+# Created lazily so it binds to the running event loop
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+class RingBuffer:
+    """
+    Keeps only the last `limit` bytes written to it
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.size = 0
+        self.dropped = 0
+        self._chunks: deque = deque()
+
+    def write(self, data: bytes) -> None:
+        self._chunks.append(data)
+        self.size += len(data)
+        while self.size > self.limit:
+            excess = self.size - self.limit
+            head = self._chunks[0]
+            if len(head) <= excess:
+                self._chunks.popleft()
+                self.size -= len(head)
+                self.dropped += len(head)
+            else:
+                self._chunks[0] = head[excess:]
+                self.size -= excess
+                self.dropped += excess
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
+
+
+@dataclass
+class CommandResult:
+    """
+    Outcome of a shell command; stdout and stderr hold at most the last
+    max_output bytes of each stream
+    """
+
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    truncated: bool = False
+
+
+async def _drain(stream: asyncio.StreamReader, buffer: RingBuffer) -> None:
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            return
+        buffer.write(chunk)
+
+
+async def _communicate(
+    process: asyncio.subprocess.Process, stdout: RingBuffer, stderr: RingBuffer
+) -> None:
+    await asyncio.gather(_drain(process.stdout, stdout), _drain(process.stderr, stderr))
+    await process.wait()
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    # The shell runs in its own session, so this also kills its children
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def run_shell(
+    command: str,
+    timeout: float = COMMAND_TIMEOUT,
+    max_output: int = COMMAND_MAX_OUTPUT,
+    cwd: Optional[str] = None,
+) -> CommandResult:
+    """
+    Run a shell command without blocking the event loop
+
+    At most COMMAND_CONCURRENCY commands run at once. Output is read as it is
+    produced into ring buffers, so a chatty command cannot exhaust memory. On
+    timeout, or when the awaiting task is cancelled (e.g. the client went
+    away), the whole process group is killed.
+
+    Args:
+        command: Shell command line
+        timeout: Wall-clock limit in seconds
+        max_output: Bytes of stdout and of stderr to keep (the tail)
+        cwd: Working directory
+
+    Returns:
+        CommandResult with the exit code and captured output
+    """
+    global _semaphore
+
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(COMMAND_CONCURRENCY)
+
+    async with _semaphore:
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            start_new_session=True,
+        )
+        stdout, stderr = RingBuffer(max_output), RingBuffer(max_output)
+        timed_out = False
+        try:
+            await asyncio.wait_for(_communicate(process, stdout, stderr), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            _kill(process)
+            await process.wait()
+        except asyncio.CancelledError:
+            _kill(process)
+            await process.wait()
+            raise
+
+        return CommandResult(
+            returncode=process.returncode,
+            stdout=stdout.getvalue().decode("utf-8", errors="replace"),
+            stderr=stderr.getvalue().decode("utf-8", errors="replace"),
+            timed_out=timed_out,
+            truncated=bool(stdout.dropped or stderr.dropped),
+        )
@@ -0,0 +1,66 @@
+import os
+import shutil
+
+
+def private_cache_dir(path: str) -> str:
+    """
+    Create a cache directory that only the current user can read or write
+
+    Cache directories default to the shared temp directory, where anyone could
+    create the path first and plant entries in it. A directory we own is
+    tightened to 0700; one owned by another user is refused.
+
+    Returns:
+        The directory path
+
+    Raises:
+        PermissionError: the directory belongs to another user
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return path
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid():
+        raise PermissionError(f"Cache directory {path} is owned by another user")
+    if stat.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def evict_lru(cache_dir: str, max_bytes: int) -> int:
+    """
+    Remove the least recently used entries until the cache fits in max_bytes
+
+    Each entry is a directory directly under cache_dir; its mtime is the last
+    use, so readers os.utime() an entry when they hit it. Names starting with
+    "." (staging directories, lock files) are left alone.
+
+    Returns:
+        Number of entries removed
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        try:
+            size = sum(
+                entry.stat().st_size for entry in os.scandir(path) if entry.is_file()
+            )
+            entries.append((os.path.getmtime(path), size, path))
+        except OSError:
+            # Removed by another worker while we looked
+            continue
+
+    in_use = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if in_use <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        in_use -= size
+        removed += 1
+    return removed
@@ -0,0 +1,313 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+from app.utils.embeddings import CharNgramEmbedder
+
+# Embedding backend settings, overridable from the environment
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "4096"))
+LOCAL_EMBEDDING_SVD_DIM = int(os.getenv("LOCAL_EMBEDDING_SVD_DIM", "256"))
+LOCAL_EMBEDDING_MODEL_CACHE_SIZE = int(
+    os.getenv("LOCAL_EMBEDDING_MODEL_CACHE_SIZE", "4")
+)
+
+
+def corpus_sha256(texts: Sequence[str], namespace: str = "") -> str:
+    """
+    SHA-256 of a sequence of texts, order included
+
+    Each text is length-prefixed, so ["ab", "c"] and ["a", "bc"] differ.
+    """
+    digest = hashlib.sha256(namespace.encode())
+    for text in texts:
+        data = text.encode("utf-8", "surrogatepass")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class EmbeddingBackend(ABC):
+    """
+    Turns texts into vectors whose dot products rank them by similarity
+
+    Vectors are only guaranteed comparable within one embed() call, since a
+    local backend fits its weights to the texts it is given; use
+    embed_query_and_docs() to rank documents against a query.
+    """
+
+    name = ""
+
+    @property
+    def identity(self) -> str:
+        """
+        Backend name and settings; vectors from backends with different
+        identities are not comparable
+        """
+        return self.name
+
+    def corpus_key(self, docs: Sequence[str]) -> str:
+        """
+        Key for anything derived from embedding docs with this backend
+        """
+        return corpus_sha256(docs, self.identity)
+
+    @abstractmethod
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed texts into an (n, dim) float32 matrix, rows in input order
+        """
+
+    async def embed_query_and_docs(
+        self, query: str, docs: Sequence[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Embed a query and the documents it is ranked against
+
+        The document vectors do not depend on the query, so they can be
+        indexed once and searched with many queries.
+
+        Returns:
+            (query vector, (len(docs), dim) document matrix)
+        """
+        vectors = await self.embed([query, *docs])
+        return vectors[0], vectors[1:]
+
+    async def embed_query(self, query: str, docs: Sequence[str]) -> np.ndarray:
+        """
+        Embed only the query, comparable with embed_query_and_docs(query, docs)
+        document vectors obtained earlier
+        """
+        return (await self.embed([query]))[0]
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """
+    The embeddings API, batched and backed by the local embedding store
+    """
+
+    name = "openai"
+
+    @property
+    def identity(self) -> str:
+        from app.utils.embedding_store import EMBEDDING_MODEL
+
+        return f"{self.name}:{EMBEDDING_MODEL}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from app.utils.embedding_store import embed_texts
+
+        return await embed_texts(texts)
+
+
+class LocalEmbeddingModel:
+    """
+    Character n-gram TF-IDF, optionally followed by a truncated SVD, fitted to
+    one corpus
+
+    Texts are hashed into a sparse TF-IDF matrix. When the corpus has more
+    than svd_dim documents, its top svd_dim singular directions (latent
+    semantic analysis) are found with scipy's sparse svds, which only touches
+    the non-zero entries, and texts are projected onto them. Otherwise the
+    TF-IDF rows are used as they are.
+    """
+
+    def __init__(self, embedder: CharNgramEmbedder, components: Optional[np.ndarray]):
+        self.embedder = embedder
+        self.components = components
+
+    @classmethod
+    def fit(
+        cls,
+        docs: Sequence[str],
+        dim: int = LOCAL_EMBEDDING_DIM,
+        svd_dim: int = LOCAL_EMBEDDING_SVD_DIM,
+    ) -> "LocalEmbeddingModel":
+        docs = list(docs)
+        embedder = CharNgramEmbedder(dim).fit(docs)
+        if not svd_dim or len(docs) <= svd_dim:
+            return cls(embedder, None)
+
+        from scipy.sparse.linalg import svds
+
+        matrix = embedder.embed_sparse(docs)
+        k = min(svd_dim, min(matrix.shape) - 1)
+        # random_state makes the ARPACK start vector, and so the result, repeatable
+        _, _, vt = svds(matrix, k=k, random_state=0)
+        return cls(embedder, vt.astype(np.float32))
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed texts into an (n, dim) float32 matrix of unit-length rows
+        """
+        texts = list(texts)
+        matrix = self.embedder.embed_sparse(texts)
+        if self.components is None:
+            return matrix.toarray()
+
+        # Projecting onto the right singular vectors gives documents of the
+        # corpus their U * S rows and places new texts in the same space
+        reduced = np.asarray(matrix @ self.components.T)
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return (reduced / norms).astype(np.float32)
+
+
+# Fitted local models by corpus key, so further queries against the same
+# documents skip the IDF and SVD fit
+_models: "OrderedDict[str, LocalEmbeddingModel]" = OrderedDict()
+_models_lock = threading.Lock()
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    CPU-only embeddings from a LocalEmbeddingModel
+
+    embed() fits the model on the texts it is given. embed_query_and_docs()
+    fits it on the documents only, so the query does not shift the IDF
+    weights or the SVD and the document vectors stay the same for every query.
+    The last LOCAL_EMBEDDING_MODEL_CACHE_SIZE models fitted that way are kept.
+    """
+
+    name = "local"
+
+    def __init__(
+        self, dim: int = LOCAL_EMBEDDING_DIM, svd_dim: int = LOCAL_EMBEDDING_SVD_DIM
+    ):
+        self.dim = dim
+        self.svd_dim = svd_dim
+
+    @property
+    def identity(self) -> str:
+        return f"{self.name}:{self.dim}:{self.svd_dim}"
+
+    def fit(self, docs: Sequence[str]) -> LocalEmbeddingModel:
+        return LocalEmbeddingModel.fit(docs, self.dim, self.svd_dim)
+
+    def fit_cached(self, docs: Sequence[str]) -> LocalEmbeddingModel:
+        """
+        The model fitted on docs, reusing one fitted earlier on the same docs
+        """
+        key = self.corpus_key(docs)
+        with _models_lock:
+            model = _models.get(key)
+            if model is not None:
+                _models.move_to_end(key)
+                return model
+
+        model = self.fit(docs)
+        with _models_lock:
+            _models[key] = model
+            while len(_models) > LOCAL_EMBEDDING_MODEL_CACHE_SIZE:
+                _models.popitem(last=False)
+        return model
+
+    def embed_sync(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self.fit(texts).transform(texts)
+
+    def embed_query_and_docs_sync(
+        self, query: str, docs: Sequence[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        model = self.fit_cached(docs)
+        return model.transform([query])[0], model.transform(docs)
+
+    def embed_query_sync(self, query: str, docs: Sequence[str]) -> np.ndarray:
+        return self.fit_cached(docs).transform([query])[0]
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        # Pure CPU work; keep it off the event loop
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+    async def embed_query_and_docs(
+        self, query: str, docs: Sequence[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return await asyncio.to_thread(self.embed_query_and_docs_sync, query, docs)
+
+    async def embed_query(self, query: str, docs: Sequence[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_query_sync, query, docs)
+
+
+EMBEDDING_BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    OpenAIEmbeddingBackend.name: OpenAIEmbeddingBackend,
+    LocalEmbeddingBackend.name: LocalEmbeddingBackend,
+}
+
+
+def get_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """
+    Return the backend configured for this deployment (EMBEDDING_BACKEND)
+
+    Args:
+        name: Backend name overriding the setting, "openai" or "local"
+    """
+    name = name or EMBEDDING_BACKEND
+    backend = EMBEDDING_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(
+            f"Unknown embedding backend {name!r}; choose from "
+            f"{', '.join(EMBEDDING_BACKENDS)}"
+        )
+    return backend()
+
+
+async def benchmark_backends(
+    query: str, docs: List[str], k: int = 3, names: Sequence[str] = ()
+) -> Dict[str, dict]:
+    """
+    Rank docs against query with each backend and time it
+
+    Returns:
+        name -> {"seconds", "top" (doc indices), "overlap" with the first
+        backend's top k} or {"error"} for backends that failed
+    """
+    from app.utils.similarity import top_k_similar
+
+    results: Dict[str, dict] = {}
+    reference = None
+    for name in names or EMBEDDING_BACKENDS:
+        backend = get_embedding_backend(name)
+        started = time.perf_counter()
+        try:
+            query_vector, doc_vectors = await backend.embed_query_and_docs(query, docs)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+            continue
+        top = [i for i, _ in top_k_similar(query_vector, doc_vectors, k)]
+        result = {"seconds": time.perf_counter() - started, "top": top}
+        if reference is None:
+            reference = set(top)
+        else:
+            result["overlap"] = len(reference & set(top)) / max(1, len(top))
+        results[name] = result
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    sample_texts = [
+        "Embeddings map text to vectors so that similar texts are close together.",
+        "FastAPI makes it easy to build HTTP APIs with Python type hints.",
+        "Cosine similarity compares the angle between two vectors.",
+        "The weather in Chennai is hot and humid for most of the year.",
+        "Vector search finds the nearest neighbours of a query embedding.",
+    ]
+    sample_docs = [f"{text} (note {i})" for i, text in enumerate(sample_texts * 100)]
+    print(
+        json.dumps(
+            asyncio.run(
+                benchmark_backends("How do I measure text similarity?", sample_docs)
+            ),
+            indent=2,
+        )
+    )
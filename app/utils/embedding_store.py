@@ -0,0 +1,226 @@
+import os
+import asyncio
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+from app.utils.disk_cache import private_cache_dir
+from app.utils.http_client import get_http_client
+
+# Embedding API settings, overridable from the environment
+EMBEDDING_URL = os.getenv("EMBEDDING_URL", "https://api.openai.com/v1/embeddings")
+EMBEDDING_API_KEY = os.getenv("OPENAI_API_KEY", "dummy_api_key")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Request batching limits, overridable from the environment. The API takes up
+# to 2048 inputs and 300k tokens per request; stay well inside both.
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "1024"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+# Local embedding store, overridable from the environment
+EMBEDDING_STORE_PATH = os.getenv(
+    "EMBEDDING_STORE_PATH",
+    os.path.join(tempfile.gettempdir(), "iitm-api-cache", "embeddings.sqlite3"),
+)
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Upper-bound token estimate for batching: BPE tokens average about four
+    bytes of English, so counting one per three bytes leaves headroom
+    """
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def batch_by_tokens(
+    texts: Sequence[str],
+    max_tokens: int = EMBEDDING_BATCH_TOKENS,
+    max_items: int = EMBEDDING_BATCH_SIZE,
+) -> Iterator[List[int]]:
+    """
+    Group texts into request-sized batches
+
+    Yields:
+        Lists of indices into texts, each within max_items inputs and
+        max_tokens estimated tokens (a single oversized text gets its own batch)
+    """
+    batch: List[int] = []
+    tokens = 0
+    for index, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if batch and (tokens + cost > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(index)
+        tokens += cost
+    if batch:
+        yield batch
+
+
+class EmbeddingStore:
+    """
+    SQLite table of float32 embeddings keyed by model and text SHA-256
+
+    Shared by every worker on the machine; WAL mode lets readers and the
+    single writer proceed concurrently.
+    """
+
+    def __init__(self, path: str = EMBEDDING_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            try:
+                path = self._private_path()
+            except OSError as e:
+                # The vectors decide similarity answers; never read a database
+                # someone else could have written
+                print(f"Embedding store disabled, using memory only: {e}")
+                path = ":memory:"
+            conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, sha256 TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, sha256))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _private_path(self) -> str:
+        # The default path is in the shared temp dir: keep the database in a
+        # directory only we can write, and the file itself readable only by us
+        private_cache_dir(os.path.dirname(os.path.abspath(self.path)))
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            stat = os.fstat(fd)
+            if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+                raise PermissionError(f"{self.path} is owned by another user")
+            if stat.st_mode & 0o077:
+                os.chmod(self.path, 0o600)
+        finally:
+            os.close(fd)
+        return self.path
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up stored embeddings
+
+        Returns:
+            sha256 -> vector for the hashes that are stored
+        """
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            # Stay under SQLite's limit on bound parameters
+            for start in range(0, len(hashes), 500):
+                chunk = list(hashes[start : start + 500])
+                rows = conn.execute(
+                    "SELECT sha256, vector FROM embeddings WHERE model = ? "
+                    f"AND sha256 IN ({', '.join('?' * len(chunk))})",
+                    [model, *chunk],
+                )
+                for sha256, blob in rows:
+                    found[sha256] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                    [
+                        (model, sha256, np.asarray(v, dtype=np.float32).tobytes())
+                        for sha256, v in vectors.items()
+                    ],
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+embedding_store = EmbeddingStore()
+
+
+async def _request_embeddings(texts: List[str], model: str) -> List[List[float]]:
+    client = get_http_client("openai")
+    response = await client.post(
+        EMBEDDING_URL,
+        json={"model": model, "input": texts},
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {EMBEDDING_API_KEY}",
+        },
+    )
+    response.raise_for_status()
+    data = sorted(response.json()["data"], key=lambda item: item["index"])
+    return [item["embedding"] for item in data]
+
+
+async def embed_texts(
+    texts: Sequence[str],
+    model: str = EMBEDDING_MODEL,
+    store: EmbeddingStore = embedding_store,
+) -> np.ndarray:
+    """
+    Embed texts with the embeddings API, reusing stored embeddings
+
+    Texts already in the store, or repeated within this call, are not sent.
+    The rest go out in batches sized by batch_by_tokens, at most
+    EMBEDDING_CONCURRENCY requests at a time.
+
+    Args:
+        texts: Texts to embed
+        model: Embedding model name
+        store: Local embedding store
+
+    Returns:
+        (len(texts), dim) float32 matrix, rows in the order of texts
+    """
+    hashes = [text_sha256(text) for text in texts]
+    vectors = await asyncio.to_thread(store.get_many, model, list(set(hashes)))
+
+    missing: Dict[str, str] = {}
+    for sha256, text in zip(hashes, texts):
+        if sha256 not in vectors:
+            missing.setdefault(sha256, text)
+
+    if missing:
+        pending = list(missing.items())
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+
+        async def embed_batch(indices: List[int]) -> Dict[str, np.ndarray]:
+            async with semaphore:
+                embeddings = await _request_embeddings(
+                    [pending[i][1] for i in indices], model
+                )
+            return {
+                pending[i][0]: np.asarray(e, dtype=np.float32)
+                for i, e in zip(indices, embeddings)
+            }
+
+        batches = batch_by_tokens([text for _, text in pending])
+        new_vectors: Dict[str, np.ndarray] = {}
+        for result in await asyncio.gather(*(embed_batch(b) for b in batches)):
+            new_vectors.update(result)
+        await asyncio.to_thread(store.put_many, model, new_vectors)
+        vectors.update(new_vectors)
+
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([vectors[sha256] for sha256 in hashes])
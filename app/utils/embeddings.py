@@ -0,0 +1,127 @@
+import re
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Words and digit runs; digits collapse to one token so that the same question
+# with different numbers produces the same features
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+
+
+def _features(text: str) -> List[str]:
+    tokens = ["#" if t.isdigit() else t for t in _TOKEN_RE.findall(text.lower())]
+    bigrams = [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return tokens + bigrams
+
+
+class HashingEmbedder:
+    """
+    Local hashed TF-IDF embedder: word unigrams and bigrams are hashed into a
+    fixed number of buckets, weighted by sublinear TF and (once fitted) IDF,
+    and L2-normalised. Needs no network access and no vocabulary.
+    """
+
+    def __init__(self, dim: int = 2048):
+        self.dim = dim
+        self.idf: Optional[np.ndarray] = None
+
+    def _bucket(self, feature: str) -> int:
+        # crc32 is stable across processes, unlike hash()
+        return zlib.crc32(feature.encode("utf-8")) % self.dim
+
+    def _term_counts(self, text: str) -> dict:
+        counts = {}
+        for feature in _features(text):
+            bucket = self._bucket(feature)
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return counts
+
+    def fit(self, texts: Iterable[str]) -> "HashingEmbedder":
+        """
+        Learn IDF weights from a corpus
+        """
+        df = np.zeros(self.dim, dtype=np.float32)
+        n_docs = 0
+        for text in texts:
+            n_docs += 1
+            df[list(self._term_counts(text))] += 1
+        self.idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        return self
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into an (n, dim) float32 matrix of unit-length rows
+        """
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = self._term_counts(text)
+            if counts:
+                buckets = np.fromiter(counts.keys(), dtype=np.int64)
+                tf = np.fromiter(counts.values(), dtype=np.float32)
+                matrix[row, buckets] = 1 + np.log(tf)
+
+        if self.idf is not None:
+            matrix *= self.idf
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    def embed_sparse(self, texts: List[str]):
+        """
+        embed() as a scipy.sparse CSR matrix, for corpora whose dense
+        (n, dim) matrix would not fit in memory
+        """
+        from scipy import sparse
+
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for text in texts:
+            counts = self._term_counts(text)
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+
+        values = 1 + np.log(np.asarray(data, dtype=np.float32))
+        columns = np.asarray(indices, dtype=np.int64)
+        if self.idf is not None:
+            values *= self.idf[columns]
+
+        # Row norms from the stored values; empty rows stay zero
+        rows = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=values**2, minlength=len(texts)))
+        norms[norms == 0] = 1
+        values /= norms[rows].astype(np.float32)
+
+        return sparse.csr_matrix(
+            (values, columns, np.asarray(indptr, dtype=np.int64)),
+            shape=(len(texts), self.dim),
+            dtype=np.float32,
+        )
+
+
+class CharNgramEmbedder(HashingEmbedder):
+    """
+    HashingEmbedder over character n-grams instead of words
+
+    Each word is padded with spaces and cut into n-grams of every length in
+    ngram_range, so related word forms ("embed", "embedding") and typos still
+    share most of their features.
+    """
+
+    def __init__(self, dim: int = 4096, ngram_range: Tuple[int, int] = (3, 5)):
+        super().__init__(dim)
+        self.ngram_range = ngram_range
+
+    def _term_counts(self, text: str) -> dict:
+        counts = {}
+        low, high = self.ngram_range
+        for word in text.lower().split():
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                for start in range(max(1, len(padded) - n + 1)):
+                    bucket = self._bucket(padded[start : start + n])
+                    counts[bucket] = counts.get(bucket, 0) + 1
+        return counts
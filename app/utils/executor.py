@@ -0,0 +1,134 @@
+import os
+import asyncio
+import functools
+import contextvars
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.workspace import attached_workspace, current_workspace
+
+# Pool sizes, overridable from the environment
+THREAD_POOL_WORKERS = int(os.getenv("THREAD_POOL_WORKERS", "32"))
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", str(os.cpu_count() or 1)))
+
+# Where a solver runs:
+#   loop    - on the event loop; only for solvers that await network I/O
+#   thread  - in the bounded thread pool; blocking file I/O, pandas, subprocesses
+#   process - in the process pool; CPU-bound work that would hold the GIL
+POOLS = ("loop", "thread", "process")
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+# Per-solver concurrency limits, created on first use inside the running loop
+_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """
+    Return the shared thread pool for blocking I/O
+    """
+    global _thread_pool
+
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=THREAD_POOL_WORKERS, thread_name_prefix="solver"
+        )
+    return _thread_pool
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared process pool for CPU-bound work
+    """
+    global _process_pool
+
+    if _process_pool is None:
+        # spawn, not fork: the server process has event-loop and pool threads
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def _call(func: Callable, kwargs: Dict[str, Any]) -> Any:
+    # Runs inside a pool worker. Solvers declared async but doing only blocking
+    # work get a private event loop there.
+    if asyncio.iscoroutinefunction(func):
+        return asyncio.run(func(**kwargs))
+    return func(**kwargs)
+
+
+def _call_in_workspace(
+    workspace_path: Optional[str], func: Callable, kwargs: Dict[str, Any]
+) -> Any:
+    # Process pool entry point: context variables are not carried over, so the
+    # request workspace is re-attached from its path
+    with attached_workspace(workspace_path):
+        return _call(func, kwargs)
+
+
+async def run_in_pool(
+    pool: str,
+    func: Callable,
+    kwargs: Dict[str, Any],
+    limit_key: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Any:
+    """
+    Run a function on the chosen pool without blocking the event loop
+
+    Args:
+        pool: "loop", "thread" or "process"
+        func: The function; must be importable by name for the process pool
+        kwargs: Keyword arguments for the function
+        limit_key: Name the concurrency limit is tracked under
+        limit: Most calls under limit_key allowed to run at once
+
+    Returns:
+        The function's result
+    """
+    if pool not in POOLS:
+        raise ValueError(f"Unknown pool: {pool}")
+
+    if limit and limit_key:
+        semaphore = _limits.get(limit_key)
+        if semaphore is None:
+            semaphore = _limits[limit_key] = asyncio.Semaphore(limit)
+        async with semaphore:
+            return await run_in_pool(pool, func, kwargs)
+
+    if pool == "loop":
+        if asyncio.iscoroutinefunction(func):
+            return await func(**kwargs)
+        return func(**kwargs)
+
+    loop = asyncio.get_running_loop()
+    executor: Executor
+    if pool == "thread":
+        executor = get_thread_pool()
+        # Carry context variables (e.g. the request workspace) into the thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, _call, func, kwargs)
+    else:
+        executor = get_process_pool()
+        workspace = current_workspace()
+        call = functools.partial(
+            _call_in_workspace, workspace and workspace.path, func, kwargs
+        )
+    return await loop.run_in_executor(executor, call)
+
+
+async def shutdown_executors() -> None:
+    """
+    Shut the pools down, called from the FastAPI lifespan hook
+    """
+    global _thread_pool, _process_pool
+
+    pools = [p for p in (_thread_pool, _process_pool) if p is not None]
+    _thread_pool = _process_pool = None
+    _limits.clear()
+    for pool in pools:
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
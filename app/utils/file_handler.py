@@ -1,28 +1,174 @@
 import os
 import shutil
-import tempfile
-from fastapi import UploadFile
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import HTTPException, UploadFile
+from app.utils.workspace import scratch_dir
 
-async def save_upload_file_temporarily(upload_file: UploadFile) -> str:
+# Upload settings, overridable from the environment
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(512 * 1024 * 1024)))
+
+# Leading bytes of the file types the solvers care about
+_MAGIC_NUMBERS = [
+    (b"\x1f\x8b", "gzip"),
+    (b"PK\x03\x04", "zip"),
+    (b"PK\x05\x06", "zip"),
+    (b"%PDF", "pdf"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF8", "gif"),
+]
+
+# Types an upload must really have when its name carries one of these extensions
+_EXTENSION_KINDS = {
+    ".gz": "gzip",
+    ".zip": "zip",
+    ".pdf": "pdf",
+    ".png": "png",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".gif": "gif",
+    ".webp": "webp",
+}
+
+
+@dataclass
+class SavedUpload:
     """
-    Save an upload file temporarily and return the path to the saved file.
+    An upload written to disk, with what was learned while streaming it
+    """
+
+    path: str
+    sha256: str
+    size: int
+    kind: str
+
+
+def sniff_file_type(head: bytes) -> str:
+    """
+    Guess the file type from its first bytes
+
+    Args:
+        head: The first bytes of the file
+
+    Returns:
+        One of gzip, zip, pdf, png, jpeg, gif, webp, text, binary or empty
+    """
+    if not head:
+        return "empty"
+    for magic, kind in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if b"\0" in head:
+        return "binary"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still text
+        if e.start < len(head) - 3:
+            return "binary"
+    return "text"
+
+
+def check_file_type(filename: str, kind: str) -> None:
+    """
+    Reject an upload whose content does not match its file extension
+
+    A renamed or truncated zip, PDF or image would otherwise fail deep inside a
+    solver with a confusing error, or be answered from garbage.
+
+    Raises:
+        HTTPException: 415 when the extension promises a different type
+    """
+    expected = _EXTENSION_KINDS.get(os.path.splitext(filename)[1].lower())
+    if expected and kind != expected:
+        raise HTTPException(
+            status_code=415,
+            detail=f"{filename} is not a valid {expected} file (looks like {kind})",
+        )
+
+
+def _write_chunk(f, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    f.write(chunk)
+
+
+async def save_upload_stream(
+    upload_file: UploadFile,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_size: Optional[int] = MAX_UPLOAD_SIZE,
+) -> SavedUpload:
     """
+    Stream an upload to a temporary file in fixed-size chunks, hashing it on the way
+
+    Only one chunk is held in memory at a time, however large the upload is.
+    Disk writes and hashing run on a worker thread, off the event loop.
+
+    Args:
+        upload_file: The uploaded file
+        chunk_size: Bytes read and written per step
+        max_size: Largest accepted upload in bytes, None for no limit
+
+    Returns:
+        SavedUpload with the path, SHA-256, size and sniffed type
+
+    Raises:
+        HTTPException: 413 when the upload is larger than max_size, 415 when
+            its content does not match its file extension
+    """
+    # Owned by the request's workspace, so it is removed when the request ends
+    temp_dir = scratch_dir("upload-")
     try:
-        # Create a temporary directory
-        temp_dir = tempfile.mkdtemp()
-        
-        # Create a path to save the file
-        file_path = os.path.join(temp_dir, upload_file.filename)
-        
-        # Save the file
-        with open(file_path, "wb") as f:
-            contents = await upload_file.read()
-            f.write(contents)
-        
-        # Return the path to the saved file
-        return file_path
-    except Exception as e:
+        # Never let the client-supplied name escape the temporary directory
+        filename = os.path.basename(upload_file.filename or "") or "upload"
+        file_path = os.path.join(temp_dir, filename)
+
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        f = await asyncio.to_thread(open, file_path, "wb")
+        try:
+            while True:
+                chunk = await upload_file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Uploaded file exceeds the {max_size} byte limit",
+                    )
+                if len(head) < 512:
+                    head += chunk[: 512 - len(head)]
+                    # Fail fast on a mismatched type instead of storing it all
+                    if len(head) == 512:
+                        check_file_type(filename, sniff_file_type(head))
+                await asyncio.to_thread(_write_chunk, f, digest, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+
+        kind = sniff_file_type(head)
+        check_file_type(filename, kind)
+        return SavedUpload(
+            path=file_path,
+            sha256=digest.hexdigest(),
+            size=size,
+            kind=kind,
+        )
+    except BaseException:
         # Clean up the temporary directory if an error occurs
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        raise e
\ No newline at end of file
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+
+async def save_upload_file_temporarily(upload_file: UploadFile) -> str:
+    """
+    Save an upload file temporarily and return the path to the saved file.
+    """
+    saved = await save_upload_stream(upload_file)
+    return saved.path
@@ -15,6 +15,13 @@ import json
 import csv
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
+from app.utils.http_client import get_http_client
+from app.utils.tool_registry import (
+    ToolArgumentError,
+    register_tool,
+    register_tool_schema,
+)
+from app.utils.archive import ZipArchive
 
 
 async def calculate_statistics(file_path: str, operation: str, column_name: str) -> str:
@@ -49,6 +56,33 @@ async def calculate_statistics(file_path: str, operation: str, column_name: str)
         return f"Error calculating statistics: {str(e)}"
 
 
+@register_tool(
+    description="Make an API request to a specified URL",
+    parameters={
+        "type": "object",
+        "properties": {
+            "url": {
+                "type": "string",
+                "description": "URL to make the request to",
+            },
+            "method": {
+                "type": "string",
+                "enum": ["GET", "POST"],
+                "description": "HTTP method to use",
+            },
+            "headers": {
+                "type": "object",
+                "description": "Headers to include in the request",
+            },
+            "data": {
+                "type": "object",
+                "description": "Data to include in the request body",
+            },
+        },
+        "required": ["url", "method"],
+    },
+    cache_ttl=0,
+)
 async def make_api_request(
     url: str,
     method: str,
@@ -59,58 +93,97 @@ async def make_api_request(
     Make an API request to a specified URL.
     """
     try:
-        async with httpx.AsyncClient() as client:
-            if method.upper() == "GET":
-                response = await client.get(url, headers=headers)
-            elif method.upper() == "POST":
-                response = await client.post(url, headers=headers, json=data)
-            else:
-                return f"Unsupported HTTP method: {method}"
+        client = get_http_client()
+        if method.upper() == "GET":
+            response = await client.get(url, headers=headers)
+        elif method.upper() == "POST":
+            response = await client.post(url, headers=headers, json=data)
+        else:
+            return f"Unsupported HTTP method: {method}"
 
-            # Check if the response is JSON
-            try:
-                result = response.json()
-                return json.dumps(result, indent=2)
-            except:
-                return response.text
+        # Check if the response is JSON
+        try:
+            result = response.json()
+            return json.dumps(result, indent=2)
+        except:
+            return response.text
 
     except Exception as e:
         return f"Error making API request: {str(e)}"
 
 
+@register_tool(
+    description="Execute a shell command and return its output",
+    parameters={
+        "type": "object",
+        "properties": {
+            "command": {
+                "type": "string",
+                "description": "The command to execute",
+            }
+        },
+        "required": ["command"],
+    },
+    cache_ttl=0,
+)
 async def execute_command(command: str) -> str:
     """
     Execute a shell command and return its output
+
+    The command runs as an asyncio subprocess with a wall-clock timeout, a cap
+    on captured output and a global concurrency limit (see app.utils.commands).
     """
+    from app.utils.commands import COMMAND_MAX_OUTPUT, COMMAND_TIMEOUT, run_shell
+
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-        return result.stdout.strip()
+        result = await run_shell(command)
+        if result.timed_out:
+            return (
+                f"Error executing command: timed out after {COMMAND_TIMEOUT:g} seconds"
+            )
+        output = result.stdout.strip()
+        if result.truncated:
+            output = (
+                f"[output truncated to the last {COMMAND_MAX_OUTPUT} bytes]\n{output}"
+            )
+        return output
     except Exception as e:
         return f"Error executing command: {str(e)}"
 
 
+@register_tool(
+    description="Extract a zip file and read a value from a CSV file inside it",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the zip file",
+            },
+            "column_name": {
+                "type": "string",
+                "description": "Column name to extract value from",
+            },
+        },
+        "required": ["file_path"],
+    },
+    pool="thread",
+)
 async def extract_zip_and_read_csv(
     file_path: str, column_name: Optional[str] = None
 ) -> str:
     """
     Extract a zip file and read a value from a CSV file inside it
     """
-    temp_dir = tempfile.mkdtemp()
-
-    try:
-        # Extract the zip file
-        with zipfile.ZipFile(file_path, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        # Find CSV files in the extracted directory
-        csv_files = [f for f in os.listdir(temp_dir) if f.endswith(".csv")]
+    with ZipArchive(file_path) as archive:
+        # Find CSV files at the root of the archive
+        csv_files = archive.find(suffix=".csv", top_level=True)
 
         if not csv_files:
             return "No CSV files found in the zip file."
 
-        # Read the first CSV file
-        csv_path = os.path.join(temp_dir, csv_files[0])
-        df = pd.read_csv(csv_path)
+        # Read the first CSV file straight from the archive
+        df = archive.read_csv(csv_files[0].name)
 
         # If a column name is specified, return the value from that column
         if column_name and column_name in df.columns:
@@ -124,32 +197,42 @@ async def extract_zip_and_read_csv(
         else:
             return f"CSV contains columns: {', '.join(df.columns)}"
 
-    finally:
-        # Clean up the temporary directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
-
 
+@register_tool(
+    description="Extract a zip file and process multiple files",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the zip file",
+            },
+            "operation": {
+                "type": "string",
+                "description": "Operation to perform on files",
+            },
+        },
+        "required": ["file_path", "operation"],
+    },
+    pool="thread",
+)
 async def extract_zip_and_process_files(file_path: str, operation: str) -> str:
     """
     Extract a zip file and process multiple files
     """
-    temp_dir = tempfile.mkdtemp()
-
-    try:
-        # Extract the zip file
-        with zipfile.ZipFile(file_path, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-
+    with ZipArchive(file_path) as archive:
         # Process based on the operation
         if operation == "find_different_lines":
             # Compare two files
-            file_a = os.path.join(temp_dir, "a.txt")
-            file_b = os.path.join(temp_dir, "b.txt")
+            file_a = archive.find(name="a.txt", top_level=True)
+            file_b = archive.find(name="b.txt", top_level=True)
 
-            if not os.path.exists(file_a) or not os.path.exists(file_b):
+            if not file_a or not file_b:
                 return "Files a.txt and b.txt not found."
 
-            with open(file_a, "r") as a, open(file_b, "r") as b:
+            with archive.open_text(file_a[0].name) as a, archive.open_text(
+                file_b[0].name
+            ) as b:
                 a_lines = a.readlines()
                 b_lines = b.readlines()
 
@@ -163,15 +246,11 @@ async def extract_zip_and_process_files(file_path: str, operation: str) -> str:
         elif operation == "count_large_files":
             # List all files in the directory with their dates and sizes
             # For files larger than 1MB
-            large_file_count = 0
+            # Sizes come from the archive index, nothing is decompressed
             threshold = 1024 * 1024  # 1MB in bytes
-
-            for root, _, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_size = os.path.getsize(file_path)
-                    if file_size > threshold:
-                        large_file_count += 1
+            large_file_count = sum(
+                1 for member in archive.find() if member.size > threshold
+            )
 
             return str(large_file_count)
 
@@ -179,35 +258,30 @@ async def extract_zip_and_process_files(file_path: str, operation: str) -> str:
             # Count files by extension
             extension_counts = {}
 
-            for root, _, files in os.walk(temp_dir):
-                for file in files:
-                    _, ext = os.path.splitext(file)
-                    ext = ext.lower()
-                    extension_counts[ext] = extension_counts.get(ext, 0) + 1
+            for member in archive.find():
+                _, ext = os.path.splitext(member.basename)
+                ext = ext.lower()
+                extension_counts[ext] = extension_counts.get(ext, 0) + 1
 
             return json.dumps(extension_counts)
 
         elif operation == "list":
             # List all files in the zip with their sizes
             file_list = []
+            files = archive.find()
+            directories = archive.index.directories()
 
-            for root, dirs, files in os.walk(temp_dir):
-                # Get relative path from temp_dir
-                rel_path = os.path.relpath(root, temp_dir)
-                if rel_path == ".":
-                    rel_path = ""
-
-                # Add directories
-                for dir_name in dirs:
-                    dir_path = (
-                        os.path.join(rel_path, dir_name) if rel_path else dir_name
-                    )
-                    file_list.append(f"📁 {dir_path}/")
+            # Walk the tree from the index, directories before files at each level
+            for rel_path in [""] + directories:
+                for dir_path in directories:
+                    if os.path.dirname(dir_path) == rel_path:
+                        file_list.append(f"📁 {dir_path}/")
 
                 # Add files with sizes
-                for file_name in files:
-                    file_path = os.path.join(root, file_name)
-                    file_size = os.path.getsize(file_path)
+                for member in files:
+                    if member.parent != rel_path:
+                        continue
+                    file_size = member.size
 
                     # Format size
                     if file_size < 1024:
@@ -217,10 +291,7 @@ async def extract_zip_and_process_files(file_path: str, operation: str) -> str:
                     else:
                         size_str = f"{file_size/(1024*1024):.1f} MB"
 
-                    file_rel_path = (
-                        os.path.join(rel_path, file_name) if rel_path else file_name
-                    )
-                    file_list.append(f"📄 {file_rel_path} ({size_str})")
+                    file_list.append(f"📄 {member.name} ({size_str})")
 
             # Format the response
             if not file_list:
@@ -231,44 +302,32 @@ async def extract_zip_and_process_files(file_path: str, operation: str) -> str:
         else:
             return f"Unsupported operation: {operation}"
 
-    finally:
-        # Clean up the temporary directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
-
 
 async def merge_csv_files(file_path: str, merge_column: str) -> str:
     """
     Extract a zip file and merge multiple CSV files based on a common column
     """
-    temp_dir = tempfile.mkdtemp()
-    result_path = os.path.join(temp_dir, "merged_result.csv")
-
     try:
-        # Extract the zip file
-        with zipfile.ZipFile(file_path, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        # Find all CSV files
-        csv_files = []
-        for root, _, files in os.walk(temp_dir):
-            for file in files:
-                if file.endswith(".csv"):
-                    csv_files.append(os.path.join(root, file))
+        with ZipArchive(file_path) as archive:
+            # Find all CSV files
+            csv_files = archive.find(suffix=".csv")
 
-        if not csv_files:
-            return "No CSV files found in the zip file."
+            if not csv_files:
+                return "No CSV files found in the zip file."
 
-        # Read and merge all CSV files
-        dataframes = []
-        for csv_file in csv_files:
-            try:
-                df = pd.read_csv(csv_file)
-                if merge_column in df.columns:
-                    dataframes.append(df)
-                else:
-                    return f"Column '{merge_column}' not found in {os.path.basename(csv_file)}"
-            except Exception as e:
-                return f"Error reading {os.path.basename(csv_file)}: {str(e)}"
+            # Read and merge all CSV files
+            dataframes = []
+            for csv_file in csv_files:
+                try:
+                    df = archive.read_csv(csv_file.name)
+                    if merge_column in df.columns:
+                        dataframes.append(df)
+                    else:
+                        return (
+                            f"Column '{merge_column}' not found in {csv_file.basename}"
+                        )
+                except Exception as e:
+                    return f"Error reading {csv_file.basename}: {str(e)}"
 
         if not dataframes:
             return "No valid CSV files found."
@@ -276,19 +335,12 @@ async def merge_csv_files(file_path: str, merge_column: str) -> str:
         # Merge all dataframes
         merged_df = pd.concat(dataframes, ignore_index=True)
 
-        # Save the merged result
-        merged_df.to_csv(result_path, index=False)
-
         # Return statistics about the merge
         return f"Merged {len(dataframes)} CSV files. Result has {len(merged_df)} rows and {len(merged_df.columns)} columns."
 
     except Exception as e:
         return f"Error merging CSV files: {str(e)}"
 
-    finally:
-        # Clean up the temporary directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
-
 
 async def analyze_time_series(
     file_path: str, date_column: str, value_column: str
@@ -352,6 +404,24 @@ import csv
 import io
 
 
+@register_tool(
+    description="Sort a JSON array based on specified criteria",
+    parameters={
+        "type": "object",
+        "properties": {
+            "json_array": {
+                "type": "string",
+                "description": "JSON array to sort",
+            },
+            "sort_keys": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "List of keys to sort by",
+            },
+        },
+        "required": ["json_array", "sort_keys"],
+    },
+)
 def sort_json_array(json_array: str, sort_keys: list) -> str:
     """
     Sort a JSON array based on specified criteria
@@ -378,7 +448,47 @@ def sort_json_array(json_array: str, sort_keys: list) -> str:
         return f"Error sorting JSON array: {str(e)}"
 
 
-def count_days_of_week(start_date: str, end_date: str, day_of_week: str) -> str:
+@register_tool(
+    description="Count occurrences of a specific day of the week between two dates",
+    parameters={
+        "type": "object",
+        "properties": {
+            "start_date": {
+                "type": "string",
+                "description": "Start date in ISO format (YYYY-MM-DD)",
+            },
+            "end_date": {
+                "type": "string",
+                "description": "End date in ISO format (YYYY-MM-DD)",
+            },
+            "day_of_week": {
+                "type": "string",
+                "enum": [
+                    "Monday",
+                    "Tuesday",
+                    "Wednesday",
+                    "Thursday",
+                    "Friday",
+                    "Saturday",
+                    "Sunday",
+                ],
+                "description": "Day of the week to count",
+            },
+            "holidays": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Dates (YYYY-MM-DD) that should not be counted",
+            },
+        },
+        "required": ["start_date", "end_date", "day_of_week"],
+    },
+)
+def count_days_of_week(
+    start_date: str,
+    end_date: str,
+    day_of_week: str,
+    holidays: Optional[List[str]] = None,
+) -> str:
     """
     Count occurrences of a specific day of the week between two dates
 
@@ -386,38 +496,22 @@ def count_days_of_week(start_date: str, end_date: str, day_of_week: str) -> str:
         start_date: Start date in ISO format (YYYY-MM-DD)
         end_date: End date in ISO format (YYYY-MM-DD)
         day_of_week: Day of the week to count
+        holidays: Dates in ISO format that should not be counted
 
     Returns:
         Count of the specified day of the week
     """
     try:
-        # Parse the dates
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-
-        # Map day names to weekday numbers (0=Monday, 6=Sunday)
-        day_map = {
-            "Monday": 0,
-            "Tuesday": 1,
-            "Wednesday": 2,
-            "Thursday": 3,
-            "Friday": 4,
-            "Saturday": 5,
-            "Sunday": 6,
-        }
+        from app.utils.calendars import count_weekdays, parse_weekday
 
-        # Get the weekday number for the specified day
-        weekday = day_map.get(day_of_week)
-        if weekday is None:
+        # Get the weekday number for the specified day (0=Monday, 6=Sunday)
+        try:
+            weekday = parse_weekday(day_of_week)
+        except ValueError:
             return f"Invalid day of week: {day_of_week}"
 
-        # Count occurrences
-        count = 0
-        current = start
-        while current <= end:
-            if current.weekday() == weekday:
-                count += 1
-            current += timedelta(days=1)
+        # Whole weeks plus a remainder: constant time for any range
+        count = count_weekdays(start_date, end_date, weekday, holidays or ())
 
         return str(count)
 
@@ -425,6 +519,25 @@ def count_days_of_week(start_date: str, end_date: str, day_of_week: str) -> str:
         return f"Error counting days of week: {str(e)}"
 
 
+@register_tool(
+    description="Process files with different encodings",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the zip file containing encoded files",
+            },
+            "target_symbols": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "List of symbols to search for",
+            },
+        },
+        "required": ["file_path", "target_symbols"],
+    },
+    pool="thread",
+)
 async def process_encoded_files(file_path: str, target_symbols: list) -> str:
     """
     Process files with different encodings
@@ -436,72 +549,77 @@ async def process_encoded_files(file_path: str, target_symbols: list) -> str:
     Returns:
         Sum of values associated with the target symbols
     """
-    temp_dir = tempfile.mkdtemp()
-
-    try:
-        # Extract the zip file
-        with zipfile.ZipFile(file_path, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-
+    with ZipArchive(file_path) as archive:
         # Initialize total sum
         total_sum = 0
 
-        # Process all files in the temporary directory
-        for root, _, files in os.walk(temp_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
+        # Process every file in the archive, decoding it as it streams out
+        for member in archive.find():
+            file = member.basename
 
-                # Try different encodings based on file extension
-                if file.endswith(".csv"):
-                    if "data1.csv" in file:
-                        encoding = "cp1252"
-                    else:
-                        encoding = "utf-8"
+            # Try different encodings based on file extension
+            if file.endswith(".csv"):
+                if "data1.csv" in file:
+                    encoding = "cp1252"
+                else:
+                    encoding = "utf-8"
 
-                    # Read the CSV file with the appropriate encoding
-                    try:
-                        df = pd.read_csv(file_path, encoding=encoding)
-                        if "symbol" in df.columns and "value" in df.columns:
-                            # Sum values for target symbols
-                            for symbol in target_symbols:
-                                if symbol in df["symbol"].values:
-                                    values = df[df["symbol"] == symbol]["value"]
-                                    total_sum += values.sum()
-                    except Exception as e:
-                        return f"Error processing {file}: {str(e)}"
-
-                elif file.endswith(".txt"):
-                    # Try UTF-16 encoding for txt files
-                    try:
-                        with open(file_path, "r", encoding="utf-16") as f:
-                            content = f.read()
-
-                            # Parse the TSV content
-                            reader = csv.reader(io.StringIO(content), delimiter="\t")
-                            headers = next(reader)
-
-                            # Check if required columns exist
-                            if "symbol" in headers and "value" in headers:
-                                symbol_idx = headers.index("symbol")
-                                value_idx = headers.index("value")
-
-                                for row in reader:
-                                    if len(row) > max(symbol_idx, value_idx):
-                                        if row[symbol_idx] in target_symbols:
-                                            try:
-                                                total_sum += float(row[value_idx])
-                                            except ValueError:
-                                                pass
-                    except Exception as e:
-                        return f"Error processing {file}: {str(e)}"
+                # Read the CSV file with the appropriate encoding
+                try:
+                    df = archive.read_csv(member.name, encoding=encoding)
+                    if "symbol" in df.columns and "value" in df.columns:
+                        # Sum values for target symbols
+                        for symbol in target_symbols:
+                            if symbol in df["symbol"].values:
+                                values = df[df["symbol"] == symbol]["value"]
+                                total_sum += values.sum()
+                except Exception as e:
+                    return f"Error processing {file}: {str(e)}"
 
-        return str(total_sum)
+            elif file.endswith(".txt"):
+                # Try UTF-16 encoding for txt files
+                try:
+                    with archive.open_text(member.name, encoding="utf-16") as f:
+                        # Parse the TSV content
+                        reader = csv.reader(f, delimiter="\t")
+                        headers = next(reader)
+
+                        # Check if required columns exist
+                        if "symbol" in headers and "value" in headers:
+                            symbol_idx = headers.index("symbol")
+                            value_idx = headers.index("value")
+
+                            for row in reader:
+                                if len(row) > max(symbol_idx, value_idx):
+                                    if row[symbol_idx] in target_symbols:
+                                        try:
+                                            total_sum += float(row[value_idx])
+                                        except ValueError:
+                                            pass
+                except Exception as e:
+                    return f"Error processing {file}: {str(e)}"
 
-    finally:
-        # Clean up the temporary directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        return str(total_sum)
 
 
+@register_tool(
+    description="Calculate the result of a spreadsheet formula",
+    parameters={
+        "type": "object",
+        "properties": {
+            "formula": {
+                "type": "string",
+                "description": "The formula to calculate",
+            },
+            "type": {
+                "type": "string",
+                "enum": ["google_sheets", "excel"],
+                "description": "Type of spreadsheet",
+            },
+        },
+        "required": ["formula", "type"],
+    },
+)
 def calculate_spreadsheet_formula(formula: str, type: str) -> str:
     """
     Calculate the result of a spreadsheet formula
@@ -512,6 +630,9 @@ def calculate_spreadsheet_formula(formula: str, type: str) -> str:
 
     Returns:
         Result of the formula calculation
+
+    Raises:
+        ToolArgumentError: the formula is not one this solver understands
     """
     try:
         # Strip the leading = if present
@@ -521,7 +642,7 @@ def calculate_spreadsheet_formula(formula: str, type: str) -> str:
         # For SEQUENCE function (Google Sheets)
         if "SEQUENCE" in formula and type == "google_sheets":
             # Example: SUM(ARRAY_CONSTRAIN(SEQUENCE(100, 100, 5, 2), 1, 10))
-            sequence_pattern = r"SEQUENCE\((\d+),\s*(\d+),\s*(\d+),\s*(\d+)\)"
+            sequence_pattern = r"SEQUENCE\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(-?\d+)\s*,\s*(-?\d+)\s*\)"
             match = re.search(sequence_pattern, formula)
 
             if match:
@@ -540,8 +661,11 @@ def calculate_spreadsheet_formula(formula: str, type: str) -> str:
                         value += step
                     sequence.append(row)
 
-                # Check for ARRAY_CONSTRAIN
-                constrain_pattern = r"ARRAY_CONSTRAIN\([^,]+,\s*(\d+),\s*(\d+)\)"
+                # Check for ARRAY_CONSTRAIN; its first argument is the whole
+                # SEQUENCE(...) call, commas included
+                constrain_pattern = (
+                    r"ARRAY_CONSTRAIN\(\s*SEQUENCE\([^)]*\)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)"
+                )
                 constrain_match = re.search(constrain_pattern, formula)
 
                 if constrain_match:
@@ -563,7 +687,7 @@ def calculate_spreadsheet_formula(formula: str, type: str) -> str:
             # Example: SUM(TAKE(SORTBY({1,10,12,4,6,8,9,13,6,15,14,15,2,13,0,3}, {10,9,13,2,11,8,16,14,7,15,5,4,6,1,3,12}), 1, 6))
 
             # Extract the arrays from SORTBY
-            arrays_pattern = r"SORTBY\(\{([^}]+)\},\s*\{([^}]+)\}\)"
+            arrays_pattern = r"SORTBY\(\s*\{([^}]+)\}\s*,\s*\{([^}]+)\}\s*\)"
             arrays_match = re.search(arrays_pattern, formula)
 
             if arrays_match:
@@ -574,27 +698,50 @@ def calculate_spreadsheet_formula(formula: str, type: str) -> str:
                 sorted_pairs = sorted(zip(values, sort_keys), key=lambda x: x[1])
                 sorted_values = [pair[0] for pair in sorted_pairs]
 
-                # Check for TAKE
-                take_pattern = r"TAKE\([^,]+,\s*(\d+),\s*(\d+)\)"
+                # Check for TAKE(array, rows, columns); its first argument is
+                # the whole SORTBY(...) call
+                take_pattern = r"TAKE\(\s*SORTBY\([^)]*\)\s*,\s*(-?\d+)\s*(?:,\s*(-?\d+)\s*)?\)"
                 take_match = re.search(take_pattern, formula)
 
                 if take_match:
-                    take_start = int(take_match.group(1))
-                    take_count = int(take_match.group(2))
-
-                    # Apply TAKE function
-                    taken = sorted_values[take_start - 1 : take_start - 1 + take_count]
+                    take_rows = int(take_match.group(1))
+                    take_cols = take_match.group(2)
+
+                    # {a, b, c} is a single row: rows only matter when they
+                    # are 0, columns pick values from the start (or the end
+                    # when negative)
+                    taken = sorted_values if take_rows else []
+                    if take_cols is not None:
+                        take_cols = int(take_cols)
+                        if take_cols >= 0:
+                            taken = taken[:take_cols]
+                        else:
+                            taken = taken[take_cols:]
 
                     # Check for SUM
                     if "SUM(" in formula:
                         return str(sum(taken))
 
-        return "Could not parse the formula or unsupported formula type"
-
     except Exception as e:
         return f"Error calculating spreadsheet formula: {str(e)}"
 
+    raise ToolArgumentError("Could not parse the formula or unsupported formula type")
 
+
+@register_tool(
+    description="Compare two files and analyze differences",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the zip file containing files to compare",
+            }
+        },
+        "required": ["file_path"],
+    },
+    pool="thread",
+)
 async def compare_files(file_path: str) -> str:
     """
     Compare two files and analyze differences
@@ -605,41 +752,40 @@ async def compare_files(file_path: str) -> str:
     Returns:
         Number of differences between the files
     """
-    temp_dir = tempfile.mkdtemp()
-
     try:
-        # Extract the zip file
-        with zipfile.ZipFile(file_path, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        # Look for a.txt and b.txt
-        file_a = os.path.join(temp_dir, "a.txt")
-        file_b = os.path.join(temp_dir, "b.txt")
+        with ZipArchive(file_path) as archive:
+            # Look for a.txt and b.txt
+            file_a = archive.find(name="a.txt", top_level=True)
+            file_b = archive.find(name="b.txt", top_level=True)
 
-        if not os.path.exists(file_a) or not os.path.exists(file_b):
-            return "Files a.txt and b.txt not found."
-
-        # Read both files
-        with open(file_a, "r") as a, open(file_b, "r") as b:
-            a_lines = a.readlines()
-            b_lines = b.readlines()
+            if not file_a or not file_b:
+                return "Files a.txt and b.txt not found."
 
-            # Count the differences
+            # Stream both files out of the archive, line by line
             diff_count = 0
-            for i in range(min(len(a_lines), len(b_lines))):
-                if a_lines[i] != b_lines[i]:
-                    diff_count += 1
+            with archive.open_text(file_a[0].name) as a, archive.open_text(
+                file_b[0].name
+            ) as b:
+                for a_line, b_line in zip(a, b):
+                    if a_line != b_line:
+                        diff_count += 1
 
             return str(diff_count)
 
     except Exception as e:
         return f"Error comparing files: {str(e)}"
 
-    finally:
-        # Clean up the temporary directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
-
 
+@register_tool(
+    description="Calculate a SQL query result",
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {"type": "string", "description": "SQL query to run"}
+        },
+        "required": ["query"],
+    },
+)
 def run_sql_query(query: str) -> str:
     """
     Calculate a SQL query result
@@ -707,6 +853,24 @@ def run_sql_query(query: str) -> str:
 # ... existing code ...
 
 
+@register_tool(
+    description="Generate markdown documentation with specific elements",
+    parameters={
+        "type": "object",
+        "properties": {
+            "topic": {
+                "type": "string",
+                "description": "Topic for the markdown documentation",
+            },
+            "elements": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "List of markdown elements to include",
+            },
+        },
+        "required": ["topic"],
+    },
+)
 def generate_markdown_documentation(
     topic: str, elements: Optional[List[str]] = None
 ) -> str:
@@ -747,6 +911,23 @@ def generate_markdown_documentation(
         return f"Error generating markdown documentation: {str(e)}"
 
 
+@register_tool(
+    description="Compress an image to a target size while maintaining quality",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the image file",
+            },
+            "target_size": {
+                "type": "integer",
+                "description": "Target size in bytes",
+            },
+        },
+        "required": ["file_path"],
+    },
+)
 async def compress_image(file_path: str, target_size: int = 1500) -> str:
     """
     Compress an image to a target size while maintaining quality.
@@ -766,6 +947,23 @@ async def compress_image(file_path: str, target_size: int = 1500) -> str:
         return f"Error compressing image: {str(e)}"
 
 
+@register_tool(
+    description="Generate HTML content for GitHub Pages with email protection",
+    parameters={
+        "type": "object",
+        "properties": {
+            "email": {
+                "type": "string",
+                "description": "Email address to include in the page",
+            },
+            "content": {
+                "type": "string",
+                "description": "Optional content for the page",
+            },
+        },
+        "required": ["email"],
+    },
+)
 async def create_github_pages(email: str, content: Optional[str] = None) -> str:
     """
     Generate HTML content for GitHub Pages with email protection.
@@ -799,6 +997,23 @@ async def create_github_pages(email: str, content: Optional[str] = None) -> str:
         return f"Error creating GitHub Pages content: {str(e)}"
 
 
+@register_tool(
+    description="Simulate running code on Google Colab",
+    parameters={
+        "type": "object",
+        "properties": {
+            "code": {
+                "type": "string",
+                "description": "Code to run",
+            },
+            "email": {
+                "type": "string",
+                "description": "Email address for authentication",
+            },
+        },
+        "required": ["code", "email"],
+    },
+)
 async def run_colab_code(code: str, email: str) -> str:
     """
     Simulate running code on Google Colab.
@@ -818,6 +1033,23 @@ async def run_colab_code(code: str, email: str) -> str:
         return f"Error running Colab code: {str(e)}"
 
 
+@register_tool(
+    description="Analyze image brightness and count pixels above threshold",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the image file",
+            },
+            "threshold": {
+                "type": "number",
+                "description": "Brightness threshold",
+            },
+        },
+        "required": ["file_path"],
+    },
+)
 async def analyze_image_brightness(file_path: str, threshold: float = 0.937) -> str:
     """
     Analyze image brightness and count pixels above threshold.
@@ -837,6 +1069,24 @@ async def analyze_image_brightness(file_path: str, threshold: float = 0.937) ->
         return f"Error analyzing image brightness: {str(e)}"
 
 
+@register_tool(
+    description="Generate code for a Vercel app deployment",
+    parameters={
+        "type": "object",
+        "properties": {
+            "data_file": {
+                "type": "string",
+                "description": "Path to the data file",
+            },
+            "app_name": {
+                "type": "string",
+                "description": "Optional name for the app",
+            },
+        },
+        "required": ["data_file"],
+    },
+    file_arg="data_file",
+)
 async def deploy_vercel_app(data_file: str, app_name: Optional[str] = None) -> str:
     """
     Generate code for a Vercel app deployment.
@@ -856,6 +1106,23 @@ async def deploy_vercel_app(data_file: str, app_name: Optional[str] = None) -> s
         return f"Error generating Vercel deployment: {str(e)}"
 
 
+@register_tool(
+    description="Generate GitHub Action workflow with email in step name",
+    parameters={
+        "type": "object",
+        "properties": {
+            "email": {
+                "type": "string",
+                "description": "Email to include in step name",
+            },
+            "repository": {
+                "type": "string",
+                "description": "Optional repository name",
+            },
+        },
+        "required": ["email"],
+    },
+)
 async def create_github_action(email: str, repository: Optional[str] = None) -> str:
     """
     Generate GitHub Action workflow with email in step name.
@@ -886,6 +1153,23 @@ jobs:
         return f"Error creating GitHub Action: {str(e)}"
 
 
+@register_tool(
+    description="Generate Dockerfile and instructions for Docker Hub deployment",
+    parameters={
+        "type": "object",
+        "properties": {
+            "tag": {
+                "type": "string",
+                "description": "Tag for the Docker image",
+            },
+            "dockerfile_content": {
+                "type": "string",
+                "description": "Optional Dockerfile content",
+            },
+        },
+        "required": ["tag"],
+    },
+)
 async def create_docker_image(
     tag: str, dockerfile_content: Optional[str] = None
 ) -> str:
@@ -924,6 +1208,25 @@ docker push yourusername/yourrepo:{tag}
         return f"Error creating Docker image instructions: {str(e)}"
 
 
+@register_tool(
+    description="Filter students from a CSV file by class",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the CSV file",
+            },
+            "classes": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "List of classes to filter by",
+            },
+        },
+        "required": ["file_path", "classes"],
+    },
+    defaults={"classes": []},
+)
 async def filter_students_by_class(file_path: str, classes: List[str]) -> str:
     """
     Filter students from a CSV file by class.
@@ -942,6 +1245,19 @@ async def filter_students_by_class(file_path: str, classes: List[str]) -> str:
         return f"Error filtering students: {str(e)}"
 
 
+@register_tool(
+    description="Generate instructions for setting up Llamafile with ngrok",
+    parameters={
+        "type": "object",
+        "properties": {
+            "model_name": {
+                "type": "string",
+                "description": "Name of the Llamafile model",
+            },
+        },
+        "required": [],
+    },
+)
 async def setup_llamafile_with_ngrok(
     model_name: str = "Llama-3.2-1B-Instruct.Q6_K.llamafile",
 ) -> str:
@@ -969,6 +1285,23 @@ async def setup_llamafile_with_ngrok(
         return f"Error generating Llamafile setup instructions: {str(e)}"
 
 
+@register_tool(
+    description="Analyze sentiment of text using OpenAI API",
+    parameters={
+        "type": "object",
+        "properties": {
+            "text": {
+                "type": "string",
+                "description": "Text to analyze for sentiment",
+            },
+            "api_key": {
+                "type": "string",
+                "description": "Optional API key for OpenAI",
+            },
+        },
+        "required": ["text"],
+    },
+)
 async def analyze_sentiment(text: str, api_key: str = "dummy_api_key") -> str:
     """
     Analyze sentiment of text using OpenAI API
@@ -992,15 +1325,15 @@ async def analyze_sentiment(text: str, api_key: str = "dummy_api_key") -> str:
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
+        client = get_http_client("openai")
+        response = await client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        result = response.json()
 
-            # Extract the sentiment analysis result
-            sentiment = result["choices"][0]["message"]["content"]
+        # Extract the sentiment analysis result
+        sentiment = result["choices"][0]["message"]["content"]
 
-            return f"""
+        return f"""
 # Sentiment Analysis Result
 
 ## Input Text
@@ -1017,13 +1350,58 @@ async def analyze_sentiment(text: str, api_key: str = "dummy_api_key") -> str:
         return f"Error analyzing sentiment: {str(e)}"
 
 
-async def count_tokens(text: str) -> str:
+@register_tool(
+    description="Count tokens in a message sent to OpenAI API",
+    parameters={
+        "type": "object",
+        "properties": {
+            "text": {
+                "type": "string",
+                "description": "Text to count tokens for",
+            },
+        },
+        "required": ["text"],
+    },
+)
+async def count_tokens(text: str, local: bool = True) -> str:
     """
     Count tokens in a message sent to OpenAI API
+
+    Counted locally with the o200k_base tokenizer plus the chat template
+    overhead; the API is only asked when the tokenizer is unavailable
     """
     import httpx
     import json
 
+    if local:
+        try:
+            import asyncio
+            from app.utils.tokenizer import get_tokenizer
+
+            def count_locally():
+                tokenizer = get_tokenizer()
+                messages = [{"role": "user", "content": text}]
+                return tokenizer.count_chat(messages), tokenizer.count(text)
+
+            prompt_tokens, text_tokens = await asyncio.to_thread(count_locally)
+
+            return f"""
+# Token Count Analysis
+
+## Input Text
+
+## Token Count
+The input message uses **{prompt_tokens} tokens**.
+
+## Tokenizer Details
+- Model: gpt-4o-mini
+- Encoding: o200k_base, counted locally
+- Text tokens: {text_tokens}
+- Chat template overhead: {prompt_tokens - text_tokens} tokens
+"""
+        except Exception as e:
+            print(f"Local tokenizer unavailable, asking the API: {e}")
+
     url = "https://api.openai.com/v1/chat/completions"
 
     headers = {
@@ -1038,15 +1416,15 @@ async def count_tokens(text: str) -> str:
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
+        client = get_http_client("openai")
+        response = await client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        result = response.json()
 
-            # Extract token count from usage information
-            prompt_tokens = result.get("usage", {}).get("prompt_tokens", 0)
+        # Extract token count from usage information
+        prompt_tokens = result.get("usage", {}).get("prompt_tokens", 0)
 
-            return f"""
+        return f"""
 # Token Count Analysis
 
 ## Input Text
@@ -1063,6 +1441,23 @@ The input message uses **{prompt_tokens} tokens**.
         return f"Error counting tokens: {str(e)}"
 
 
+@register_tool(
+    description="Generate structured JSON output using OpenAI API",
+    parameters={
+        "type": "object",
+        "properties": {
+            "prompt": {
+                "type": "string",
+                "description": "Prompt for generating structured output",
+            },
+            "structure_type": {
+                "type": "string",
+                "description": "Type of structure to generate (e.g., addresses, products)",
+            },
+        },
+        "required": ["prompt", "structure_type"],
+    },
+)
 async def generate_structured_output(prompt: str, structure_type: str) -> str:
     """
     Generate structured JSON output using OpenAI API
@@ -1132,6 +1527,19 @@ This request is configured to return a structured JSON response that follows the
 """
 
 
+@register_tool(
+    description="Count the number of ducks in ESPN Cricinfo ODI batting stats for a specific page",
+    parameters={
+        "type": "object",
+        "properties": {
+            "page_number": {
+                "type": "integer",
+                "description": "Page number to analyze",
+            },
+        },
+        "required": ["page_number"],
+    },
+)
 async def count_cricket_ducks(page_number: int = 3) -> str:
     """
     Count the number of ducks in ESPN Cricinfo ODI batting stats for a specific page
@@ -1151,10 +1559,10 @@ async def count_cricket_ducks(page_number: int = 3) -> str:
         url = f"https://stats.espncricinfo.com/ci/engine/stats/index.html?class=2;page={page_number};template=results;type=batting"
 
         # Fetch the page content
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            html_content = response.text
+        client = get_http_client()
+        response = await client.get(url)
+        response.raise_for_status()
+        html_content = response.text
 
         # Parse the HTML
         soup = BeautifulSoup(html_content, "html.parser")
@@ -1214,6 +1622,27 @@ The total number of ducks across all players on page {page_number} is: **{total_
         return f"Error counting cricket ducks: {str(e)}"
 
 
+@register_tool(
+    description="Get movie information from IMDb with ratings in a specific range",
+    parameters={
+        "type": "object",
+        "properties": {
+            "min_rating": {
+                "type": "number",
+                "description": "Minimum rating to filter by",
+            },
+            "max_rating": {
+                "type": "number",
+                "description": "Maximum rating to filter by",
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum number of movies to return",
+            },
+        },
+        "required": ["min_rating", "max_rating"],
+    },
+)
 async def get_imdb_movies(
     min_rating: float = 7.0, max_rating: float = 8.0, limit: int = 25
 ) -> str:
@@ -1243,10 +1672,10 @@ async def get_imdb_movies(
         }
 
         # Fetch the page content
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            html_content = response.text
+        client = get_http_client()
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        html_content = response.text
 
         # Parse the HTML
         soup = BeautifulSoup(html_content, "html.parser")
@@ -1304,6 +1733,19 @@ Retrieved {len(movies)} movies with ratings between {min_rating} and {max_rating
         return f"Error retrieving IMDb movies: {str(e)}"
 
 
+@register_tool(
+    description="Generate a Markdown outline from Wikipedia headings for a country",
+    parameters={
+        "type": "object",
+        "properties": {
+            "country": {
+                "type": "string",
+                "description": "Name of the country",
+            },
+        },
+        "required": ["country"],
+    },
+)
 async def generate_country_outline(country: str) -> str:
     """
     Generate a Markdown outline from Wikipedia headings for a country
@@ -1324,10 +1766,10 @@ async def generate_country_outline(country: str) -> str:
         url = f"https://en.wikipedia.org/wiki/{formatted_country}"
 
         # Fetch the Wikipedia page
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            html_content = response.text
+        client = get_http_client()
+        response = await client.get(url)
+        response.raise_for_status()
+        html_content = response.text
 
         # Parse the HTML
         soup = BeautifulSoup(html_content, "html.parser")
@@ -1384,6 +1826,20 @@ async def generate_country_outline(country: str) -> str:
         return f"Error generating country outline: {str(e)}"
 
 
+@register_tool(
+    description="Get weather forecast for a city using BBC Weather API",
+    parameters={
+        "type": "object",
+        "properties": {
+            "city": {
+                "type": "string",
+                "description": "Name of the city",
+            },
+        },
+        "required": ["city"],
+    },
+    cache_ttl=0,
+)
 async def get_weather_forecast(city: str) -> str:
     """
     Get weather forecast for a city using BBC Weather API
@@ -1411,41 +1867,41 @@ async def get_weather_forecast(city: str) -> str:
             "format": "json",
         }
 
-        async with httpx.AsyncClient() as client:
-            # Get location ID
-            response = await client.get(locator_url, params=params)
-            response.raise_for_status()
-            location_data = response.json()
+        client = get_http_client()
+        # Get location ID
+        response = await client.get(locator_url, params=params)
+        response.raise_for_status()
+        location_data = response.json()
 
-            if (
-                not location_data.get("locations")
-                or len(location_data["locations"]) == 0
-            ):
-                return f"Could not find location ID for {city}"
+        if (
+            not location_data.get("locations")
+            or len(location_data["locations"]) == 0
+        ):
+            return f"Could not find location ID for {city}"
 
-            location_id = location_data["locations"][0]["id"]
+        location_id = location_data["locations"][0]["id"]
 
-            # Step 2: Get the weather forecast using the location ID
-            weather_url = f"https://weather-broker-cdn.api.bbci.co.uk/en/forecast/aggregated/{location_id}"
-            weather_response = await client.get(weather_url)
-            weather_response.raise_for_status()
-            weather_data = weather_response.json()
+        # Step 2: Get the weather forecast using the location ID
+        weather_url = f"https://weather-broker-cdn.api.bbci.co.uk/en/forecast/aggregated/{location_id}"
+        weather_response = await client.get(weather_url)
+        weather_response.raise_for_status()
+        weather_data = weather_response.json()
 
-            # Step 3: Extract the forecast data
-            forecasts = weather_data.get("forecasts", [{}])[0].get("forecasts", [])
+        # Step 3: Extract the forecast data
+        forecasts = weather_data.get("forecasts", [{}])[0].get("forecasts", [])
 
-            # Create a dictionary mapping dates to weather descriptions
-            weather_forecast = {}
-            for forecast in forecasts:
-                local_date = forecast.get("localDate")
-                description = forecast.get("enhancedWeatherDescription")
-                if local_date and description:
-                    weather_forecast[local_date] = description
+        # Create a dictionary mapping dates to weather descriptions
+        weather_forecast = {}
+        for forecast in forecasts:
+            local_date = forecast.get("localDate")
+            description = forecast.get("enhancedWeatherDescription")
+            if local_date and description:
+                weather_forecast[local_date] = description
 
-            # Format as JSON
-            forecast_json = json.dumps(weather_forecast, indent=2)
+        # Format as JSON
+        forecast_json = json.dumps(weather_forecast, indent=2)
 
-            return f"""
+        return f"""
 # Weather Forecast for {city}
 
 ## Location Details
@@ -1465,6 +1921,19 @@ Retrieved weather forecast for {len(weather_forecast)} days.
         return f"Error retrieving weather forecast: {str(e)}"
 
 
+@register_tool(
+    description="Generate a JSON body for OpenAI's vision API to extract text from an image",
+    parameters={
+        "type": "object",
+        "properties": {
+            "image_url": {
+                "type": "string",
+                "description": "Base64 URL of the image",
+            },
+        },
+        "required": ["image_url"],
+    },
+)
 async def generate_vision_api_request(image_url: str) -> str:
     """
     Generate a JSON body for OpenAI's vision API to extract text from an image
@@ -1515,6 +1984,21 @@ The following JSON body can be sent to the OpenAI API to extract text from an im
         return f"Error generating vision API request: {str(e)}"
 
 
+@register_tool(
+    description="Generate a JSON body for OpenAI's embeddings API",
+    parameters={
+        "type": "object",
+        "properties": {
+            "texts": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "List of texts to generate embeddings for",
+            },
+        },
+        "required": ["texts"],
+    },
+    defaults={"texts": []},
+)
 async def generate_embeddings_request(texts: List[str]) -> str:
     """
     Generate a JSON body for OpenAI's embeddings API
@@ -1557,40 +2041,56 @@ The following JSON body can be sent to the OpenAI API to generate embeddings:
         return f"Error generating embeddings request: {str(e)}"
 
 
-async def find_most_similar_phrases(embeddings_dict: Dict[str, List[float]]) -> str:
+@register_tool(
+    description="Find the most similar pair of phrases based on cosine similarity of their embeddings",
+    parameters={
+        "type": "object",
+        "properties": {
+            "embeddings_dict": {
+                "type": "object",
+                "additionalProperties": {
+                    "type": "array",
+                    "items": {"type": "number"},
+                },
+                "description": "Dictionary mapping phrases to their embeddings",
+            },
+            "top_k": {
+                "type": "integer",
+                "description": "Number of most similar pairs to list (default: 1)",
+            },
+        },
+        "required": ["embeddings_dict"],
+    },
+    defaults={"embeddings_dict": {}},
+    pool="thread",
+)
+async def find_most_similar_phrases(
+    embeddings_dict: Dict[str, List[float]], top_k: int = 1
+) -> str:
     """
     Find the most similar pair of phrases based on cosine similarity of their embeddings
 
     Args:
         embeddings_dict: Dictionary mapping phrases to their embeddings
+        top_k: Number of most similar pairs to list
 
     Returns:
         The most similar pair of phrases
     """
     try:
-        import numpy as np
-        from itertools import combinations
-
-        # Function to calculate cosine similarity
-        def cosine_similarity(vec1, vec2):
-            dot_product = np.dot(vec1, vec2)
-            norm_vec1 = np.linalg.norm(vec1)
-            norm_vec2 = np.linalg.norm(vec2)
-            return dot_product / (norm_vec1 * norm_vec2)
+        from app.utils.similarity import most_similar_pairs
 
         # Convert dictionary to lists for easier processing
         phrases = list(embeddings_dict.keys())
         embeddings = list(embeddings_dict.values())
 
-        # Calculate similarity for each pair
-        max_similarity = -1
-        most_similar_pair = None
+        if len(phrases) < 2:
+            return "Error finding most similar phrases: at least two phrases are needed"
 
-        for i, j in combinations(range(len(phrases)), 2):
-            similarity = cosine_similarity(embeddings[i], embeddings[j])
-            if similarity > max_similarity:
-                max_similarity = similarity
-                most_similar_pair = (phrases[i], phrases[j])
+        # All pairs at once: one matrix multiply per block of the upper triangle
+        pairs = most_similar_pairs(phrases, embeddings, k=max(1, top_k))
+        most_similar_pair = pairs[0][:2]
+        max_similarity = pairs[0][2]
 
         # Generate Python code for the solution
         solution_code = """
@@ -1605,39 +2105,37 @@ def most_similar(embeddings):
         Tuple of the two most similar phrases
     \"\"\"
     import numpy as np
-    from itertools import combinations
-
-    # Function to calculate cosine similarity
-    def cosine_similarity(vec1, vec2):
-        dot_product = np.dot(vec1, vec2)
-        norm_vec1 = np.linalg.norm(vec1)
-        norm_vec2 = np.linalg.norm(vec2)
-        return dot_product / (norm_vec1 * norm_vec2)
 
     # Convert dictionary to lists for easier processing
     phrases = list(embeddings.keys())
-    embeddings_list = list(embeddings.values())
+    matrix = np.array(list(embeddings.values()), dtype=float)
 
-    # Calculate similarity for each pair
-    max_similarity = -1
-    most_similar_pair = None
+    # Normalise the rows so a matrix product gives every cosine similarity
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    similarities = matrix @ matrix.T
 
-    for i, j in combinations(range(len(phrases)), 2):
-        similarity = cosine_similarity(embeddings_list[i], embeddings_list[j])
-        if similarity > max_similarity:
-            max_similarity = similarity
-            most_similar_pair = (phrases[i], phrases[j])
+    # Only pairs i < j count: mask the diagonal and the lower triangle
+    similarities[np.tril_indices(len(phrases))] = -np.inf
 
-    return most_similar_pair
+    i, j = np.unravel_index(np.argmax(similarities), similarities.shape)
+    return (phrases[i], phrases[j])
 """
 
+        top_pairs = ""
+        if top_k > 1:
+            ranked = "\n".join(
+                f"{rank}. {a} and {b} ({score:.4f})"
+                for rank, (a, b, score) in enumerate(pairs, start=1)
+            )
+            top_pairs = f"\n## Top {len(pairs)} Pairs\n{ranked}\n"
+
         return f"""
 # Most Similar Phrases Analysis
 
 ## Result
 The most similar pair of phrases is: {most_similar_pair[0]} and {most_similar_pair[1]}
 Similarity score: {max_similarity:.4f}
-
+{top_pairs}
 ## Python Solution
 ```python
 {solution_code}
@@ -1646,7 +2144,7 @@ Similarity score: {max_similarity:.4f}
 ## Explanation
 This function:
 
-1. Calculates the cosine similarity between each pair of embeddings
+1. Normalises the embeddings and computes every cosine similarity with one matrix product
 2. Identifies the pair with the highest similarity score
 3. Returns the two phrases as a tuple
 """
@@ -1654,6 +2152,25 @@ This function:
         return f"Error finding most similar phrases: {str(e)}"
 
 
+@register_tool(
+    description="Compute similarity between a query and a list of documents using embeddings",
+    parameters={
+        "type": "object",
+        "properties": {
+            "docs": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "List of document texts",
+            },
+            "query": {
+                "type": "string",
+                "description": "Query string to compare against documents",
+            },
+        },
+        "required": ["docs", "query"],
+    },
+    defaults={"docs": [], "query": ""},
+)
 async def compute_document_similarity(docs: List[str], query: str) -> str:
     """
     Compute similarity between a query and a list of documents using embeddings
@@ -1666,52 +2183,35 @@ async def compute_document_similarity(docs: List[str], query: str) -> str:
         JSON response with the most similar documents
     """
     try:
-        import numpy as np
         import json
-        import httpx
-        from typing import List, Dict
-
-        # Function to calculate cosine similarity
-        def cosine_similarity(vec1, vec2):
-            dot_product = np.dot(vec1, vec2)
-            norm_vec1 = np.linalg.norm(vec1)
-            norm_vec2 = np.linalg.norm(vec2)
-            return dot_product / (norm_vec1 * norm_vec2)
-
-        # Function to get embeddings from OpenAI API
-        async def get_embedding(text: str) -> List[float]:
-            url = "https://api.openai.com/v1/embeddings"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": "Bearer dummy_api_key",  # Replace with actual API key in production
-            }
-            payload = {"model": "text-embedding-3-small", "input": text}
-
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                result = response.json()
-                return result["data"][0]["embedding"]
-
-        # Get embeddings for query and documents
-        query_embedding = await get_embedding(query)
-        doc_embeddings = []
-
-        for doc in docs:
-            doc_embedding = await get_embedding(doc)
-            doc_embeddings.append(doc_embedding)
-
-        # Calculate similarities
-        similarities = []
-        for i, doc_embedding in enumerate(doc_embeddings):
-            similarity = cosine_similarity(query_embedding, doc_embedding)
-            similarities.append((i, similarity))
-
-        # Sort by similarity (descending)
-        similarities.sort(key=lambda x: x[1], reverse=True)
-
-        # Get top 3 matches (or fewer if less than 3 documents)
-        top_matches = similarities[: min(3, len(similarities))]
+        import asyncio
+        from app.utils.ann_index import ANN_MIN_DOCS, build_index, find_index
+        from app.utils.embedding_backends import get_embedding_backend
+        from app.utils.similarity import top_k_similar
+
+        # Embed with the configured backend: batched API requests backed by
+        # the local store, or the offline local model
+        backend = get_embedding_backend()
+
+        if len(docs) >= ANN_MIN_DOCS:
+            # Large corpora go through an approximate nearest-neighbour index,
+            # keyed by the documents so later queries only embed the query
+            key = backend.corpus_key(docs)
+            index = await asyncio.to_thread(find_index, key)
+            if index is None:
+                query_embedding, doc_embeddings = await backend.embed_query_and_docs(
+                    query, docs
+                )
+                index = await asyncio.to_thread(build_index, key, doc_embeddings)
+            else:
+                query_embedding = await backend.embed_query(query, docs)
+            top_matches = list(zip(*index.search(query_embedding, k=3)))
+        else:
+            # Rank every document at once and keep the top 3 (or fewer)
+            query_embedding, doc_embeddings = await backend.embed_query_and_docs(
+                query, docs
+            )
+            top_matches = top_k_similar(query_embedding, doc_embeddings, k=3)
 
         # Get the matching documents
         matches = [docs[idx] for idx, _ in top_matches]
@@ -1742,15 +2242,8 @@ class SimilarityRequest(BaseModel):
 
 @app.post("/similarity")
 async def compute_similarity(request: SimilarityRequest):
-    # Function to calculate cosine similarity
-    def cosine_similarity(vec1, vec2):
-        dot_product = np.dot(vec1, vec2)
-        norm_vec1 = np.linalg.norm(vec1)
-        norm_vec2 = np.linalg.norm(vec2)
-        return dot_product / (norm_vec1 * norm_vec2)
-    
-    # Function to get embeddings from OpenAI API
-    async def get_embedding(text: str):
+    # Embed many texts in one request; the API accepts a list as input
+    async def get_embeddings(texts: List[str]):
         url = "https://api.openai.com/v1/embeddings"
         headers = {
             "Content-Type": "application/json",
@@ -1758,38 +2251,31 @@ async def compute_similarity(request: SimilarityRequest):
         }
         payload = {
             "model": "text-embedding-3-small",
-            "input": text
+            "input": texts
         }
         
         async with httpx.AsyncClient() as client:
             response = await client.post(url, json=payload, headers=headers)
             response.raise_for_status()
             result = response.json()
-            return result["data"][0]["embedding"]
+            data = sorted(result["data"], key=lambda item: item["index"])
+            return np.array([item["embedding"] for item in data])
     
     try:
-        # Get embeddings for query and documents
-        query_embedding = await get_embedding(request.query)
-        doc_embeddings = []
-        
-        for doc in request.docs:
-            doc_embedding = await get_embedding(doc)
-            doc_embeddings.append(doc_embedding)
+        # Get embeddings for the query and all documents in one round trip
+        embeddings = await get_embeddings([request.query] + request.docs)
+        query_embedding, doc_embeddings = embeddings[0], embeddings[1:]
         
-        # Calculate similarities
-        similarities = []
-        for i, doc_embedding in enumerate(doc_embeddings):
-            similarity = cosine_similarity(query_embedding, doc_embedding)
-            similarities.append((i, similarity))
-        
-        # Sort by similarity (descending)
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        # Cosine similarity of every document with one matrix-vector product
+        doc_embeddings = doc_embeddings / np.linalg.norm(doc_embeddings, axis=1, keepdims=True)
+        query_embedding = query_embedding / np.linalg.norm(query_embedding)
+        similarities = doc_embeddings @ query_embedding
         
         # Get top 3 matches (or fewer if less than 3 documents)
-        top_matches = similarities[:min(3, len(similarities))]
+        top_matches = np.argsort(-similarities, kind="stable")[:3]
         
         # Get the matching documents
-        matches = [request.docs[idx] for idx, _ in top_matches]
+        matches = [request.docs[idx] for idx in top_matches]
         
         return {"matches": matches}
     
@@ -1830,6 +2316,20 @@ http://127.0.0.1:8000/similarity
         return f"Error computing document similarity: {str(e)}"
 
 
+@register_tool(
+    description="Parse a natural language query to determine which function to call and extract parameters",
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "Natural language query",
+            },
+        },
+        "required": ["query"],
+    },
+    defaults={"query": ""},
+)
 async def parse_function_call(query: str) -> str:
     """
     Parse a natural language query to determine which function to call and extract parameters
@@ -1991,6 +2491,14 @@ GET http://127.0.0.1:8000/execute?q={query.replace(" ", "%20")}
         return f"Error parsing function call: {str(e)}"
 
 
+@register_tool(
+    description="Get the minimum latitude of Delhi, India using the Nominatim API",
+    parameters={
+        "type": "object",
+        "properties": {},
+        "required": [],
+    },
+)
 async def get_delhi_bounding_box() -> str:
     """
     Get the minimum latitude of Delhi, India using the Nominatim API
@@ -2017,42 +2525,51 @@ async def get_delhi_bounding_box() -> str:
         # Headers to identify our application (required by Nominatim usage policy)
         headers = {"User-Agent": "LocationDataRetriever/1.0"}
 
-        async with httpx.AsyncClient() as client:
-            # Add a small delay to respect rate limits
-            await asyncio.sleep(1)
+        client = get_http_client()
+        # Add a small delay to respect rate limits
+        await asyncio.sleep(1)
 
-            # Make the request
-            response = await client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            results = response.json()
+        # Make the request
+        response = await client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        results = response.json()
 
-            if not results:
-                return "No results found for Delhi, India"
+        if not results:
+            return "No results found for Delhi, India"
 
-            # Find the correct Delhi (capital city)
-            delhi = None
-            for result in results:
-                if "New Delhi" in result.get("display_name", ""):
-                    delhi = result
-                    break
+        # Find the correct Delhi (capital city)
+        delhi = None
+        for result in results:
+            if "New Delhi" in result.get("display_name", ""):
+                delhi = result
+                break
 
-            # If we didn't find New Delhi specifically, use the first result
-            if not delhi and results:
-                delhi = results[0]
+        # If we didn't find New Delhi specifically, use the first result
+        if not delhi and results:
+            delhi = results[0]
 
-            if delhi and "boundingbox" in delhi:
-                # Extract the minimum latitude from the bounding box
-                min_lat = delhi["boundingbox"][0]
+        if delhi and "boundingbox" in delhi:
+            # Extract the minimum latitude from the bounding box
+            min_lat = delhi["boundingbox"][0]
 
-                # Return just the minimum latitude value
-                return min_lat
-            else:
-                return "Bounding box information not available for Delhi"
+            # Return just the minimum latitude value
+            return min_lat
+        else:
+            return "Bounding box information not available for Delhi"
 
     except Exception as e:
         return f"Error retrieving Delhi bounding box: {str(e)}"
 
 
+@register_tool(
+    description="Find the latest Hacker News post mentioning DuckDB with at least 71 points",
+    parameters={
+        "type": "object",
+        "properties": {},
+        "required": [],
+    },
+    cache_ttl=0,
+)
 async def find_duckdb_hn_post() -> str:
     """
     Find the latest Hacker News post mentioning DuckDB with at least 71 points
@@ -2070,43 +2587,43 @@ async def find_duckdb_hn_post() -> str:
         # Parameters for the request
         params = {"q": "DuckDB", "points": "71"}  # Search term  # Minimum points
 
-        async with httpx.AsyncClient() as client:
-            # Make the request
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            rss_content = response.text
+        client = get_http_client()
+        # Make the request
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        rss_content = response.text
 
-            # Parse the XML content
-            root = ET.fromstring(rss_content)
+        # Parse the XML content
+        root = ET.fromstring(rss_content)
 
-            # Find all items in the RSS feed
-            items = root.findall(".//item")
+        # Find all items in the RSS feed
+        items = root.findall(".//item")
 
-            if not items:
-                return "No Hacker News posts found mentioning DuckDB with at least 71 points"
+        if not items:
+            return "No Hacker News posts found mentioning DuckDB with at least 71 points"
 
-            # Get the first (most recent) item
-            latest_item = items[0]
+        # Get the first (most recent) item
+        latest_item = items[0]
 
-            # Extract information from the item
-            title = (
-                latest_item.find("title").text
-                if latest_item.find("title") is not None
-                else "No title"
-            )
-            link = (
-                latest_item.find("link").text
-                if latest_item.find("link") is not None
-                else "No link"
-            )
-            pub_date = (
-                latest_item.find("pubDate").text
-                if latest_item.find("pubDate") is not None
-                else "No date"
-            )
+        # Extract information from the item
+        title = (
+            latest_item.find("title").text
+            if latest_item.find("title") is not None
+            else "No title"
+        )
+        link = (
+            latest_item.find("link").text
+            if latest_item.find("link") is not None
+            else "No link"
+        )
+        pub_date = (
+            latest_item.find("pubDate").text
+            if latest_item.find("pubDate") is not None
+            else "No date"
+        )
 
-            # Create a detailed response
-            return f"""
+        # Create a detailed response
+        return f"""
 # Latest Hacker News Post About DuckDB
 
 ## Post Information
@@ -2133,6 +2650,15 @@ This data can be used for:
         return f"Error finding DuckDB Hacker News post: {str(e)}"
 
 
+@register_tool(
+    description="Find the newest GitHub user in Seattle with over 130 followers",
+    parameters={
+        "type": "object",
+        "properties": {},
+        "required": [],
+    },
+    cache_ttl=0,
+)
 async def find_newest_seattle_github_user() -> str:
     """
     Find the newest GitHub user in Seattle with over 130 followers
@@ -2162,47 +2688,47 @@ async def find_newest_seattle_github_user() -> str:
             "User-Agent": "GitHubUserFinder/1.0",
         }
 
-        async with httpx.AsyncClient() as client:
-            # Make the request
-            response = await client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            search_results = response.json()
+        client = get_http_client()
+        # Make the request
+        response = await client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        search_results = response.json()
 
-            if not search_results.get("items"):
-                return "No GitHub users found in Seattle with over 130 followers"
+        if not search_results.get("items"):
+            return "No GitHub users found in Seattle with over 130 followers"
 
-            # Get the newest user
-            newest_user = None
-            cutoff_date = datetime.fromisoformat(
-                "2025-03-19T13:51:09Z".replace("Z", "+00:00")
-            )
+        # Get the newest user
+        newest_user = None
+        cutoff_date = datetime.fromisoformat(
+            "2025-03-19T13:51:09Z".replace("Z", "+00:00")
+        )
 
-            for user in search_results["items"]:
-                # Get detailed user information
-                user_url = user["url"]
-                user_response = await client.get(user_url, headers=headers)
-                user_response.raise_for_status()
-                user_details = user_response.json()
-
-                # Check if the user has a created_at date
-                if "created_at" in user_details:
-                    created_at = datetime.fromisoformat(
-                        user_details["created_at"].replace("Z", "+00:00")
-                    )
-
-                    # Ignore users who joined after the cutoff date
-                    if created_at < cutoff_date:
-                        newest_user = user_details
-                        break
+        for user in search_results["items"]:
+            # Get detailed user information
+            user_url = user["url"]
+            user_response = await client.get(user_url, headers=headers)
+            user_response.raise_for_status()
+            user_details = user_response.json()
+
+            # Check if the user has a created_at date
+            if "created_at" in user_details:
+                created_at = datetime.fromisoformat(
+                    user_details["created_at"].replace("Z", "+00:00")
+                )
 
-            if not newest_user:
-                return "No valid GitHub users found in Seattle with over 130 followers"
+                # Ignore users who joined after the cutoff date
+                if created_at < cutoff_date:
+                    newest_user = user_details
+                    break
 
-            # Extract the created_at date
-            created_at = newest_user.get("created_at")
+        if not newest_user:
+            return "No valid GitHub users found in Seattle with over 130 followers"
 
-            # Create a detailed response
-            return f"""
+        # Extract the created_at date
+        created_at = newest_user.get("created_at")
+
+        # Create a detailed response
+        return f"""
 # Newest GitHub User in Seattle with 130+ Followers
 
 ## User Information
@@ -2234,6 +2760,23 @@ This data can be used for:
         return f"Error finding newest Seattle GitHub user: {str(e)}"
 
 
+@register_tool(
+    description="Create a GitHub Action workflow that runs daily and adds a commit",
+    parameters={
+        "type": "object",
+        "properties": {
+            "email": {
+                "type": "string",
+                "description": "Email to include in the step name",
+            },
+            "repository_url": {
+                "type": "string",
+                "description": "Optional repository URL",
+            },
+        },
+        "required": ["email"],
+    },
+)
 async def create_github_action_workflow(email: str, repository_url: str = None) -> str:
     """
     Create a GitHub Action workflow that runs daily and adds a commit
@@ -2310,99 +2853,141 @@ You can also trigger this workflow manually from the Actions tab in your reposit
         return f"Error creating GitHub Action workflow: {str(e)}"
 
 
-async def extract_tables_from_pdf(file_path: str) -> str:
+@register_tool(
+    description="Extract tables from a PDF mark sheet, filter the students and aggregate a subject's marks, e.g. the total Biology marks of students who scored 17 or more marks in Physics in groups 43-66 (inclusive)",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the PDF file",
+            },
+            "filters": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "column": {
+                            "type": "string",
+                            "description": "Column to test, e.g. Physics or Group",
+                        },
+                        "op": {
+                            "type": "string",
+                            "enum": [">=", ">", "<=", "<", "==", "!=", "between", "in"],
+                            "description": "Comparison",
+                        },
+                        "value": {
+                            "description": "Value to compare with; [low, high] for between, a list for in",
+                        },
+                    },
+                    "required": ["column", "op", "value"],
+                },
+                "description": "Conditions students must all meet (default: Physics >= 17 and Group between 43 and 66)",
+            },
+            "target_column": {
+                "type": "string",
+                "description": "Column to aggregate (default: Biology)",
+            },
+            "aggregate": {
+                "type": "string",
+                "enum": ["sum", "mean", "median", "min", "max", "count"],
+                "description": "Aggregate to compute (default: sum)",
+            },
+        },
+        "required": ["file_path"],
+    },
+    pool="thread",
+    max_concurrency=2,
+)
+async def extract_tables_from_pdf(
+    file_path: str,
+    filters: Optional[List[Dict[str, Any]]] = None,
+    target_column: str = "Biology",
+    aggregate: str = "sum",
+) -> str:
     """
-    Extract tables from a PDF file and calculate the total Biology marks of students
-    who scored 17 or more marks in Physics in groups 43-66 (inclusive)
+    Extract tables from a PDF mark sheet, filter the students and aggregate one
+    column. The defaults answer the original question: the total Biology marks
+    of students who scored 17 or more marks in Physics in groups 43-66 (inclusive)
+
+    The combined table is cached per PDF, so another variant of the question
+    about the same file only re-runs the filter.
 
     Args:
         file_path: Path to the PDF file
+        filters: Conditions such as {"column": "Physics", "op": ">=", "value": 17}
+        target_column: Column to aggregate
+        aggregate: sum, mean, median, min, max or count
 
     Returns:
-        Total Biology marks of filtered students
+        The aggregate of the filtered students' marks
     """
     try:
-        import tabula
-        import pandas as pd
-        import os
-        import tempfile
-
-        # Create a temporary directory to store extracted files
-        temp_dir = tempfile.mkdtemp()
-
-        try:
-            # Extract tables from the PDF
-            tables = tabula.read_pdf(file_path, pages="all", multiple_tables=True)
-
-            if not tables:
-                return "No tables found in the PDF."
-
-            # Combine all tables into a single DataFrame
-            combined_df = pd.concat(tables, ignore_index=True)
-
-            # Clean column names (remove any whitespace)
-            combined_df.columns = combined_df.columns.str.strip()
-
-            # Ensure the required columns exist
-            required_columns = ["Group", "Physics", "Biology"]
-            missing_columns = [
-                col for col in required_columns if col not in combined_df.columns
-            ]
-
-            if missing_columns:
-                return f"Missing required columns: {', '.join(missing_columns)}"
+        from app.utils.pdf_tables import (
+            AGGREGATES,
+            load_pdf_table,
+            parse_filters,
+            query_table,
+        )
 
-            # Convert marks columns to numeric, coercing errors to NaN
-            for col in ["Physics", "Biology"]:
-                combined_df[col] = pd.to_numeric(combined_df[col], errors="coerce")
+        # Combined, typed table; extracted once per PDF and then served from cache
+        combined_df = load_pdf_table(file_path)
 
-            # Convert Group column to numeric if it's not already
-            combined_df["Group"] = pd.to_numeric(combined_df["Group"], errors="coerce")
+        if combined_df.empty:
+            return "No tables found in the PDF."
 
-            # Filter students based on criteria:
-            # 1. Physics marks >= 17
-            # 2. Group between 43 and 66 (inclusive)
-            filtered_df = combined_df[
-                (combined_df["Physics"] >= 17)
-                & (combined_df["Group"] >= 43)
-                & (combined_df["Group"] <= 66)
-            ]
+        # Filter students and aggregate the target column with vectorised masks
+        table_filters = parse_filters(filters)
+        try:
+            result, filtered_df = query_table(
+                combined_df, table_filters, target_column.strip(), aggregate
+            )
+        except KeyError as e:
+            return f"Missing required columns: {e.args[0]}"
 
-            # Calculate the total Biology marks
-            total_biology_marks = filtered_df["Biology"].sum()
+        criteria = "\n".join(f"- {f.describe()}" for f in table_filters)
+        label = f"{AGGREGATES[aggregate]} {target_column.strip()} marks"
 
-            # Create a detailed response
-            return f"""
+        # Create a detailed response
+        return f"""
 # PDF Table Analysis: Student Marks
 
 ## Analysis Criteria
-- Students with Physics marks ≥ 17
-- Students in groups 43-66 (inclusive)
+{criteria}
 
 ## Results
 - Total number of students meeting criteria: {len(filtered_df)}
-- **Total Biology marks: {total_biology_marks}**
+- **{label}: {result}**
 
 ## Data Processing Steps
 1. Extracted tables from PDF using tabula
 2. Combined all tables into a single dataset
 3. Converted marks to numeric values
-4. Filtered students based on Physics marks and Group
-5. Calculated sum of Biology marks for filtered students
+4. Filtered students based on the criteria above
+5. Calculated the {aggregate} of {target_column.strip()} marks for filtered students
 
 ## Sample of Filtered Data
 {filtered_df.head(5).to_string(index=False) if not filtered_df.empty else "No students matched the criteria"}
 """
-        finally:
-            # Clean up the temporary directory
-            import shutil
-
-            shutil.rmtree(temp_dir, ignore_errors=True)
 
     except Exception as e:
         return f"Error extracting tables from PDF: {str(e)}"
 
 
+@register_tool(
+    description="Convert a PDF file to Markdown and format it with Prettier",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the PDF file",
+            },
+        },
+        "required": ["file_path"],
+    },
+    pool="thread",
+)
 async def convert_pdf_to_markdown(file_path: str) -> str:
     """
     Convert a PDF file to Markdown and format it with Prettier
@@ -2414,92 +2999,56 @@ async def convert_pdf_to_markdown(file_path: str) -> str:
         Formatted Markdown content
     """
     try:
-        import PyPDF2
         import re
-        import subprocess
-        import os
-        import tempfile
+        from app.utils.pdf_pages import extract_pdf_text
+        from app.utils.prettier import format_markdown
 
-        # Create a temporary directory
-        temp_dir = tempfile.mkdtemp()
-        raw_md_path = os.path.join(temp_dir, "raw_content.md")
-        formatted_md_path = os.path.join(temp_dir, "formatted_content.md")
+        # Extract text from PDF, pages in parallel and cached per page
+        text = "".join(extract_pdf_text(file_path))
 
-        try:
-            # Extract text from PDF
-            with open(file_path, "rb") as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text()
-
-            # Basic conversion to Markdown
-            # Replace multiple newlines with double newlines for paragraphs
-            markdown_text = re.sub(r"\n{3,}", "\n\n", text)
-
-            # Handle headings (assuming headings are in larger font or bold)
-            # This is a simplified approach - real implementation would need more sophisticated detection
-            lines = markdown_text.split("\n")
-            processed_lines = []
-
-            for line in lines:
-                # Strip line
-                stripped_line = line.strip()
-
-                # Skip empty lines
-                if not stripped_line:
-                    processed_lines.append("")
-                    continue
+        # Basic conversion to Markdown
+        # Replace multiple newlines with double newlines for paragraphs
+        markdown_text = re.sub(r"\n{3,}", "\n\n", text)
 
-                # Detect potential headings (simplified approach)
-                if len(stripped_line) < 100 and stripped_line.endswith(":"):
-                    # Assume this is a heading
-                    processed_lines.append(f"## {stripped_line[:-1]}")
-                elif len(stripped_line) < 50 and stripped_line.isupper():
-                    # Assume this is a main heading
-                    processed_lines.append(f"# {stripped_line}")
-                else:
-                    # Regular paragraph
-                    processed_lines.append(stripped_line)
+        # Handle headings (assuming headings are in larger font or bold)
+        # This is a simplified approach - real implementation would need more sophisticated detection
+        lines = markdown_text.split("\n")
+        processed_lines = []
 
-            # Join processed lines
-            markdown_text = "\n\n".join(processed_lines)
+        for line in lines:
+            # Strip line
+            stripped_line = line.strip()
 
-            # Handle bullet points
-            markdown_text = re.sub(r"•\s*", "* ", markdown_text)
+            # Skip empty lines
+            if not stripped_line:
+                processed_lines.append("")
+                continue
 
-            # Handle numbered lists
-            markdown_text = re.sub(r"(\d+)\.\s+", r"\1. ", markdown_text)
+            # Detect potential headings (simplified approach)
+            if len(stripped_line) < 100 and stripped_line.endswith(":"):
+                # Assume this is a heading
+                processed_lines.append(f"## {stripped_line[:-1]}")
+            elif len(stripped_line) < 50 and stripped_line.isupper():
+                # Assume this is a main heading
+                processed_lines.append(f"# {stripped_line}")
+            else:
+                # Regular paragraph
+                processed_lines.append(stripped_line)
 
-            # Write raw markdown to file
-            with open(raw_md_path, "w", encoding="utf-8") as md_file:
-                md_file.write(markdown_text)
+        # Join processed lines
+        markdown_text = "\n\n".join(processed_lines)
 
-            # Format with Prettier
-            try:
-                # Install Prettier if not already installed
-                subprocess.run(
-                    ["npm", "install", "--no-save", "prettier@3.4.2"],
-                    cwd=temp_dir,
-                    check=True,
-                    capture_output=True,
-                )
+        # Handle bullet points
+        markdown_text = re.sub(r"•\s*", "* ", markdown_text)
 
-                # Run Prettier on the markdown file
-                subprocess.run(
-                    ["npx", "prettier@3.4.2", "--write", raw_md_path],
-                    cwd=temp_dir,
-                    check=True,
-                    capture_output=True,
-                )
+        # Handle numbered lists
+        markdown_text = re.sub(r"(\d+)\.\s+", r"\1. ", markdown_text)
 
-                # Read the formatted markdown
-                with open(raw_md_path, "r", encoding="utf-8") as formatted_file:
-                    formatted_markdown = formatted_file.read()
+        # Format with the shared Prettier worker (Python fallback without Node)
+        try:
+            formatted_markdown, formatter = format_markdown(markdown_text)
 
-                return f"""
+            return f"""
 # PDF to Markdown Conversion
 
 ## Formatted Markdown Content
@@ -2512,7 +3061,7 @@ async def convert_pdf_to_markdown(file_path: str) -> str:
 1. Extracted text from PDF using PyPDF2
 2. Converted text to basic Markdown format
 3. Applied formatting rules for headings, lists, and paragraphs
-4. Formatted the Markdown with Prettier v3.4.2
+4. Formatted the Markdown with {formatter}
 
 ## Usage Notes
 This formatted Markdown can be used in:
@@ -2522,9 +3071,9 @@ This formatted Markdown can be used in:
 - Educational resources
 - Knowledge bases
 """
-            except subprocess.CalledProcessError as e:
-                # If Prettier fails, return the unformatted markdown
-                return f"""
+        except ValueError as e:
+            # If Prettier rejects the input, return the unformatted markdown
+            return f"""
 # PDF to Markdown Conversion (Prettier formatting failed)
 
 ## Markdown Content (Unformatted)
@@ -2533,16 +3082,78 @@ This formatted Markdown can be used in:
 ## Error Details
 Failed to format with Prettier: {str(e)}
 """
-        finally:
-            # Clean up the temporary directory
-            import shutil
-
-            shutil.rmtree(temp_dir, ignore_errors=True)
 
     except Exception as e:
         return f"Error converting PDF to Markdown: {str(e)}"
 
 
+async def calculate_prettier_sha256(file_path: str) -> str:
+    """
+    Format a file with Prettier and hash the result
+
+    Args:
+        file_path: Path to the Markdown file
+
+    Returns:
+        Output of `npx -y prettier@3.4.2 <file> | sha256sum`, or an error when
+        Prettier itself cannot run: the Python fallback formatter's output
+        would hash differently, so its hash is never passed off as Prettier's
+    """
+    try:
+        import asyncio
+        import hashlib
+        from app.utils.prettier import FormatterUnavailable, prettier_daemon
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            source = f.read()
+
+        try:
+            formatted = await asyncio.to_thread(
+                prettier_daemon.format,
+                source,
+                parser="markdown",
+                filepath=os.path.basename(file_path),
+            )
+        except FormatterUnavailable as e:
+            return f"Error: Prettier is unavailable ({e}), cannot compute its SHA-256"
+        digest = hashlib.sha256(formatted.encode("utf-8")).hexdigest()
+        return f"{digest}  -"
+
+    except Exception as e:
+        return f"Error calculating Prettier SHA-256: {str(e)}"
+
+
+@register_tool(
+    description="Clean sales data from Excel and calculate margin for filtered transactions",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the Excel file",
+            },
+            "cutoff_date_str": {
+                "type": "string",
+                "description": "Cutoff date string (e.g., 'Sun Feb 06 2022 18:40:58 GMT+0530 (India Standard Time)')",
+            },
+            "product_filter": {
+                "type": "string",
+                "description": "Product name to filter by (e.g., 'Iota')",
+            },
+            "country_filter": {
+                "type": "string",
+                "description": "Country to filter by after standardization (e.g., 'UK')",
+            },
+        },
+        "required": [
+            "file_path",
+            "cutoff_date_str",
+            "product_filter",
+            "country_filter",
+        ],
+    },
+    pool="process",
+)
 async def clean_sales_data_and_calculate_margin(
     file_path: str, cutoff_date_str: str, product_filter: str, country_filter: str
 ) -> str:
@@ -2797,6 +3408,20 @@ async def clean_sales_data_and_calculate_margin(
         return f"Error processing sales data: {str(e)}\n{traceback.format_exc()}"
 
 
+@register_tool(
+    description="Count unique students in a text file based on student IDs",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the text file with student marks",
+            }
+        },
+        "required": ["file_path"],
+    },
+    pool="thread",
+)
 async def count_unique_students(file_path: str) -> str:
     """
     Count unique students in a text file based on student IDs
@@ -2848,6 +3473,49 @@ async def count_unique_students(file_path: str) -> str:
         return f"Error counting unique students: {str(e)}\n{traceback.format_exc()}"
 
 
+@register_tool(
+    description="Analyze Apache log files to count requests matching specific criteria",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the Apache log file (can be gzipped)",
+            },
+            "section_path": {
+                "type": "string",
+                "description": "Path section to filter (e.g., '/telugump3/')",
+            },
+            "day_of_week": {
+                "type": "string",
+                "description": "Day to filter (e.g., 'Tuesday')",
+            },
+            "start_hour": {
+                "type": "integer",
+                "description": "Starting hour for time window (inclusive)",
+            },
+            "end_hour": {
+                "type": "integer",
+                "description": "Ending hour for time window (exclusive)",
+            },
+            "request_method": {
+                "type": "string",
+                "description": "HTTP method to filter (e.g., 'GET')",
+            },
+            "status_range": {
+                "type": "array",
+                "items": {"type": "integer"},
+                "description": "Tuple of (min_status, max_status) for HTTP status codes",
+            },
+            "timezone_offset": {
+                "type": "string",
+                "description": "Timezone offset in format '+0000' or '-0500'",
+            },
+        },
+        "required": ["file_path"],
+    },
+    pool="thread",
+)
 async def analyze_apache_logs(
     file_path: str,
     section_path: str = None,
@@ -2857,6 +3525,7 @@ async def analyze_apache_logs(
     request_method: str = None,
     status_range: tuple = None,
     timezone_offset: str = None,
+    mode: str = "columnar",
 ) -> str:
     """
     Analyze Apache log files to count requests matching specific criteria
@@ -2870,203 +3539,93 @@ async def analyze_apache_logs(
         request_method: HTTP method to filter (e.g., 'GET')
         status_range: Tuple of (min_status, max_status) for HTTP status codes
         timezone_offset: Timezone offset in format '+0000' or '-0500'
+        mode: "columnar" parses into NumPy columns and filters with vectorised
+            masks, "rows" streams records through Python filters
 
     Returns:
         Count of matching requests and analysis details
     """
     try:
-        import gzip
-        import re
-        from datetime import datetime
-        import calendar
-
-        # Define day name to number mapping
-        day_name_to_num = {
-            "monday": 0,
-            "tuesday": 1,
-            "wednesday": 2,
-            "thursday": 3,
-            "friday": 4,
-            "saturday": 5,
-            "sunday": 6,
-        }
+        from app.utils.apache_logs import (
+            LogParser,
+            hour_of_day,
+            load_log_columns,
+            weekday,
+        )
+        from app.utils.calendars import parse_weekday
 
         # Convert day_of_week to lowercase if provided
+        target_weekday = None
         if day_of_week:
             day_of_week = day_of_week.lower()
-            if day_of_week not in day_name_to_num:
+            try:
+                target_weekday = parse_weekday(day_of_week)
+            except ValueError:
                 return f"Invalid day of week: {day_of_week}"
 
         # Set default status range if not provided
         if status_range is None:
             status_range = (200, 299)
 
-        # Regular expression for parsing Apache log entries
-        # This pattern handles the complex format with quoted fields and unquoted time field
-        log_pattern = r'([^ ]*) ([^ ]*) ([^ ]*) \[([^]]*)\] "([^"]*)" ([^ ]*) ([^ ]*) "([^"]*)" "([^"]*)" "([^"]*)" "([^"]*)"'
-
-        # Open the file (handling gzip if needed)
-        if file_path.endswith(".gz"):
-            open_func = gzip.open
-            mode = "rt"  # text mode for gzip
+        if request_method:
+            request_method = request_method.upper()
+
+        if mode == "columnar":
+            columns = load_log_columns(file_path)
+            mask = columns.filter(
+                section_path=section_path,
+                weekday=target_weekday,
+                start_hour=start_hour,
+                end_hour=end_hour,
+                method=request_method,
+                status_range=status_range,
+                timezone_offset=timezone_offset,
+            )
+            matching_requests = int(mask.sum())
+            total_requests = columns.total
+            parsing_errors = columns.errors
         else:
-            open_func = open
-            mode = "r"
-
-        # Counter for matching requests
-        matching_requests = 0
-        total_requests = 0
-        parsing_errors = 0
-
-        # Process the log file line by line
-        with open_func(file_path, mode, encoding="utf-8", errors="replace") as f:
-            for line in f:
-                total_requests += 1
-
-                try:
-                    # Handle escaped quotes in user agent field
-                    # This is a simplification - for complex cases, a more robust parser might be needed
-                    line = line.replace('\\"', "~~ESCAPED_QUOTE~~")
-
-                    # Parse the log entry
-                    match = re.match(log_pattern, line)
-                    if not match:
-                        parsing_errors += 1
-                        continue
-
-                    # Extract fields
-                    (
-                        ip,
-                        remote_logname,
-                        remote_user,
-                        time_str,
-                        request,
-                        status,
-                        size,
-                        referer,
-                        user_agent,
-                        vhost,
-                        server,
-                    ) = match.groups()
-
-                    # Restore escaped quotes
-                    user_agent = user_agent.replace("~~ESCAPED_QUOTE~~", '"')
-
-                    # Parse the time string
-                    # Format: [01/May/2024:00:00:00 +0000]
-                    time_match = re.match(
-                        r"\[(\d+)/(\w+)/(\d+):(\d+):(\d+):(\d+) ([+-]\d+)\]", time_str
-                    )
-                    if not time_match:
-                        parsing_errors += 1
-                        continue
-
-                    day, month, year, hour, minute, second, log_tz = time_match.groups()
-
-                    # Convert month name to number
-                    month_num = {
-                        "Jan": 1,
-                        "Feb": 2,
-                        "Mar": 3,
-                        "Apr": 4,
-                        "May": 5,
-                        "Jun": 6,
-                        "Jul": 7,
-                        "Aug": 8,
-                        "Sep": 9,
-                        "Oct": 10,
-                        "Nov": 11,
-                        "Dec": 12,
-                    }.get(month, None)
-
-                    if not month_num:
-                        parsing_errors += 1
-                        continue
-
-                    # Create datetime object
-                    log_date = datetime(
-                        int(year),
-                        month_num,
-                        int(day),
-                        int(hour),
-                        int(minute),
-                        int(second),
-                    )
-
-                    # Apply timezone adjustment if needed
-                    if timezone_offset and timezone_offset != log_tz:
-                        # Parse the timezone offsets
-                        log_tz_hours = int(log_tz[1:3])
-                        log_tz_minutes = int(log_tz[3:5])
-                        log_tz_sign = 1 if log_tz[0] == "+" else -1
-                        log_tz_offset = log_tz_sign * (
-                            log_tz_hours * 60 + log_tz_minutes
-                        )
-
-                        target_tz_hours = int(timezone_offset[1:3])
-                        target_tz_minutes = int(timezone_offset[3:5])
-                        target_tz_sign = 1 if timezone_offset[0] == "+" else -1
-                        target_tz_offset = target_tz_sign * (
-                            target_tz_hours * 60 + target_tz_minutes
-                        )
-
-                        # Calculate the difference in minutes
-                        tz_diff_minutes = target_tz_offset - log_tz_offset
-
-                        # Adjust the datetime
-                        from datetime import timedelta
-
-                        log_date = log_date + timedelta(minutes=tz_diff_minutes)
-
-                    # Parse the request
-                    request_parts = request.split()
-                    if len(request_parts) < 2:
-                        parsing_errors += 1
-                        continue
-
-                    method, url = request_parts[0], request_parts[1]
-
-                    # Apply filters
-
-                    # 1. Check day of week
-                    if (
-                        day_of_week
-                        and log_date.weekday() != day_name_to_num[day_of_week]
-                    ):
-                        continue
+            # Only the fields the filters need are parsed
+            parser = LogParser(
+                fields={"time", "method", "url", "status"},
+                timezone_offset=timezone_offset,
+            )
+            matching_requests = 0
+
+            for record in parser.parse(file_path):
+                # 1. Check day of week
+                if (
+                    target_weekday is not None
+                    and weekday(record.time) != target_weekday
+                ):
+                    continue
 
-                    # 2. Check hour range
-                    if start_hour is not None and log_date.hour < start_hour:
-                        continue
-                    if end_hour is not None and log_date.hour >= end_hour:
-                        continue
+                # 2. Check hour range
+                hour = hour_of_day(record.time)
+                if start_hour is not None and hour < start_hour:
+                    continue
+                if end_hour is not None and hour >= end_hour:
+                    continue
 
-                    # 3. Check request method
-                    if request_method and method.upper() != request_method.upper():
-                        continue
+                # 3. Check request method
+                if request_method and record.method.upper() != request_method:
+                    continue
 
-                    # 4. Check URL section
-                    if section_path and section_path not in url:
-                        continue
+                # 4. Check URL section
+                if section_path and section_path not in record.url:
+                    continue
 
-                    # 5. Check status code
-                    try:
-                        status_code = int(status)
-                        if status_range and (
-                            status_code < status_range[0]
-                            or status_code > status_range[1]
-                        ):
-                            continue
-                    except ValueError:
-                        parsing_errors += 1
-                        continue
+                # 5. Check status code
+                if status_range and (
+                    record.status < status_range[0] or record.status > status_range[1]
+                ):
+                    continue
 
-                    # If we got here, the request matches all criteria
-                    matching_requests += 1
+                # If we got here, the request matches all criteria
+                matching_requests += 1
 
-                except Exception as e:
-                    parsing_errors += 1
-                    continue
+            total_requests = parser.total
+            parsing_errors = parser.errors
 
         # Create a detailed response
         response = f"""
@@ -3100,11 +3659,38 @@ This analysis shows the number of requests that match all specified criteria in
         return f"Error analyzing Apache logs: {str(e)}\n{traceback.format_exc()}"
 
 
+@register_tool(
+    description="Analyze Apache log files to identify top bandwidth consumers by IP address",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the Apache log file (can be gzipped)",
+            },
+            "section_path": {
+                "type": "string",
+                "description": "Path section to filter (e.g., '/kannada/')",
+            },
+            "specific_date": {
+                "type": "string",
+                "description": "Date to filter in format 'YYYY-MM-DD'",
+            },
+            "timezone_offset": {
+                "type": "string",
+                "description": "Timezone offset in format '+0000' or '-0500'",
+            },
+        },
+        "required": ["file_path"],
+    },
+    pool="thread",
+)
 async def analyze_bandwidth_by_ip(
     file_path: str,
     section_path: str = None,
     specific_date: str = None,
     timezone_offset: str = None,
+    mode: str = "columnar",
 ) -> str:
     """
     Analyze Apache log files to identify top bandwidth consumers by IP address
@@ -3114,177 +3700,73 @@ async def analyze_bandwidth_by_ip(
         section_path: Path section to filter (e.g., '/kannada/')
         specific_date: Date to filter in format 'YYYY-MM-DD'
         timezone_offset: Timezone offset in format '+0000' or '-0500'
+        mode: "columnar" parses into NumPy columns and sums bytes per IP with a
+            vectorised group-by, "rows" streams records through Python filters
 
     Returns:
         Analysis of bandwidth usage by IP address
     """
     try:
-        import gzip
-        import re
-        from datetime import datetime
+        from datetime import date, datetime
         from collections import defaultdict
-        import heapq
-
-        # Open the file (handling gzip if needed)
-        if file_path.endswith(".gz"):
-            open_func = gzip.open
-            mode = "rt"  # text mode for gzip
-        else:
-            open_func = open
-            mode = "r"
+        import numpy as np
+        from app.utils.apache_logs import LogParser, day_number, load_log_columns
 
         # Initialize data structures
         ip_bandwidth = defaultdict(int)  # Maps IP addresses to total bytes
         ip_requests = defaultdict(int)  # Maps IP addresses to request count
-        total_requests = 0
         filtered_requests = 0
-        parsing_errors = 0
 
         # Parse the specific date if provided
-        target_date = None
+        target_day = None
         if specific_date:
             try:
                 target_date = datetime.strptime(specific_date, "%Y-%m-%d")
             except ValueError:
                 return f"Invalid date format: {specific_date}. Please use YYYY-MM-DD format."
+            target_day = (target_date.date() - date(1970, 1, 1)).days
+
+        if mode == "columnar":
+            columns = load_log_columns(file_path)
+            mask = columns.filter(
+                section_path=section_path,
+                section_prefix=True,
+                day=target_day,
+                timezone_offset=timezone_offset,
+            )
+            bandwidth, requests = columns.bytes_by_ip(mask)
 
-        # Regular expression for parsing Apache log entries
-        # This pattern handles the complex format with quoted fields and unquoted time field
-        log_pattern = r'([^ ]*) ([^ ]*) ([^ ]*) \[([^]]*)\] "([^"]*)" ([^ ]*) ([^ ]*) "([^"]*)" "([^"]*)" "([^"]*)" "([^"]*)"'
-
-        # Process the log file line by line
-        with open_func(file_path, mode, encoding="utf-8", errors="replace") as f:
-            for line in f:
-                total_requests += 1
-
-                try:
-                    # Handle escaped quotes in user agent field
-                    line = line.replace('\\"', "~~ESCAPED_QUOTE~~")
-
-                    # Parse the log entry
-                    match = re.match(log_pattern, line)
-                    if not match:
-                        parsing_errors += 1
-                        continue
-
-                    # Extract fields
-                    (
-                        ip,
-                        remote_logname,
-                        remote_user,
-                        time_str,
-                        request,
-                        status,
-                        size,
-                        referer,
-                        user_agent,
-                        vhost,
-                        server,
-                    ) = match.groups()
-
-                    # Restore escaped quotes
-                    user_agent = user_agent.replace("~~ESCAPED_QUOTE~~", '"')
-
-                    # Parse the time string
-                    # Format: [01/May/2024:00:00:00 +0000]
-                    time_match = re.match(
-                        r"\[(\d+)/(\w+)/(\d+):(\d+):(\d+):(\d+) ([+-]\d+)\]", time_str
-                    )
-                    if not time_match:
-                        parsing_errors += 1
-                        continue
-
-                    day, month, year, hour, minute, second, log_tz = time_match.groups()
-
-                    # Convert month name to number
-                    month_num = {
-                        "Jan": 1,
-                        "Feb": 2,
-                        "Mar": 3,
-                        "Apr": 4,
-                        "May": 5,
-                        "Jun": 6,
-                        "Jul": 7,
-                        "Aug": 8,
-                        "Sep": 9,
-                        "Oct": 10,
-                        "Nov": 11,
-                        "Dec": 12,
-                    }.get(month, None)
-
-                    if not month_num:
-                        parsing_errors += 1
-                        continue
-
-                    # Create datetime object
-                    log_date = datetime(
-                        int(year),
-                        month_num,
-                        int(day),
-                        int(hour),
-                        int(minute),
-                        int(second),
-                    )
-
-                    # Apply timezone adjustment if needed
-                    if timezone_offset and timezone_offset != log_tz:
-                        # Parse the timezone offsets
-                        log_tz_hours = int(log_tz[1:3])
-                        log_tz_minutes = int(log_tz[3:5])
-                        log_tz_sign = 1 if log_tz[0] == "+" else -1
-                        log_tz_offset = log_tz_sign * (
-                            log_tz_hours * 60 + log_tz_minutes
-                        )
-
-                        target_tz_hours = int(timezone_offset[1:3])
-                        target_tz_minutes = int(timezone_offset[3:5])
-                        target_tz_sign = 1 if timezone_offset[0] == "+" else -1
-                        target_tz_offset = target_tz_sign * (
-                            target_tz_hours * 60 + target_tz_minutes
-                        )
-
-                        # Calculate the difference in minutes
-                        tz_diff_minutes = target_tz_offset - log_tz_offset
-
-                        # Adjust the datetime
-                        from datetime import timedelta
-
-                        log_date = log_date + timedelta(minutes=tz_diff_minutes)
-
-                    # Check if the log entry matches the target date
-                    if target_date and (
-                        log_date.year != target_date.year
-                        or log_date.month != target_date.month
-                        or log_date.day != target_date.day
-                    ):
-                        continue
-
-                    # Parse the request
-                    request_parts = request.split()
-                    if len(request_parts) < 2:
-                        parsing_errors += 1
-                        continue
+            # Keep first-seen order among matching rows, as the row mode does
+            codes, first_seen = np.unique(columns.ip_codes[mask], return_index=True)
+            for code in codes[np.argsort(first_seen)]:
+                ip_bandwidth[columns.ips[code]] = int(bandwidth[code])
+                ip_requests[columns.ips[code]] = int(requests[code])
 
-                    method, url = request_parts[0], request_parts[1]
+            filtered_requests = int(mask.sum())
+            total_requests = columns.total
+            parsing_errors = columns.errors
+        else:
+            # Only the fields the filters need are parsed
+            parser = LogParser(
+                fields={"ip", "time", "url", "size"}, timezone_offset=timezone_offset
+            )
 
-                    # Check if the URL starts with the specified section path
-                    if section_path and not url.startswith(section_path):
-                        continue
+            for record in parser.parse(file_path):
+                # Check if the log entry matches the target date
+                if target_day is not None and day_number(record.time) != target_day:
+                    continue
 
-                    # Parse the size field
-                    try:
-                        bytes_sent = int(size) if size != "-" else 0
-                    except ValueError:
-                        bytes_sent = 0
+                # Check if the URL starts with the specified section path
+                if section_path and not record.url.startswith(section_path):
+                    continue
 
-                    # Update the IP bandwidth and request count
-                    ip_bandwidth[ip] += bytes_sent
-                    ip_requests[ip] += 1
-                    filtered_requests += 1
+                # Update the IP bandwidth and request count
+                ip_bandwidth[record.ip] += record.size
+                ip_requests[record.ip] += 1
+                filtered_requests += 1
 
-                except Exception as e:
-                    parsing_errors += 1
-                    continue
+            total_requests = parser.total
+            parsing_errors = parser.errors
 
         # Find the top bandwidth consumers
         if not ip_bandwidth:
@@ -3338,6 +3820,20 @@ async def analyze_bandwidth_by_ip(
         return f"Error analyzing bandwidth: {str(e)}\n{traceback.format_exc()}"
 
 
+@register_tool(
+    description="Parse partial JSON data from a JSONL file and calculate total sales",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the JSONL file with partial JSON data",
+            }
+        },
+        "required": ["file_path"],
+    },
+    pool="thread",
+)
 async def parse_partial_json_sales(file_path: str) -> str:
     """
     Parse partial JSON data from a JSONL file and calculate total sales
@@ -3399,6 +3895,24 @@ async def parse_partial_json_sales(file_path: str) -> str:
         return f"Error parsing partial JSON: {str(e)}\n{traceback.format_exc()}"
 
 
+@register_tool(
+    description="Count occurrences of a specific key in a nested JSON structure",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the JSON file",
+            },
+            "target_key": {
+                "type": "string",
+                "description": "The key to search for in the JSON structure",
+            },
+        },
+        "required": ["file_path", "target_key"],
+    },
+    pool="thread",
+)
 async def count_json_key_occurrences(file_path: str, target_key: str) -> str:
     """
     Count occurrences of a specific key in a nested JSON structure
@@ -3450,6 +3964,29 @@ async def count_json_key_occurrences(file_path: str, target_key: str) -> str:
         )
 
 
+@register_tool(
+    description="Reconstruct an image from scrambled pieces using a mapping",
+    parameters={
+        "type": "object",
+        "properties": {
+            "image_path": {
+                "type": "string",
+                "description": "Path to the scrambled image",
+            },
+            "mapping_data": {
+                "type": "string",
+                "description": "String containing the mapping data (tab or space separated)",
+            },
+            "output_path": {
+                "type": "string",
+                "description": "Path to save the reconstructed image (optional, defaults to returning it inline)",
+            },
+        },
+        "required": ["image_path", "mapping_data"],
+    },
+    file_arg="image_path",
+    pool="process",
+)
 async def reconstruct_scrambled_image(
     image_path: str, mapping_data: str, output_path: str = None
 ) -> str:
@@ -3462,11 +3999,11 @@ async def reconstruct_scrambled_image(
         output_path: Path to save the reconstructed image (optional)
 
     Returns:
-        Path to the reconstructed image or error message
+        Path to the reconstructed image when output_path is given, otherwise
+        the PNG as a base64 data URI, or an error message
     """
     try:
         import os
-        import tempfile
         from PIL import Image
         import numpy as np
         import re
@@ -3535,15 +4072,19 @@ async def reconstruct_scrambled_image(
             reconstructed_image.paste(piece, (orig_x, orig_y))
 
         # Save the reconstructed image
-        if output_path is None:
-            # Create a temporary file if no output path is provided
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-            output_path = temp_file.name
-            temp_file.close()
+        if output_path is not None:
+            reconstructed_image.save(output_path, format="PNG")
+            return output_path
 
-        reconstructed_image.save(output_path, format="PNG")
+        # Scratch files are removed when the request ends, so a path would
+        # point at nothing by the time the client reads the answer
+        import base64
+        import io
 
-        return output_path
+        buffer = io.BytesIO()
+        reconstructed_image.save(buffer, format="PNG")
+        encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+        return f"data:image/png;base64,{encoded}"
 
     except Exception as e:
         import traceback
@@ -3551,14 +4092,47 @@ async def reconstruct_scrambled_image(
         return f"Error reconstructing image: {str(e)}\n{traceback.format_exc()}"
 
 
+@register_tool(
+    description="Analyze sales data with phonetic clustering for city names",
+    parameters={
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "Path to the sales data file (CSV, Excel, etc.)",
+            },
+            "product_filter": {
+                "type": "string",
+                "description": "Product name to filter by (e.g., 'Soap')",
+            },
+            "min_units": {
+                "type": "integer",
+                "description": "Minimum number of units for filtering",
+            },
+            "target_city": {
+                "type": "string",
+                "description": "Target city to find (will use phonetic matching)",
+            },
+        },
+        "required": ["file_path"],
+    },
+    pool="process",
+)
 async def analyze_sales_with_phonetic_clustering(
-    file_path: str, query_params: dict
+    file_path: str,
+    product_filter: Optional[str] = None,
+    min_units: Optional[int] = None,
+    target_city: Optional[str] = None,
+    query_params: Optional[dict] = None,
 ) -> str:
     """
     Analyze sales data with phonetic clustering to handle misspelled city names
 
     Args:
         file_path: Path to the sales data JSON file
+        product_filter: Product name to filter by (e.g., 'Soap')
+        min_units: Minimum number of units for filtering
+        target_city: Target city to find (will use phonetic matching)
         query_params: Dictionary containing query parameters (product, city, min_sales, etc.)
 
     Returns:
@@ -3576,10 +4150,11 @@ async def analyze_sales_with_phonetic_clustering(
         # Convert to DataFrame for easier analysis
         df = pd.DataFrame(sales_data)
 
-        # Extract query parameters
-        product = query_params.get("product")
-        city = query_params.get("city")
-        min_sales = query_params.get("min_sales", 0)
+        # Extract query parameters, falling back to the tool-call arguments
+        query_params = query_params or {}
+        product = query_params.get("product", product_filter)
+        city = query_params.get("city", target_city)
+        min_sales = query_params.get("min_sales", min_units or 0)
 
         # Create a function to check if two city names are phonetically similar
         def is_similar_city(city1, city2, threshold=0.85):
@@ -3658,4 +4233,55 @@ async def analyze_sales_with_phonetic_clustering(
     except Exception as e:
         import traceback
 
-        return f"Error analyzing sales data: {str(e)}\n{traceback.format_exc()}"
\ No newline at end of file
+        return f"Error analyzing sales data: {str(e)}\n{traceback.format_exc()}"
+
+
+# Tools the model may call that do not have a local solver yet
+register_tool_schema(
+    name="generate_duckdb_query",
+    description="Generate and format DuckDB SQL queries for various data analysis tasks",
+    parameters={
+        "type": "object",
+        "properties": {
+            "query_type": {
+                "type": "string",
+                "description": "Type of query to generate (e.g., 'post_comments', 'user_activity')",
+            },
+            "timestamp_filter": {
+                "type": "string",
+                "description": "ISO timestamp for filtering data (e.g., '2025-02-26T00:17:09.465Z')",
+            },
+            "numeric_filter": {
+                "type": "integer",
+                "description": "Numeric threshold for filtering (e.g., 5 for star count)",
+            },
+            "sort_order": {
+                "type": "string",
+                "description": "Sort order for results ('ASC' or 'DESC')",
+            },
+        },
+        "required": ["query_type"],
+    },
+)
+register_tool_schema(
+    name="transcribe_youtube_segment",
+    description="Extract audio from a YouTube video segment and transcribe it",
+    parameters={
+        "type": "object",
+        "properties": {
+            "youtube_url": {
+                "type": "string",
+                "description": "URL of the YouTube video",
+            },
+            "start_time": {
+                "type": "number",
+                "description": "Start time in seconds",
+            },
+            "end_time": {
+                "type": "number",
+                "description": "End time in seconds",
+            },
+        },
+        "required": ["youtube_url", "start_time", "end_time"],
+    },
+)
@@ -0,0 +1,96 @@
+import os
+import httpx
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Optional
+
+# Connection limits for each named client. Every upstream host we talk to a lot
+# gets its own pool so a slow scraper cannot starve the AI Proxy of connections.
+CLIENT_LIMITS = {
+    "aiproxy": httpx.Limits(
+        max_connections=int(os.getenv("AIPROXY_MAX_CONNECTIONS", "50")),
+        max_keepalive_connections=int(os.getenv("AIPROXY_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=60.0,
+    ),
+    "openai": httpx.Limits(
+        max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0
+    ),
+    "default": httpx.Limits(
+        max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0
+    ),
+}
+
+# Application-scoped clients, created by the FastAPI lifespan hook
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    """
+    HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+    """
+    try:
+        import h2  # noqa: F401
+
+        return True
+    except ImportError:
+        return False
+
+
+def _no_cookies() -> CookieJar:
+    """
+    A cookie jar that never stores anything
+
+    The clients are shared by every request the process serves, so a cookie one
+    site sets while answering one user's question would otherwise be sent with
+    later users' requests. Cookies passed per request still go out.
+    """
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+def _create_client(name: str) -> httpx.AsyncClient:
+    limits = CLIENT_LIMITS.get(name, CLIENT_LIMITS["default"])
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        limits=limits,
+        cookies=_no_cookies(),
+        timeout=httpx.Timeout(30.0, connect=10.0),
+    )
+
+
+def get_http_client(name: str = "default") -> httpx.AsyncClient:
+    """
+    Return the shared client for the given pool name.
+
+    Clients are normally opened by open_http_clients() at startup. When a solver is
+    called outside the app (scripts, the debug endpoint before startup) the client
+    is created lazily so callers never have to manage its lifetime.
+
+    Args:
+        name: Pool name ("aiproxy", "openai" or "default")
+
+    Returns:
+        A pooled httpx.AsyncClient with keep-alive enabled
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _create_client(name)
+        _clients[name] = client
+    return client
+
+
+async def open_http_clients() -> None:
+    """
+    Open every configured client pool
+    """
+    for name in CLIENT_LIMITS:
+        get_http_client(name)
+
+
+async def close_http_clients(name: Optional[str] = None) -> None:
+    """
+    Close the given client pool, or all of them when no name is given
+    """
+    names = [name] if name else list(_clients)
+    for client_name in names:
+        client = _clients.pop(client_name, None)
+        if client is not None:
+            await client.aclose()
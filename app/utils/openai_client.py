@@ -1,4 +1,5 @@
 import os
+import asyncio
 import httpx
 import json
 import re
@@ -10,1047 +11,103 @@ import subprocess
 from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 from app.utils.functions import *
+from app.utils.http_client import get_http_client
+from app.utils.tool_registry import (
+    TOOL_HANDLERS,
+    ToolArgumentError,
+    call_tool,
+    get_tool_json,
+    get_tools_json,
+)
+from app.utils.answer_cache import NO_ANSWER, is_cacheable
+from app.utils.semantic_router import semantic_router
 
 load_dotenv()
 
 AIPROXY_TOKEN = os.getenv("AIPROXY_TOKEN")
 AIPROXY_BASE_URL = "https://aiproxy.sanand.workers.dev/openai/v1"
 
+# Maximum number of tool calls from one model response that run at the same time
+MAX_PARALLEL_TOOL_CALLS = int(os.getenv("MAX_PARALLEL_TOOL_CALLS", "4"))
 
-async def get_openai_response(question: str, file_path: Optional[str] = None) -> str:
+
+def build_chat_payload(
+    messages: List[Dict[str, Any]], tools_json: str, tool_choice: Any = "auto"
+) -> str:
     """
-    Get response from OpenAI via AI Proxy
+    Build the chat completion request body as a JSON string
+
+    The tools array is already serialised by the registry, so only the messages
+    are encoded per request and the tools fragment is spliced in as-is.
+    """
+    return (
+        '{"model":"gpt-4o-mini","messages":'
+        + json.dumps(messages, separators=(",", ":"))
+        + ',"tools":'
+        + tools_json
+        + ',"tool_choice":'
+        + json.dumps(tool_choice)
+        + "}"
+    )
+
+
+async def post_chat_completion(payload: str) -> Dict[str, Any]:
+    """
+    Send a chat completion request to the AI Proxy and return the first message
     """
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {AIPROXY_TOKEN}",
     }
 
-    # Define functions for OpenAI to call
-    functions = [
-        {
-            "type": "function",
-            "function": {
-                "name": "execute_command",
-                "description": "Execute a shell command and return its output",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "command": {
-                            "type": "string",
-                            "description": "The command to execute",
-                        }
-                    },
-                    "required": ["command"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "extract_zip_and_read_csv",
-                "description": "Extract a zip file and read a value from a CSV file inside it",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the zip file",
-                        },
-                        "column_name": {
-                            "type": "string",
-                            "description": "Column name to extract value from",
-                        },
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "extract_zip_and_process_files",
-                "description": "Extract a zip file and process multiple files",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the zip file",
-                        },
-                        "operation": {
-                            "type": "string",
-                            "description": "Operation to perform on files",
-                        },
-                    },
-                    "required": ["file_path", "operation"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "make_api_request",
-                "description": "Make an API request to a specified URL",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "url": {
-                            "type": "string",
-                            "description": "URL to make the request to",
-                        },
-                        "method": {
-                            "type": "string",
-                            "enum": ["GET", "POST"],
-                            "description": "HTTP method to use",
-                        },
-                        "headers": {
-                            "type": "object",
-                            "description": "Headers to include in the request",
-                        },
-                        "data": {
-                            "type": "object",
-                            "description": "Data to include in the request body",
-                        },
-                    },
-                    "required": ["url", "method"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "sort_json_array",
-                "description": "Sort a JSON array based on specified criteria",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "json_array": {
-                            "type": "string",
-                            "description": "JSON array to sort",
-                        },
-                        "sort_keys": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of keys to sort by",
-                        },
-                    },
-                    "required": ["json_array", "sort_keys"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "count_days_of_week",
-                "description": "Count occurrences of a specific day of the week between two dates",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "start_date": {
-                            "type": "string",
-                            "description": "Start date in ISO format (YYYY-MM-DD)",
-                        },
-                        "end_date": {
-                            "type": "string",
-                            "description": "End date in ISO format (YYYY-MM-DD)",
-                        },
-                        "day_of_week": {
-                            "type": "string",
-                            "enum": [
-                                "Monday",
-                                "Tuesday",
-                                "Wednesday",
-                                "Thursday",
-                                "Friday",
-                                "Saturday",
-                                "Sunday",
-                            ],
-                            "description": "Day of the week to count",
-                        },
-                    },
-                    "required": ["start_date", "end_date", "day_of_week"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "process_encoded_files",
-                "description": "Process files with different encodings",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the zip file containing encoded files",
-                        },
-                        "target_symbols": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of symbols to search for",
-                        },
-                    },
-                    "required": ["file_path", "target_symbols"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "calculate_spreadsheet_formula",
-                "description": "Calculate the result of a spreadsheet formula",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "formula": {
-                            "type": "string",
-                            "description": "The formula to calculate",
-                        },
-                        "type": {
-                            "type": "string",
-                            "enum": ["google_sheets", "excel"],
-                            "description": "Type of spreadsheet",
-                        },
-                    },
-                    "required": ["formula", "type"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "compare_files",
-                "description": "Compare two files and analyze differences",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the zip file containing files to compare",
-                        }
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "run_sql_query",
-                "description": "Calculate a SQL query result",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "SQL query to run"}
-                    },
-                    "required": ["query"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "generate_markdown_documentation",
-                "description": "Generate markdown documentation with specific elements",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "topic": {
-                            "type": "string",
-                            "description": "Topic for the markdown documentation",
-                        },
-                        "elements": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of markdown elements to include",
-                        },
-                    },
-                    "required": ["topic"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "compress_image",
-                "description": "Compress an image to a target size while maintaining quality",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the image file",
-                        },
-                        "target_size": {
-                            "type": "integer",
-                            "description": "Target size in bytes",
-                        },
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "create_github_pages",
-                "description": "Generate HTML content for GitHub Pages with email protection",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "email": {
-                            "type": "string",
-                            "description": "Email address to include in the page",
-                        },
-                        "content": {
-                            "type": "string",
-                            "description": "Optional content for the page",
-                        },
-                    },
-                    "required": ["email"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "run_colab_code",
-                "description": "Simulate running code on Google Colab",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "code": {
-                            "type": "string",
-                            "description": "Code to run",
-                        },
-                        "email": {
-                            "type": "string",
-                            "description": "Email address for authentication",
-                        },
-                    },
-                    "required": ["code", "email"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "analyze_image_brightness",
-                "description": "Analyze image brightness and count pixels above threshold",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the image file",
-                        },
-                        "threshold": {
-                            "type": "number",
-                            "description": "Brightness threshold",
-                        },
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "deploy_vercel_app",
-                "description": "Generate code for a Vercel app deployment",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "data_file": {
-                            "type": "string",
-                            "description": "Path to the data file",
-                        },
-                        "app_name": {
-                            "type": "string",
-                            "description": "Optional name for the app",
-                        },
-                    },
-                    "required": ["data_file"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "create_github_action",
-                "description": "Generate GitHub Action workflow with email in step name",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "email": {
-                            "type": "string",
-                            "description": "Email to include in step name",
-                        },
-                        "repository": {
-                            "type": "string",
-                            "description": "Optional repository name",
-                        },
-                    },
-                    "required": ["email"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "create_docker_image",
-                "description": "Generate Dockerfile and instructions for Docker Hub deployment",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "tag": {
-                            "type": "string",
-                            "description": "Tag for the Docker image",
-                        },
-                        "dockerfile_content": {
-                            "type": "string",
-                            "description": "Optional Dockerfile content",
-                        },
-                    },
-                    "required": ["tag"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "filter_students_by_class",
-                "description": "Filter students from a CSV file by class",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the CSV file",
-                        },
-                        "classes": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of classes to filter by",
-                        },
-                    },
-                    "required": ["file_path", "classes"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "setup_llamafile_with_ngrok",
-                "description": "Generate instructions for setting up Llamafile with ngrok",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "model_name": {
-                            "type": "string",
-                            "description": "Name of the Llamafile model",
-                        },
-                    },
-                    "required": [],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "analyze_sentiment",
-                "description": "Analyze sentiment of text using OpenAI API",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "text": {
-                            "type": "string",
-                            "description": "Text to analyze for sentiment",
-                        },
-                        "api_key": {
-                            "type": "string",
-                            "description": "Optional API key for OpenAI",
-                        },
-                    },
-                    "required": ["text"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "count_tokens",
-                "description": "Count tokens in a message sent to OpenAI API",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "text": {
-                            "type": "string",
-                            "description": "Text to count tokens for",
-                        },
-                    },
-                    "required": ["text"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "generate_structured_output",
-                "description": "Generate structured JSON output using OpenAI API",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "prompt": {
-                            "type": "string",
-                            "description": "Prompt for generating structured output",
-                        },
-                        "structure_type": {
-                            "type": "string",
-                            "description": "Type of structure to generate (e.g., addresses, products)",
-                        },
-                    },
-                    "required": ["prompt", "structure_type"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "count_cricket_ducks",
-                "description": "Count the number of ducks in ESPN Cricinfo ODI batting stats for a specific page",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "page_number": {
-                            "type": "integer",
-                            "description": "Page number to analyze",
-                        },
-                    },
-                    "required": ["page_number"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_imdb_movies",
-                "description": "Get movie information from IMDb with ratings in a specific range",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "min_rating": {
-                            "type": "number",
-                            "description": "Minimum rating to filter by",
-                        },
-                        "max_rating": {
-                            "type": "number",
-                            "description": "Maximum rating to filter by",
-                        },
-                        "limit": {
-                            "type": "integer",
-                            "description": "Maximum number of movies to return",
-                        },
-                    },
-                    "required": ["min_rating", "max_rating"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "generate_country_outline",
-                "description": "Generate a Markdown outline from Wikipedia headings for a country",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "country": {
-                            "type": "string",
-                            "description": "Name of the country",
-                        },
-                    },
-                    "required": ["country"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_weather_forecast",
-                "description": "Get weather forecast for a city using BBC Weather API",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "city": {
-                            "type": "string",
-                            "description": "Name of the city",
-                        },
-                    },
-                    "required": ["city"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "generate_vision_api_request",
-                "description": "Generate a JSON body for OpenAI's vision API to extract text from an image",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "image_url": {
-                            "type": "string",
-                            "description": "Base64 URL of the image",
-                        },
-                    },
-                    "required": ["image_url"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "generate_embeddings_request",
-                "description": "Generate a JSON body for OpenAI's embeddings API",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "texts": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of texts to generate embeddings for",
-                        },
-                    },
-                    "required": ["texts"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "find_most_similar_phrases",
-                "description": "Find the most similar pair of phrases based on cosine similarity of their embeddings",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "embeddings_dict": {
-                            "type": "object",
-                            "additionalProperties": {
-                                "type": "array",
-                                "items": {"type": "number"},
-                            },
-                            "description": "Dictionary mapping phrases to their embeddings",
-                        },
-                    },
-                    "required": ["embeddings_dict"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "compute_document_similarity",
-                "description": "Compute similarity between a query and a list of documents using embeddings",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "docs": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of document texts",
-                        },
-                        "query": {
-                            "type": "string",
-                            "description": "Query string to compare against documents",
-                        },
-                    },
-                    "required": ["docs", "query"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "parse_function_call",
-                "description": "Parse a natural language query to determine which function to call and extract parameters",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "Natural language query",
-                        },
-                    },
-                    "required": ["query"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_delhi_bounding_box",
-                "description": "Get the minimum latitude of Delhi, India using the Nominatim API",
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": [],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "find_duckdb_hn_post",
-                "description": "Find the latest Hacker News post mentioning DuckDB with at least 71 points",
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": [],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "find_newest_seattle_github_user",
-                "description": "Find the newest GitHub user in Seattle with over 130 followers",
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": [],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "create_github_action_workflow",
-                "description": "Create a GitHub Action workflow that runs daily and adds a commit",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "email": {
-                            "type": "string",
-                            "description": "Email to include in the step name",
-                        },
-                        "repository_url": {
-                            "type": "string",
-                            "description": "Optional repository URL",
-                        },
-                    },
-                    "required": ["email"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "extract_tables_from_pdf",
-                "description": "Extract tables from a PDF file and calculate the total Biology marks of students who scored 17 or more marks in Physics in groups 43-66 (inclusive)",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the PDF file",
-                        },
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "convert_pdf_to_markdown",
-                "description": "Convert a PDF file to Markdown and format it with Prettier",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the PDF file",
-                        },
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "clean_sales_data_and_calculate_margin",
-                "description": "Clean sales data from Excel and calculate margin for filtered transactions",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the Excel file",
-                        },
-                        "cutoff_date_str": {
-                            "type": "string",
-                            "description": "Cutoff date string (e.g., 'Sun Feb 06 2022 18:40:58 GMT+0530 (India Standard Time)')",
-                        },
-                        "product_filter": {
-                            "type": "string",
-                            "description": "Product name to filter by (e.g., 'Iota')",
-                        },
-                        "country_filter": {
-                            "type": "string",
-                            "description": "Country to filter by after standardization (e.g., 'UK')",
-                        },
-                    },
-                    "required": [
-                        "file_path",
-                        "cutoff_date_str",
-                        "product_filter",
-                        "country_filter",
-                    ],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "count_unique_students",
-                "description": "Count unique students in a text file based on student IDs",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the text file with student marks",
-                        }
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "analyze_apache_logs",
-                "description": "Analyze Apache log files to count requests matching specific criteria",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the Apache log file (can be gzipped)",
-                        },
-                        "section_path": {
-                            "type": "string",
-                            "description": "Path section to filter (e.g., '/telugump3/')",
-                        },
-                        "day_of_week": {
-                            "type": "string",
-                            "description": "Day to filter (e.g., 'Tuesday')",
-                        },
-                        "start_hour": {
-                            "type": "integer",
-                            "description": "Starting hour for time window (inclusive)",
-                        },
-                        "end_hour": {
-                            "type": "integer",
-                            "description": "Ending hour for time window (exclusive)",
-                        },
-                        "request_method": {
-                            "type": "string",
-                            "description": "HTTP method to filter (e.g., 'GET')",
-                        },
-                        "status_range": {
-                            "type": "array",
-                            "items": {"type": "integer"},
-                            "description": "Tuple of (min_status, max_status) for HTTP status codes",
-                        },
-                        "timezone_offset": {
-                            "type": "string",
-                            "description": "Timezone offset in format '+0000' or '-0500'",
-                        },
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "analyze_bandwidth_by_ip",
-                "description": "Analyze Apache log files to identify top bandwidth consumers by IP address",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the Apache log file (can be gzipped)",
-                        },
-                        "section_path": {
-                            "type": "string",
-                            "description": "Path section to filter (e.g., '/kannada/')",
-                        },
-                        "specific_date": {
-                            "type": "string",
-                            "description": "Date to filter in format 'YYYY-MM-DD'",
-                        },
-                        "timezone_offset": {
-                            "type": "string",
-                            "description": "Timezone offset in format '+0000' or '-0500'",
-                        },
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "analyze_sales_with_phonetic_clustering",
-                "description": "Analyze sales data with phonetic clustering for city names",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the sales data file (CSV, Excel, etc.)",
-                        },
-                        "product_filter": {
-                            "type": "string",
-                            "description": "Product name to filter by (e.g., 'Soap')",
-                        },
-                        "min_units": {
-                            "type": "integer",
-                            "description": "Minimum number of units for filtering",
-                        },
-                        "target_city": {
-                            "type": "string",
-                            "description": "Target city to find (will use phonetic matching)",
-                        },
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "parse_partial_json_sales",
-                "description": "Parse partial JSON data from a JSONL file and calculate total sales",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the JSONL file with partial JSON data",
-                        }
-                    },
-                    "required": ["file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "count_json_key_occurrences",
-                "description": "Count occurrences of a specific key in a nested JSON structure",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "Path to the JSON file",
-                        },
-                        "target_key": {
-                            "type": "string",
-                            "description": "The key to search for in the JSON structure",
-                        },
-                    },
-                    "required": ["file_path", "target_key"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "generate_duckdb_query",
-                "description": "Generate and format DuckDB SQL queries for various data analysis tasks",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query_type": {
-                            "type": "string",
-                            "description": "Type of query to generate (e.g., 'post_comments', 'user_activity')",
-                        },
-                        "timestamp_filter": {
-                            "type": "string",
-                            "description": "ISO timestamp for filtering data (e.g., '2025-02-26T00:17:09.465Z')",
-                        },
-                        "numeric_filter": {
-                            "type": "integer",
-                            "description": "Numeric threshold for filtering (e.g., 5 for star count)",
-                        },
-                        "sort_order": {
-                            "type": "string",
-                            "description": "Sort order for results ('ASC' or 'DESC')",
-                        },
-                    },
-                    "required": ["query_type"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "transcribe_youtube_segment",
-                "description": "Extract audio from a YouTube video segment and transcribe it",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "youtube_url": {
-                            "type": "string",
-                            "description": "URL of the YouTube video",
-                        },
-                        "start_time": {
-                            "type": "number",
-                            "description": "Start time in seconds",
-                        },
-                        "end_time": {
-                            "type": "number",
-                            "description": "End time in seconds",
-                        },
-                    },
-                    "required": ["youtube_url", "start_time", "end_time"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "reconstruct_scrambled_image",
-                "description": "Reconstruct an image from scrambled pieces using a mapping",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "image_path": {
-                            "type": "string",
-                            "description": "Path to the scrambled image",
-                        },
-                        "mapping_data": {
-                            "type": "string",
-                            "description": "String containing the mapping data (tab or space separated)",
-                        },
-                        "output_path": {
-                            "type": "string",
-                            "description": "Path to save the reconstructed image (optional)",
-                        },
-                    },
-                    "required": ["image_path", "mapping_data"],
-                },
-            },
-        },
-    ]
+    # Make the request to the AI Proxy over the shared keep-alive pool
+    client = get_http_client("aiproxy")
+    response = await client.post(
+        f"{AIPROXY_BASE_URL}/chat/completions",
+        headers=headers,
+        content=payload,
+        timeout=60.0,
+    )
+
+    if response.status_code != 200:
+        raise Exception(f"Error from OpenAI API: {response.text}")
+
+    result = response.json()
+    return result["choices"][0]["message"]
 
+
+async def run_tool_calls(
+    tool_calls: List[Dict[str, Any]], file_path: Optional[str] = None
+) -> List[Any]:
+    """
+    Execute every tool call of a model response concurrently
+
+    Args:
+        tool_calls: The "tool_calls" list of the assistant message
+        file_path: Path of the uploaded file, if any
+
+    Returns:
+        One result per tool call, in the same order. A failing call yields an
+        error string instead of cancelling the others.
+    """
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_TOOL_CALLS)
+
+    async def run_one(tool_call: Dict[str, Any]) -> Any:
+        function_name = tool_call["function"]["name"]
+        try:
+            function_args = json.loads(tool_call["function"]["arguments"] or "{}")
+            async with semaphore:
+                return await call_tool(function_name, function_args, file_path)
+        except Exception as e:
+            return f"Error executing {function_name}: {str(e)}"
+
+    return await asyncio.gather(*(run_one(tool_call) for tool_call in tool_calls))
+
+
+async def get_openai_response(question: str, file_path: Optional[str] = None) -> str:
+    """
+    Get response from OpenAI via AI Proxy
+    """
     # Create the messages to send to the API
     messages = [
         {
@@ -1069,308 +126,210 @@ async def get_openai_response(question: str, file_path: Optional[str] = None) ->
             }
         )
 
-    # Prepare the request payload
-    payload = {
-        "model": "gpt-4o-mini",
-        "messages": messages,
-        "tools": functions,
-        "tool_choice": "auto",
-    }
-
-    # Make the request to the AI Proxy
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{AIPROXY_BASE_URL}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=60.0,
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"Error from OpenAI API: {response.text}")
-
-        result = response.json()
-        answer = None
-
-        # Process the response
-        message = result["choices"][0]["message"]
-
-        # Check if there's a function call
-        if "tool_calls" in message:
-            for tool_call in message["tool_calls"]:
-                function_name = tool_call["function"]["name"]
-                function_args = json.loads(tool_call["function"]["arguments"])
-
-                # Execute the appropriate function
-                if function_name == "execute_command":
-                    answer = await execute_command(function_args.get("command"))
-
-                elif function_name == "extract_zip_and_read_csv":
-                    answer = await extract_zip_and_read_csv(
-                        file_path=function_args.get("file_path", file_path),
-                        column_name=function_args.get("column_name"),
-                    )
-
-                elif function_name == "extract_zip_and_process_files":
-                    answer = await extract_zip_and_process_files(
-                        file_path=function_args.get("file_path", file_path),
-                        operation=function_args.get("operation"),
-                    )
-
-                elif function_name == "make_api_request":
-                    answer = await make_api_request(
-                        url=function_args.get("url"),
-                        method=function_args.get("method"),
-                        headers=function_args.get("headers"),
-                        data=function_args.get("data"),
-                    )
-
-                elif function_name == "sort_json_array":
-                    answer = sort_json_array(
-                        json_array=function_args.get("json_array"),
-                        sort_keys=function_args.get("sort_keys"),
-                    )
-
-                elif function_name == "count_days_of_week":
-                    answer = count_days_of_week(
-                        start_date=function_args.get("start_date"),
-                        end_date=function_args.get("end_date"),
-                        day_of_week=function_args.get("day_of_week"),
-                    )
-
-                elif function_name == "process_encoded_files":
-                    answer = await process_encoded_files(
-                        file_path=function_args.get("file_path", file_path),
-                        target_symbols=function_args.get("target_symbols"),
-                    )
-
-                elif function_name == "calculate_spreadsheet_formula":
-                    answer = calculate_spreadsheet_formula(
-                        formula=function_args.get("formula"),
-                        type=function_args.get("type"),
-                    )
-
-                elif function_name == "compare_files":
-                    answer = await compare_files(
-                        file_path=function_args.get("file_path", file_path)
-                    )
-
-                elif function_name == "run_sql_query":
-                    answer = run_sql_query(query=function_args.get("query"))
-
-                elif function_name == "generate_markdown_documentation":
-                    answer = generate_markdown_documentation(
-                        topic=function_args.get("topic"),
-                        elements=function_args.get("elements"),
-                    )
-
-                elif function_name == "compress_image":
-                    answer = await compress_image(
-                        file_path=function_args.get("file_path", file_path),
-                        target_size=function_args.get("target_size", 1500),
-                    )
-
-                elif function_name == "create_github_pages":
-                    answer = await create_github_pages(
-                        email=function_args.get("email"),
-                        content=function_args.get("content"),
-                    )
-
-                elif function_name == "run_colab_code":
-                    answer = await run_colab_code(
-                        code=function_args.get("code"),
-                        email=function_args.get("email"),
-                    )
-
-                elif function_name == "analyze_image_brightness":
-                    answer = await analyze_image_brightness(
-                        file_path=function_args.get("file_path", file_path),
-                        threshold=function_args.get("threshold", 0.937),
-                    )
-
-                elif function_name == "deploy_vercel_app":
-                    answer = await deploy_vercel_app(
-                        data_file=function_args.get("data_file", file_path),
-                        app_name=function_args.get("app_name"),
-                    )
+    # Questions close to ones a tool already answered skip the full tool list
+    # and go straight to extracting that tool's arguments
+    routed_tool = semantic_router.lookup(question)
+    if routed_tool:
+        tools_json = get_tool_json(routed_tool)
+        tool_choice = {"type": "function", "function": {"name": routed_tool}}
+    else:
+        tools_json, tool_choice = get_tools_json(), "auto"
+
+    # Prepare the request payload and send it
+    message = await post_chat_completion(
+        build_chat_payload(messages, tools_json, tool_choice)
+    )
+    answer = None
+
+    # Check if there are function calls
+    tool_calls = message.get("tool_calls")
+    if tool_calls:
+        results = await run_tool_calls(tool_calls, file_path)
+
+        if len(tool_calls) == 1:
+            # A single call already holds the answer, no need for another round trip
+            answer = results[0]
+
+            function_name = tool_calls[0]["function"]["name"]
+            if function_name in TOOL_HANDLERS and is_cacheable(answer):
+                semantic_router.remember(question, function_name)
+        else:
+            # Feed every result back to the model in one follow-up turn
+            messages.append(message)
+            for tool_call, result in zip(tool_calls, results):
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": tool_call["id"],
+                        "content": (
+                            result if isinstance(result, str) else json.dumps(result)
+                        ),
+                    }
+                )
+            follow_up = await post_chat_completion(
+                build_chat_payload(messages, get_tools_json(), tool_choice="none")
+            )
+            answer = follow_up.get("content")
 
-                elif function_name == "create_github_action":
-                    answer = await create_github_action(
-                        email=function_args.get("email"),
-                        repository=function_args.get("repository"),
-                    )
+    # If no function call was executed, return the content
+    if answer is None:
+        answer = message.get("content") or NO_ANSWER
 
-                elif function_name == "create_docker_image":
-                    answer = await create_docker_image(
-                        tag=function_args.get("tag"),
-                        dockerfile_content=function_args.get("dockerfile_content"),
-                    )
+    return answer
 
-                elif function_name == "filter_students_by_class":
-                    answer = await filter_students_by_class(
-                        file_path=function_args.get("file_path", file_path),
-                        classes=function_args.get("classes", []),
-                    )
 
-                elif function_name == "setup_llamafile_with_ngrok":
-                    answer = await setup_llamafile_with_ngrok(
-                        model_name=function_args.get(
-                            "model_name", "Llama-3.2-1B-Instruct.Q6_K.llamafile"
-                        ),
-                    )
-                elif function_name == "analyze_sentiment":
-                    answer = await analyze_sentiment(
-                        text=function_args.get("text"),
-                        api_key=function_args.get("api_key", "dummy_api_key"),
-                    )
+# Fast path: known question templates answered locally without calling the LLM.
+# Each route is (tool name, compiled pattern, argument extractor); the extractor
+# returns the tool arguments, or None when the match is not usable.
+_WEEKDAYS = "Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday"
 
-                elif function_name == "count_tokens":
-                    answer = await count_tokens(
-                        text=function_args.get("text"),
-                    )
 
-                elif function_name == "generate_structured_output":
-                    answer = await generate_structured_output(
-                        prompt=function_args.get("prompt"),
-                        structure_type=function_args.get("structure_type"),
-                    )
-                elif function_name == "count_cricket_ducks":
-                    answer = await count_cricket_ducks(
-                        page_number=function_args.get("page_number", 3),
-                    )
-
-                elif function_name == "get_imdb_movies":
-                    answer = await get_imdb_movies(
-                        min_rating=function_args.get("min_rating", 7.0),
-                        max_rating=function_args.get("max_rating", 8.0),
-                        limit=function_args.get("limit", 25),
-                    )
+def _days_of_week_args(match: re.Match, question: str) -> Optional[Dict[str, Any]]:
+    return {
+        "start_date": match.group("start"),
+        "end_date": match.group("end"),
+        "day_of_week": match.group("day").capitalize(),
+    }
 
-                elif function_name == "generate_country_outline":
-                    answer = await generate_country_outline(
-                        country=function_args.get("country"),
-                    )
 
-                elif function_name == "get_weather_forecast":
-                    answer = await get_weather_forecast(
-                        city=function_args.get("city"),
-                    )
-                elif function_name == "generate_vision_api_request":
-                    answer = await generate_vision_api_request(
-                        image_url=function_args.get("image_url"),
-                    )
+def _spreadsheet_args(match: re.Match, question: str) -> Optional[Dict[str, Any]]:
+    formula = match.group("formula")
+    return {
+        "formula": formula,
+        "type": "google_sheets" if "SEQUENCE" in formula else "excel",
+    }
 
-                elif function_name == "generate_embeddings_request":
-                    answer = await generate_embeddings_request(
-                        texts=function_args.get("texts", []),
-                    )
 
-                elif function_name == "find_most_similar_phrases":
-                    answer = await find_most_similar_phrases(
-                        embeddings_dict=function_args.get("embeddings_dict", {}),
-                    )
-                elif function_name == "compute_document_similarity":
-                    answer = await compute_document_similarity(
-                        docs=function_args.get("docs", []),
-                        query=function_args.get("query", ""),
-                    )
+def _sort_json_args(match: re.Match, question: str) -> Optional[Dict[str, Any]]:
+    array_match = re.search(r"\[\s*\{.*\}\s*\]", question, re.S)
+    if not array_match:
+        return None
+    sort_keys = [match.group("key")]
+    tie_match = _SORT_TIE_PATTERN.search(question)
+    if tie_match:
+        sort_keys.append(tie_match.group("key"))
+    return {"json_array": array_match.group(0), "sort_keys": sort_keys}
 
-                elif function_name == "parse_function_call":
-                    answer = await parse_function_call(
-                        query=function_args.get("query", ""),
-                    )
-                elif function_name == "get_delhi_bounding_box":
-                    answer = await get_delhi_bounding_box()
 
-                elif function_name == "find_duckdb_hn_post":
-                    answer = await find_duckdb_hn_post()
+def _function_call_args(match: re.Match, question: str) -> Optional[Dict[str, Any]]:
+    return {"query": match.group(0)}
 
-                elif function_name == "find_newest_seattle_github_user":
-                    answer = await find_newest_seattle_github_user()
 
-                elif function_name == "create_github_action_workflow":
-                    answer = await create_github_action_workflow(
-                        email=function_args.get("email"),
-                        repository_url=function_args.get("repository_url"),
-                    )
-                elif function_name == "extract_tables_from_pdf":
-                    answer = await extract_tables_from_pdf(
-                        file_path=function_args.get("file_path"),
-                    )
+def _apache_logs_args(match: re.Match, question: str) -> Optional[Dict[str, Any]]:
+    return {
+        "request_method": match.group("method").upper(),
+        "section_path": match.group("section"),
+        "start_hour": int(match.group("start")),
+        "end_hour": int(match.group("end")),
+        "day_of_week": match.group("day").capitalize(),
+        "status_range": [200, 299],
+    }
 
-                elif function_name == "convert_pdf_to_markdown":
-                    answer = await convert_pdf_to_markdown(
-                        file_path=function_args.get("file_path"),
-                    )
-                elif function_name == "clean_sales_data_and_calculate_margin":
-                    answer = await clean_sales_data_and_calculate_margin(
-                        file_path=function_args.get("file_path"),
-                        cutoff_date_str=function_args.get("cutoff_date_str"),
-                        product_filter=function_args.get("product_filter"),
-                        country_filter=function_args.get("country_filter"),
-                    )
-                elif function_name == "count_unique_students":
-                    answer = await count_unique_students(
-                        file_path=function_args.get("file_path"),
-                    )
-                elif function_name == "analyze_apache_logs":
-                    answer = await analyze_apache_logs(
-                        file_path=function_args.get("file_path"),
-                        section_path=function_args.get("section_path"),
-                        day_of_week=function_args.get("day_of_week"),
-                        start_hour=function_args.get("start_hour"),
-                        end_hour=function_args.get("end_hour"),
-                        request_method=function_args.get("request_method"),
-                        status_range=function_args.get("status_range"),
-                        timezone_offset=function_args.get("timezone_offset"),
-                    )
-                elif function_name == "analyze_bandwidth_by_ip":
-                    answer = await analyze_bandwidth_by_ip(
-                        file_path=function_args.get("file_path"),
-                        section_path=function_args.get("section_path"),
-                        specific_date=function_args.get("specific_date"),
-                        timezone_offset=function_args.get("timezone_offset"),
-                    )
-                elif function_name == "analyze_sales_with_phonetic_clustering":
-                    answer = await analyze_sales_with_phonetic_clustering(
-                        file_path=function_args.get("file_path"),
-                        product_filter=function_args.get("product_filter"),
-                        min_units=function_args.get("min_units"),
-                        target_city=function_args.get("target_city"),
-                    )
-                elif function_name == "parse_partial_json_sales":
-                    answer = await parse_partial_json_sales(
-                        file_path=function_args.get("file_path"),
-                    )
-                elif function_name == "count_json_key_occurrences":
-                    answer = await count_json_key_occurrences(
-                        file_path=function_args.get("file_path"),
-                        target_key=function_args.get("target_key"),
-                    )
-                elif function_name == "generate_duckdb_query":
-                    answer = await generate_duckdb_query(
-                        query_type=function_args.get("query_type"),
-                        timestamp_filter=function_args.get("timestamp_filter"),
-                        numeric_filter=function_args.get("numeric_filter"),
-                        sort_order=function_args.get("sort_order"),
-                    )
-                elif function_name == "transcribe_youtube_segment":
-                    answer = await transcribe_youtube_segment(
-                        youtube_url=function_args.get("youtube_url"),
-                        start_time=function_args.get("start_time"),
-                        end_time=function_args.get("end_time"),
-                    )
-                elif function_name == "reconstruct_scrambled_image":
-                    answer = await reconstruct_scrambled_image(
-                        image_path=function_args.get("image_path"),
-                        mapping_data=function_args.get("mapping_data"),
-                        output_path=function_args.get("output_path"),
-                    )
-                # Break after the first function call is executed
-                break
 
-        # If no function call was executed, return the content
-        if answer is None:
-            answer = message.get("content", "No answer could be generated.")
+_SORT_TIE_PATTERN = re.compile(r"tie, sort by the (?P<key>\w+) field", re.I)
+
+FAST_PATH_ROUTES = [
+    (
+        "count_days_of_week",
+        re.compile(
+            rf"How many (?P<day>{_WEEKDAYS})s? are there in the date range "
+            r"(?P<start>\d{4}-\d{2}-\d{2}) to (?P<end>\d{4}-\d{2}-\d{2})",
+            re.I,
+        ),
+        _days_of_week_args,
+    ),
+    (
+        "calculate_spreadsheet_formula",
+        re.compile(
+            r"(?P<formula>=SUM\((?:ARRAY_CONSTRAIN\(SEQUENCE\([\d,\s]+\)\s*,\s*\d+\s*,\s*\d+\)"
+            r"|TAKE\(SORTBY\(\{[\d,\s]+\}\s*,\s*\{[\d,\s]+\}\)\s*,\s*\d+\s*,\s*\d+\))\))"
+        ),
+        _spreadsheet_args,
+    ),
+    (
+        "sort_json_array",
+        re.compile(
+            r"Sort this JSON array of objects by the value of the (?P<key>\w+) field",
+            re.I,
+        ),
+        _sort_json_args,
+    ),
+    (
+        "parse_function_call",
+        re.compile(
+            r"status of ticket \d+"
+            r"|Schedule a meeting on \d{4}-\d{2}-\d{2} at \d{2}:\d{2} in Room \w+"
+            r"|expense balance for employee \d+"
+            r"|Calculate performance bonus for employee \d+ for \d{4}"
+            r"|Report office issue \d+ for the \w+ department"
+        ),
+        _function_call_args,
+    ),
+    (
+        "analyze_apache_logs",
+        re.compile(
+            r"number of successful (?P<method>GET|POST|PUT|DELETE|HEAD) requests for pages "
+            r"under (?P<section>/[\w-]+/) from (?P<start>\d{1,2}):00 until (?:before )?"
+            rf"(?P<end>\d{{1,2}}):00 on (?P<day>{_WEEKDAYS})s?",
+            re.I,
+        ),
+        _apache_logs_args,
+    ),
+]
+
+# Hits per route and misses, for monitoring how much traffic skips the LLM
+fast_path_stats = {"hits": {name: 0 for name, _, _ in FAST_PATH_ROUTES}, "misses": 0}
+
+
+def match_fast_path(question: str, file_path: Optional[str] = None) -> Optional[tuple]:
+    """
+    Match a question against the known templates
 
-        return answer
\ No newline at end of file
+    Returns:
+        (tool name, arguments) for the first matching template, or None
+    """
+    for name, pattern, extract_args in FAST_PATH_ROUTES:
+        match = pattern.search(question)
+        if not match:
+            continue
+        # Tools that read the upload can only take the fast path with a file
+        if TOOL_HANDLERS[name].file_arg and not file_path:
+            continue
+        arguments = extract_args(match, question)
+        if arguments is not None:
+            return name, arguments
+    return None
+
+
+async def answer_question(question: str, file_path: Optional[str] = None) -> Any:
+    """
+    Answer a question, calling the solver directly for known templates and
+    falling back to get_openai_response otherwise
+    """
+    route = match_fast_path(question, file_path)
+    if route:
+        name, arguments = route
+        try:
+            answer = await call_tool(name, arguments, file_path)
+        except ToolArgumentError:
+            # The template matched but the solver cannot handle this variant
+            answer = None
+        if is_cacheable(answer):
+            fast_path_stats["hits"][name] += 1
+            return answer
+
+    fast_path_stats["misses"] += 1
+    return await get_openai_response(question, file_path)
+
+
+def get_fast_path_stats() -> Dict[str, Any]:
+    """
+    Fast-path hit counts and overall hit rate
+    """
+    hits = sum(fast_path_stats["hits"].values())
+    total = hits + fast_path_stats["misses"]
+    return {
+        "hits": dict(fast_path_stats["hits"]),
+        "misses": fast_path_stats["misses"],
+        "hit_rate": hits / total if total else 0.0,
+    }
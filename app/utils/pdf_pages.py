@@ -0,0 +1,263 @@
+import io
+import os
+import json
+import tempfile
+import importlib.util
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, List, Sequence, Tuple
+
+from app.utils.answer_cache import file_sha256
+from app.utils.disk_cache import evict_lru, private_cache_dir
+from app.utils.executor import get_process_pool
+
+# Per-page extraction cache settings, overridable from the environment
+PDF_CACHE_DIR = os.getenv(
+    "PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "iitm-api-cache", "pdf")
+)
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(1024**3)))
+
+# Parallel extraction settings, overridable from the environment. Batches run on
+# the shared process pool; PDF_EXTRACT_WORKERS caps how many of its processes
+# one document uses at a time.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "4"))
+
+# Bump when the on-disk layout or the extraction rules change
+_CACHE_VERSION = 2
+
+
+def _extract_text_range(file_path: str, pages: Sequence[int]) -> List[str]:
+    # Runs in a worker process; the PDF is parsed once per task, not per page
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(file_path)
+    return [reader.pages[page].extract_text() or "" for page in pages]
+
+
+def _extract_tables_range(file_path: str, pages: Sequence[int]) -> List[list]:
+    # Runs in a worker process. With JPype installed tabula starts the JVM once
+    # per process and reuses it, so a worker pays the start-up only once.
+    import tabula
+
+    return [
+        tabula.read_pdf(file_path, pages=page + 1, multiple_tables=True) or []
+        for page in pages
+    ]
+
+
+def _extract_document_tables(file_path: str, pages: Sequence[int]) -> List[list]:
+    # One tabula call for every page, returned as a single entry
+    import tabula
+
+    return [tabula.read_pdf(file_path, pages="all", multiple_tables=True) or []]
+
+
+# kind -> (worker function, cache file suffix)
+_EXTRACTORS = {
+    "text": (_extract_text_range, ".txt"),
+    "tables": (_extract_tables_range, ".tables.json"),
+    "document-tables": (_extract_document_tables, ".document-tables.json"),
+}
+
+
+def _save_page(path: str, kind: str, value: Any) -> None:
+    # Tables are stored as JSON, never pickled: loading a pickle from a cache
+    # directory would run whatever code a planted file contains
+    if kind == "text":
+        data = value
+    else:
+        data = json.dumps([table.to_json(orient="split") for table in value])
+
+    # Write beside the target and rename, so readers never see half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = f"{path}.{os.getpid()}.tmp"
+    with open(staging, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(staging, path)
+
+
+def _load_page(path: str, kind: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        data = f.read()
+    if kind == "text":
+        return data
+
+    import pandas as pd
+
+    return [
+        pd.read_json(
+            io.StringIO(table), orient="split", dtype=False, convert_dates=False
+        )
+        for table in json.loads(data)
+    ]
+
+
+def _page_count(file_path: str, entry: str, use_cache: bool) -> int:
+    meta_path = os.path.join(entry, "meta.json")
+    if use_cache:
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)["pages"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    import PyPDF2
+
+    count = len(PyPDF2.PdfReader(file_path).pages)
+    if use_cache:
+        _save_page(meta_path, "text", json.dumps({"pages": count}))
+    return count
+
+
+def _page_path(entry: str, page: int, suffix: str) -> str:
+    return os.path.join(entry, f"page-{page:05d}{suffix}")
+
+
+def _batches(pages: Sequence[int], size: int) -> List[Tuple[int, ...]]:
+    return [tuple(pages[i : i + size]) for i in range(0, len(pages), size)]
+
+
+def _run_batches(
+    extract, file_path: str, batches: List[Tuple[int, ...]], workers: int
+) -> List[Any]:
+    # At most `workers` batches in flight on the shared pool, so one large PDF
+    # does not occupy every process other solvers need
+    pool = get_process_pool()
+    results: List[Any] = [None] * len(batches)
+    queue = iter(enumerate(batches))
+    pending = {}
+    for index, batch in queue:
+        pending[pool.submit(extract, file_path, batch)] = index
+        if len(pending) >= workers:
+            break
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+            following = next(queue, None)
+            if following is not None:
+                index, batch = following
+                pending[pool.submit(extract, file_path, batch)] = index
+    return results
+
+
+def _extract_pages(
+    kind: str,
+    file_path: str,
+    use_cache: bool,
+    cache_dir: str,
+    workers: int,
+    pages_per_task: int,
+) -> List[Any]:
+    extract, suffix = _EXTRACTORS[kind]
+    if use_cache:
+        try:
+            private_cache_dir(cache_dir)
+        except OSError as e:
+            print(f"PDF cache disabled: {e}")
+            use_cache = False
+    entry = os.path.join(cache_dir, f"{file_sha256(file_path)}-v{_CACHE_VERSION}")
+    if kind == "document-tables":
+        count = 1
+    else:
+        count = _page_count(file_path, entry, use_cache)
+    results: List[Any] = [None] * count
+    missing = []
+    for page in range(count):
+        if not use_cache:
+            missing.append(page)
+            continue
+        try:
+            results[page] = _load_page(_page_path(entry, page, suffix), kind)
+        except Exception:
+            # Not extracted yet, or a damaged file: extract the page again
+            missing.append(page)
+
+    if not missing:
+        if use_cache:
+            # Mark the entry as recently used for the size-based eviction
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+        return results
+
+    batches = _batches(missing, max(1, pages_per_task))
+    if workers <= 1 or len(batches) == 1:
+        extracted = [extract(file_path, batch) for batch in batches]
+    else:
+        extracted = _run_batches(extract, file_path, batches, workers)
+
+    for batch, values in zip(batches, extracted):
+        for page, value in zip(batch, values):
+            results[page] = value
+            if use_cache:
+                try:
+                    _save_page(_page_path(entry, page, suffix), kind, value)
+                except OSError as e:
+                    print(f"Could not cache page {page + 1} of {file_path}: {e}")
+
+    if use_cache:
+        evict_lru(cache_dir, PDF_CACHE_MAX_BYTES)
+    return results
+
+
+def extract_pdf_text(
+    file_path: str,
+    use_cache: bool = True,
+    cache_dir: str = PDF_CACHE_DIR,
+    workers: int = PDF_EXTRACT_WORKERS,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+) -> List[str]:
+    """
+    Extract the text of every page of a PDF with PyPDF2
+
+    Pages are split into batches that worker processes extract in parallel.
+    Each page's text is cached on disk keyed by the file's SHA-256 and the
+    page number, so a re-uploaded PDF costs only reading the cache.
+
+    Args:
+        file_path: Path to the PDF file
+        use_cache: Read and populate the on-disk cache
+        cache_dir: Cache directory
+        workers: Most worker processes used at once; 1 extracts in-process
+        pages_per_task: Pages handed to a worker at a time
+
+    Returns:
+        One string per page, in page order
+    """
+    return _extract_pages(
+        "text", file_path, use_cache, cache_dir, workers, pages_per_task
+    )
+
+
+def extract_pdf_tables(
+    file_path: str,
+    use_cache: bool = True,
+    cache_dir: str = PDF_CACHE_DIR,
+    workers: int = PDF_EXTRACT_WORKERS,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+) -> List[list]:
+    """
+    Extract the tables of every page of a PDF with tabula
+
+    Works like extract_pdf_text. Each page is read by its own tabula call in a
+    worker process, which keeps its JVM loaded between calls when JPype is
+    installed. Without JPype every tabula call starts a `java` subprocess, so
+    the whole document is read by one call and cached as a single entry.
+
+    Args:
+        file_path: Path to the PDF file
+        use_cache: Read and populate the on-disk cache
+        cache_dir: Cache directory
+        workers: Most worker processes used at once; 1 extracts in-process
+        pages_per_task: Pages handed to a worker at a time
+
+    Returns:
+        One list of DataFrames per page, in page order; a single list for the
+        whole document when JPype is not installed
+    """
+    kind = "tables" if importlib.util.find_spec("jpype") else "document-tables"
+    return _extract_pages(
+        kind, file_path, use_cache, cache_dir, workers, pages_per_task
+    )
@@ -0,0 +1,197 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from app.utils.answer_cache import file_sha256
+from app.utils.pdf_pages import extract_pdf_tables
+
+# Number of combined PDF tables kept in memory, overridable from the environment
+PDF_TABLE_CACHE_SIZE = int(os.getenv("PDF_TABLE_CACHE_SIZE", "32"))
+
+# Comparison operators a filter may use, with the symbol used in reports
+OPERATORS = {
+    ">=": "≥",
+    ">": ">",
+    "<=": "≤",
+    "<": "<",
+    "==": "=",
+    "!=": "≠",
+    "between": "between",
+    "in": "in",
+}
+
+# Aggregates a query may compute, with the label used in reports
+AGGREGATES = {
+    "sum": "Total",
+    "mean": "Average",
+    "median": "Median",
+    "min": "Minimum",
+    "max": "Maximum",
+    "count": "Count of",
+}
+
+_table_cache: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class TableFilter:
+    """
+    One condition of a query, e.g. Physics >= 17 or Group between 43 and 66
+    """
+
+    column: str
+    op: str
+    value: Any
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "TableFilter":
+        """
+        Build a filter from a tool argument such as
+        {"column": "Group", "op": "between", "value": [43, 66]}
+        """
+        op = spec.get("op", "==")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown comparison: {op}")
+        value = spec.get("value")
+        if op == "between" and (not isinstance(value, list) or len(value) != 2):
+            raise ValueError("A 'between' filter needs a [low, high] value")
+        if op == "in" and not isinstance(value, list):
+            value = [value]
+        return cls(column=str(spec["column"]).strip(), op=op, value=value)
+
+    def mask(self, table: pd.DataFrame) -> np.ndarray:
+        column = table[self.column]
+        if self.op not in ("==", "!=", "in") and not is_numeric_dtype(column):
+            # Marks read as text (e.g. a stray "AB") compare as missing
+            column = pd.to_numeric(column, errors="coerce")
+        if self.op == "between":
+            low, high = self.value
+            return column.between(low, high).to_numpy()
+        if self.op == "in":
+            return column.isin(self.value).to_numpy()
+        values = column.to_numpy()
+        if self.op == ">=":
+            return values >= self.value
+        if self.op == ">":
+            return values > self.value
+        if self.op == "<=":
+            return values <= self.value
+        if self.op == "<":
+            return values < self.value
+        if self.op == "==":
+            return values == self.value
+        return values != self.value
+
+    def describe(self) -> str:
+        if self.op == "between":
+            low, high = self.value
+            return f"{self.column} between {low} and {high} (inclusive)"
+        if self.op == "in":
+            return f"{self.column} in {', '.join(str(v) for v in self.value)}"
+        return f"{self.column} {OPERATORS[self.op]} {self.value}"
+
+
+# The original question: Biology total for Physics >= 17 in groups 43-66
+DEFAULT_FILTERS = (
+    TableFilter(column="Physics", op=">=", value=17),
+    TableFilter(column="Group", op="between", value=[43, 66]),
+)
+
+
+def _typed(table: pd.DataFrame) -> pd.DataFrame:
+    # Columns that are mostly numbers become numeric; stray text becomes NaN
+    table = table.copy()
+    table.columns = [str(column).strip() for column in table.columns]
+    for column in table.columns:
+        numeric = pd.to_numeric(table[column], errors="coerce")
+        if numeric.notna().sum() * 2 >= table[column].notna().sum():
+            table[column] = numeric
+    return table
+
+
+def load_pdf_table(file_path: str) -> pd.DataFrame:
+    """
+    Combine every table in a PDF into one typed DataFrame
+
+    The result is kept in memory keyed by the file's SHA-256, and the per-page
+    tables behind it are cached on disk, so a PDF is only read by tabula once.
+
+    Returns:
+        The combined table; callers must not modify it
+    """
+    sha256 = file_sha256(file_path)
+    with _lock:
+        table = _table_cache.get(sha256)
+        if table is not None:
+            _table_cache.move_to_end(sha256)
+            return table
+
+    tables = [table for page in extract_pdf_tables(file_path) for table in page]
+    table = _typed(pd.concat(tables, ignore_index=True)) if tables else pd.DataFrame()
+
+    with _lock:
+        _table_cache[sha256] = table
+        while len(_table_cache) > PDF_TABLE_CACHE_SIZE:
+            _table_cache.popitem(last=False)
+    return table
+
+
+def query_table(
+    table: pd.DataFrame,
+    filters: Sequence[TableFilter],
+    target_column: str,
+    aggregate: str = "sum",
+) -> tuple:
+    """
+    Filter a table and aggregate one column
+
+    Args:
+        table: Table from load_pdf_table
+        filters: Conditions that rows must all meet
+        target_column: Column to aggregate
+        aggregate: One of AGGREGATES
+
+    Returns:
+        (aggregate value, matching rows)
+
+    Raises:
+        KeyError: A column is missing; the message lists every missing column
+        ValueError: Unknown aggregate
+    """
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate: {aggregate}")
+
+    needed = [f.column for f in filters] + [target_column]
+    missing = [c for c in dict.fromkeys(needed) if c not in table.columns]
+    if missing:
+        raise KeyError(", ".join(missing))
+
+    mask = np.ones(len(table), dtype=bool)
+    for table_filter in filters:
+        mask &= table_filter.mask(table)
+    rows = table[mask]
+
+    values = rows[target_column]
+    if aggregate == "count":
+        result = int(values.count())
+    else:
+        if not is_numeric_dtype(values):
+            values = pd.to_numeric(values, errors="coerce")
+        result = getattr(values, aggregate)()
+    return result, rows
+
+
+def parse_filters(specs: Optional[List[Dict[str, Any]]]) -> List[TableFilter]:
+    """
+    Turn tool-call filter specs into filters, falling back to DEFAULT_FILTERS
+    """
+    if not specs:
+        return list(DEFAULT_FILTERS)
+    return [TableFilter.from_dict(spec) for spec in specs]
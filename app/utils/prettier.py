@@ -0,0 +1,406 @@
+import os
+import re
+import json
+import time
+import select
+import shutil
+import threading
+import subprocess
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no worker, format_markdown uses the Python fallback
+    fcntl = None
+
+# Formatter settings, overridable from the environment
+PRETTIER_VERSION = os.getenv("PRETTIER_VERSION", "3.4.2")
+PRETTIER_CACHE_DIR = os.getenv(
+    "PRETTIER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "iitm-api", "prettier"),
+)
+PRETTIER_TIMEOUT = float(os.getenv("PRETTIER_TIMEOUT", "20"))
+PRETTIER_INSTALL_TIMEOUT = float(os.getenv("PRETTIER_INSTALL_TIMEOUT", "120"))
+NPM_REGISTRY = os.getenv("npm_config_registry", "https://registry.npmjs.org/")
+
+# Seconds to wait before retrying after Node or the install was unavailable
+_RETRY_AFTER = 300
+
+# Long-lived Node worker: one JSON request per stdin line, one JSON reply per
+# stdout line. Prettier is imported once, so each request costs only the format.
+_DAEMON_SCRIPT = r"""
+const readline = require("readline");
+const { pathToFileURL } = require("url");
+
+(async () => {
+  const entry = require.resolve("prettier", { paths: [process.argv[2]] });
+  const mod = await import(pathToFileURL(entry).href);
+  const prettier = mod.default && mod.default.format ? mod.default : mod;
+  process.stdout.write(JSON.stringify({ ready: true, version: prettier.version }) + "\n");
+
+  const rl = readline.createInterface({ input: process.stdin, terminal: false });
+  for await (const line of rl) {
+    let id = null;
+    let reply;
+    try {
+      const request = JSON.parse(line);
+      id = request.id;
+      const options = {};
+      if (request.parser) options.parser = request.parser;
+      if (request.filepath) options.filepath = request.filepath;
+      reply = { id, formatted: await prettier.format(request.source, options) };
+    } catch (e) {
+      reply = { id, error: String((e && e.message) || e) };
+    }
+    process.stdout.write(JSON.stringify(reply) + "\n");
+  }
+})().catch((e) => {
+  process.stderr.write(String((e && e.stack) || e));
+  process.exit(1);
+});
+"""
+
+
+class FormatterUnavailable(RuntimeError):
+    """
+    Raised when the Node/Prettier worker cannot be started or stopped answering
+    """
+
+
+class PrettierDaemon:
+    """
+    A Node process with Prettier loaded, started on first use and reused
+
+    Prettier is installed once into a versioned cache directory (guarded by a
+    file lock so concurrent workers don't install twice), ideally at deploy
+    time with `python -m app.utils.prettier`. Requests are sent
+    one at a time over the process's stdin/stdout; if the process dies or
+    stops answering it is killed and restarted on the next request.
+    """
+
+    def __init__(
+        self,
+        version: str = PRETTIER_VERSION,
+        cache_dir: str = PRETTIER_CACHE_DIR,
+        timeout: float = PRETTIER_TIMEOUT,
+    ):
+        self.version = version
+        self.install_dir = os.path.join(cache_dir, version)
+        self.timeout = timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._unavailable_until = 0.0
+        self._unavailable_reason = ""
+
+    def is_installed(self) -> bool:
+        return os.path.exists(
+            os.path.join(self.install_dir, "node_modules", "prettier", "package.json")
+        )
+
+    def _check_registry(self) -> None:
+        # A few seconds to find out npm cannot download anything, instead of
+        # npm retrying for minutes while every format call waits behind it
+        import httpx
+
+        url = f"{NPM_REGISTRY.rstrip('/')}/prettier/{self.version}"
+        try:
+            response = httpx.get(url, timeout=5, follow_redirects=True)
+        except httpx.HTTPError as e:
+            raise FormatterUnavailable(f"npm registry unreachable: {e}") from e
+        if response.status_code != 200:
+            raise FormatterUnavailable(
+                f"prettier@{self.version} not available from {NPM_REGISTRY} "
+                f"(HTTP {response.status_code})"
+            )
+
+    def install(self) -> None:
+        """
+        Install Prettier into the cache directory if it is not there yet
+
+        Requests install it on first use, but running this at deploy time (see
+        the module's __main__) means no request ever waits for npm.
+
+        Raises:
+            FormatterUnavailable: npm is missing, offline or the install failed
+        """
+        if self.is_installed():
+            return
+        if fcntl is None:
+            raise FormatterUnavailable("the Prettier worker needs a POSIX platform")
+
+        npm = shutil.which("npm")
+        if npm is None:
+            raise FormatterUnavailable("npm is not installed")
+
+        os.makedirs(self.install_dir, exist_ok=True)
+        with open(os.path.join(self.install_dir, ".install.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.is_installed():
+                return
+            self._check_registry()
+            try:
+                subprocess.run(
+                    [
+                        npm,
+                        "install",
+                        "--no-save",
+                        "--no-audit",
+                        "--no-fund",
+                        "--prefix",
+                        self.install_dir,
+                        f"prettier@{self.version}",
+                    ],
+                    check=True,
+                    capture_output=True,
+                    timeout=PRETTIER_INSTALL_TIMEOUT,
+                )
+            except (subprocess.SubprocessError, OSError) as e:
+                raise FormatterUnavailable(
+                    f"Could not install prettier@{self.version}: {e}"
+                ) from e
+
+    def _start(self) -> None:
+        # The install lock and select() on the worker's pipes are POSIX-only
+        if fcntl is None:
+            raise FormatterUnavailable("the Prettier worker needs a POSIX platform")
+        node = shutil.which("node")
+        if node is None:
+            raise FormatterUnavailable("node is not installed")
+        self.install()
+
+        script = os.path.join(self.install_dir, "prettier-daemon.js")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(_DAEMON_SCRIPT)
+
+        self._process = subprocess.Popen(
+            [node, script, self.install_dir],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        ready = self._read_reply()
+        if not ready.get("ready"):
+            self.close()
+            raise FormatterUnavailable("Prettier worker did not start")
+
+    def _read_reply(self) -> dict:
+        stdout = self._process.stdout
+        readable, _, _ = select.select([stdout], [], [], self.timeout)
+        if not readable:
+            raise FormatterUnavailable("Prettier worker timed out")
+        line = stdout.readline()
+        if not line:
+            raise FormatterUnavailable("Prettier worker exited")
+        return json.loads(line)
+
+    def format(
+        self,
+        source: str,
+        parser: Optional[str] = "markdown",
+        filepath: Optional[str] = None,
+    ) -> str:
+        """
+        Format source with Prettier
+
+        Args:
+            source: Text to format
+            parser: Prettier parser; None to infer it from filepath
+            filepath: File name used for parser inference
+
+        Returns:
+            The formatted text
+
+        Raises:
+            FormatterUnavailable: Node or Prettier cannot be used
+            ValueError: Prettier rejected the input
+        """
+        with self._lock:
+            if time.monotonic() < self._unavailable_until:
+                raise FormatterUnavailable(self._unavailable_reason)
+
+            # One retry covers a worker that died since the last request
+            for attempt in range(2):
+                if self._process is None or self._process.poll() is not None:
+                    try:
+                        self._start()
+                    except FormatterUnavailable as e:
+                        # Missing Node or a failed install won't fix itself soon
+                        self.close()
+                        self._unavailable_until = time.monotonic() + _RETRY_AFTER
+                        self._unavailable_reason = str(e)
+                        raise
+
+                try:
+                    self._next_id += 1
+                    request = {
+                        "id": self._next_id,
+                        "source": source,
+                        "parser": parser,
+                        "filepath": filepath,
+                    }
+                    self._process.stdin.write(json.dumps(request) + "\n")
+                    self._process.stdin.flush()
+                    reply = self._read_reply()
+                    break
+                except (FormatterUnavailable, OSError, ValueError) as e:
+                    self.close()
+                    if attempt == 1:
+                        raise FormatterUnavailable(str(e)) from e
+
+        if "error" in reply:
+            raise ValueError(reply["error"])
+        return reply["formatted"]
+
+    def close(self) -> None:
+        """
+        Stop the Node process
+        """
+        process, self._process = self._process, None
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+# Per-process worker, shared by every request handled by this process
+prettier_daemon = PrettierDaemon()
+
+
+_FENCE_RE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})(?:\s+(.*?))?(?:\s+#+)?\s*$")
+_BULLET_RE = re.compile(r"^(\s*)[*+-]\s+(.*)$")
+_ORDERED_RE = re.compile(r"^(\s*)(\d+)[.)]\s+(.*)$")
+_QUOTE_RE = re.compile(r"^\s{0,3}>\s*(.*)$")
+_RULE_RE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_EMPHASIS_RE = re.compile(r"(?<![*\w])\*(?![\s*])([^*\n]+?)(?<![\s*])\*(?![*\w])")
+_STRONG_RE = re.compile(r"(?<![_\w])__(?!\s)([^_\n]+?)(?<!\s)__(?![_\w])")
+_CODE_SPAN_RE = re.compile(r"(`+)(.+?)\1")
+
+
+def _format_inline(text: str) -> str:
+    # Collapse runs of spaces and normalise emphasis markers, leaving code spans
+    parts = []
+    last = 0
+    for match in _CODE_SPAN_RE.finditer(text):
+        parts.append(("text", text[last : match.start()]))
+        parts.append(("code", match.group(0)))
+        last = match.end()
+    parts.append(("text", text[last:]))
+
+    out = []
+    for kind, value in parts:
+        if kind == "text":
+            value = re.sub(r"[ \t]+", " ", value)
+            value = _STRONG_RE.sub(r"**\1**", value)
+            value = _EMPHASIS_RE.sub(r"_\1_", value)
+        out.append(value)
+    return "".join(out).strip()
+
+
+def format_markdown_fallback(source: str) -> str:
+    """
+    Pure-Python approximation of Prettier's Markdown output
+
+    Handles what Prettier changes most often: heading and list marker spacing,
+    "-" bullets, "> " quotes, "_" emphasis and "**" strong, collapsed spaces,
+    one blank line between blocks and a single trailing newline. Fenced code is
+    kept verbatim. Tables and reference-style constructs are left as they are.
+    """
+    blocks: List[Tuple[str, List[str]]] = []
+    lines = source.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    fence = None
+    for line in lines:
+        if fence is not None:
+            blocks[-1][1].append(line.rstrip())
+            if line.strip().startswith(fence):
+                fence = None
+            continue
+
+        fence_match = _FENCE_RE.match(line)
+        if fence_match:
+            fence = fence_match.group(1)
+            blocks.append(("code", [line.strip()]))
+            continue
+
+        if not line.strip():
+            blocks.append(("blank", []))
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            text = _format_inline(heading.group(2) or "")
+            blocks.append(("heading", [f"{heading.group(1)} {text}".rstrip()]))
+            continue
+
+        if _RULE_RE.match(line):
+            blocks.append(("rule", ["---"]))
+            continue
+
+        bullet = _BULLET_RE.match(line)
+        ordered = _ORDERED_RE.match(line)
+        quote = _QUOTE_RE.match(line)
+        if bullet or ordered:
+            indent = len((bullet or ordered).group(1).expandtabs(4))
+            level = "  " * (indent // 2) if indent >= 2 else ""
+            if bullet:
+                item = f"{level}- {_format_inline(bullet.group(2))}"
+            else:
+                item = f"{level}{ordered.group(2)}. {_format_inline(ordered.group(3))}"
+            kind = "list"
+        elif quote:
+            item = f"> {_format_inline(quote.group(1))}".rstrip()
+            kind = "quote"
+        else:
+            item = _format_inline(line)
+            kind = "paragraph"
+
+        # Consecutive lines of the same kind stay in one block
+        if blocks and blocks[-1][0] == kind:
+            blocks[-1][1].append(item)
+        else:
+            blocks.append((kind, [item]))
+
+    out = []
+    for kind, block_lines in blocks:
+        if kind == "blank":
+            continue
+        if out:
+            out.append("")
+        out.extend(block_lines)
+    return "\n".join(out).strip("\n") + "\n" if out else ""
+
+
+def format_markdown(source: str, filepath: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Format Markdown with the Prettier worker, or the Python fallback if Node or
+    Prettier is unavailable
+
+    Args:
+        source: Markdown text
+        filepath: Original file name, passed to Prettier for inference
+
+    Returns:
+        (formatted text, name of the formatter that produced it)
+    """
+    try:
+        formatted = prettier_daemon.format(source, parser="markdown", filepath=filepath)
+        return formatted, f"Prettier v{prettier_daemon.version}"
+    except FormatterUnavailable as e:
+        print(f"Prettier unavailable, using the Python formatter: {e}")
+        return format_markdown_fallback(source), "Python fallback formatter"
+
+
+def close_prettier_daemon() -> None:
+    """
+    Stop this process's Prettier worker, called from the FastAPI lifespan hook
+    """
+    prettier_daemon.close()
+
+
+if __name__ == "__main__":
+    # Deploy-time install, e.g. a Docker build step, so requests never run npm
+    prettier_daemon.install()
+    print(f"prettier@{prettier_daemon.version} installed in {prettier_daemon.install_dir}")
@@ -0,0 +1,128 @@
+import os
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.answer_cache import normalize_question
+from app.utils.embeddings import HashingEmbedder
+
+# Routing settings, overridable from the environment
+SEMANTIC_ROUTER_THRESHOLD = float(os.getenv("SEMANTIC_ROUTER_THRESHOLD", "0.85"))
+SEMANTIC_ROUTER_TOP_K = int(os.getenv("SEMANTIC_ROUTER_TOP_K", "3"))
+SEMANTIC_INDEX_SIZE = int(os.getenv("SEMANTIC_INDEX_SIZE", "5000"))
+
+
+class SemanticRouter:
+    """
+    Remembers which tool answered past questions and, for a new question that is
+    close enough to them, returns that tool so the caller can skip the full
+    tool prompt and go straight to argument extraction.
+
+    Questions are embedded with a pluggable embedder (any object with embed(),
+    and optionally fit()) into a NumPy matrix of unit vectors, so a lookup is one
+    matrix-vector product plus a top-k partition.
+    """
+
+    def __init__(
+        self,
+        embedder=None,
+        threshold: float = SEMANTIC_ROUTER_THRESHOLD,
+        top_k: int = SEMANTIC_ROUTER_TOP_K,
+        max_entries: int = SEMANTIC_INDEX_SIZE,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.top_k = top_k
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._questions: List[str] = []
+        self._tools: List[str] = []
+        self._known = set()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+        self._fitted_size = 0
+
+    def _rebuild(self) -> None:
+        # Refit IDF on the stored questions and re-embed them; called whenever the
+        # index has doubled so the cost stays amortised O(1) per insert
+        if hasattr(self.embedder, "fit"):
+            self.embedder.fit(self._questions)
+        vectors = self.embedder.embed(self._questions)
+        capacity = max(16, 2 * len(self._questions))
+        self._matrix = np.zeros((capacity, vectors.shape[1]), dtype=np.float32)
+        self._matrix[: len(vectors)] = vectors
+        self._size = len(vectors)
+        self._fitted_size = self._size
+
+    def _search(self, question: str) -> List[Tuple[float, str]]:
+        if self._size == 0:
+            return []
+        query = self.embedder.embed([question])[0]
+        scores = self._matrix[: self._size] @ query
+        k = min(self.top_k, self._size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self._tools[i]) for i in top]
+
+    def lookup(self, question: str) -> Optional[str]:
+        """
+        Return the tool that answered similar questions, or None
+
+        A route is only returned when every neighbour above the similarity
+        threshold agrees on the same tool.
+        """
+        question = normalize_question(question)
+        neighbours = [
+            tool for score, tool in self._search(question) if score >= self.threshold
+        ]
+        if neighbours and len(set(neighbours)) == 1:
+            self.hits += 1
+            return neighbours[0]
+        self.misses += 1
+        return None
+
+    def remember(self, question: str, tool_name: str) -> None:
+        """
+        Record that a tool answered a question
+        """
+        question = normalize_question(question)
+        if question in self._known:
+            return
+
+        self._known.add(question)
+        self._questions.append(question)
+        self._tools.append(tool_name)
+
+        # Drop the oldest half once full, keeping the index bounded
+        if len(self._questions) > self.max_entries:
+            keep = self.max_entries // 2
+            self._questions = self._questions[-keep:]
+            self._tools = self._tools[-keep:]
+            self._known = set(self._questions)
+            self._rebuild()
+        elif len(self._questions) >= 2 * self._fitted_size or self._size >= len(
+            self._matrix
+        ):
+            self._rebuild()
+        else:
+            self._matrix[self._size] = self.embedder.embed([question])[0]
+            self._size += 1
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters and index size for monitoring
+        """
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "tools": dict(Counter(self._tools)),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Shared router used by get_openai_response
+semantic_router = SemanticRouter()
@@ -0,0 +1,127 @@
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Largest similarity block computed at once (rows x columns), overridable from
+# the environment. 2**24 float64 values is 128 MiB.
+SIMILARITY_BLOCK_ELEMENTS = int(os.getenv("SIMILARITY_BLOCK_ELEMENTS", str(2**24)))
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Scale each row to unit length so dot products are cosine similarities
+
+    Zero vectors are left as zeros (similarity 0 with everything) instead of
+    producing NaNs.
+    """
+    matrix = np.asarray(vectors, dtype=np.float64)
+    if matrix.ndim != 2:
+        raise ValueError("Embeddings must all have the same length")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def _select(sims: np.ndarray, k: int) -> np.ndarray:
+    # Flat indices of the k largest finite values and of everything tied with
+    # the k-th, in no particular order. Keeping the whole tie lets the caller
+    # break ties by position instead of by whatever argpartition picked.
+    flat = sims.ravel()
+    if k == 1:
+        # argmax returns the first maximum, already the lowest position
+        best = int(np.argmax(flat))
+        return np.array([best]) if np.isfinite(flat[best]) else np.array([], int)
+    if k < flat.size:
+        kth = np.partition(flat, flat.size - k)[flat.size - k]
+        candidates = np.flatnonzero(flat >= kth)
+    else:
+        candidates = np.arange(flat.size)
+    return candidates[np.isfinite(flat[candidates])]
+
+
+def top_k_pairs(
+    vectors,
+    k: int = 1,
+    block_elements: int = SIMILARITY_BLOCK_ELEMENTS,
+) -> List[Tuple[int, int, float]]:
+    """
+    Find the k most similar pairs of vectors by cosine similarity
+
+    The similarities come from matrix multiplies of the normalised embeddings.
+    Rows are processed in blocks, each multiplied against itself and every
+    later row only (the upper triangle), so memory stays within
+    block_elements values however many vectors there are.
+
+    Args:
+        vectors: n x d embeddings, one row per item
+        k: Number of pairs to return
+        block_elements: Most similarity values held at once
+
+    Returns:
+        (i, j, similarity) with i < j, best first; ties keep the order of
+        itertools.combinations
+    """
+    unit = normalize_rows(vectors)
+    n = len(unit)
+    k = min(k, n * (n - 1) // 2)
+    if k <= 0:
+        return []
+
+    rows_i = np.empty(0, dtype=np.int64)
+    rows_j = np.empty(0, dtype=np.int64)
+    scores = np.empty(0, dtype=np.float64)
+    block_rows = max(1, block_elements // n)
+    for start in range(0, n - 1, block_rows):
+        stop = min(start + block_rows, n - 1)
+        sims = unit[start:stop] @ unit[start:].T
+        # Column c is item start + c: drop the diagonal and everything below it
+        sims[np.tril_indices(stop - start, m=n - start)] = -np.inf
+
+        picked = _select(sims, k)
+        r, c = np.divmod(picked, sims.shape[1])
+        rows_i = np.concatenate([rows_i, start + r])
+        rows_j = np.concatenate([rows_j, start + c])
+        scores = np.concatenate([scores, sims.ravel()[picked]])
+
+        # Keep only the best k seen so far
+        order = np.lexsort((rows_j, rows_i, -scores))[:k]
+        rows_i, rows_j, scores = rows_i[order], rows_j[order], scores[order]
+
+    return [
+        (int(i), int(j), float(s)) for i, j, s in zip(rows_i, rows_j, scores)
+    ]
+
+
+def most_similar_pairs(
+    labels: Sequence[str], vectors, k: int = 1
+) -> List[Tuple[str, str, float]]:
+    """
+    top_k_pairs with each index replaced by its label
+    """
+    return [(labels[i], labels[j], s) for i, j, s in top_k_pairs(vectors, k)]
+
+
+def top_k_similar(query, vectors, k: int = 3) -> List[Tuple[int, float]]:
+    """
+    Rank vectors by cosine similarity to a query with one matrix-vector product
+
+    Args:
+        query: d-dimensional query embedding
+        vectors: n x d embeddings
+        k: Number of results
+
+    Returns:
+        (index, similarity) best first; ties keep the lower index first, like a
+        stable sort
+    """
+    unit = normalize_rows(vectors)
+    k = min(k, len(unit))
+    if k <= 0:
+        return []
+    scores = unit @ normalize_rows([query])[0]
+
+    # Everything tied with the k-th best is a candidate, so ties break by index
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    candidates = np.flatnonzero(scores >= kth)
+    order = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+    return [(int(i), float(scores[i])) for i in order]
@@ -0,0 +1,223 @@
+import os
+import base64
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+# Tokenizer settings, overridable from the environment
+TOKENIZER_VOCAB_URL = os.getenv(
+    "TOKENIZER_VOCAB_URL",
+    "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+)
+TOKENIZER_VOCAB_SHA256 = os.getenv(
+    "TOKENIZER_VOCAB_SHA256",
+    "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d",
+)
+TOKENIZER_CACHE_DIR = os.getenv(
+    "TOKENIZER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "iitm-api", "tokenizer"),
+)
+TOKENIZER_LRU_SIZE = int(os.getenv("TOKENIZER_LRU_SIZE", "65536"))
+
+# Pre-tokenisation pattern of o200k_base, the encoding used by gpt-4o and
+# gpt-4o-mini. Text is split into pieces with it before BPE runs on each piece.
+O200K_PATTERN = "|".join(
+    [
+        r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+        r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+        r"""\p{N}{1,3}""",
+        r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+        r"""\s*[\r\n]+""",
+        r"""\s+(?!\S)""",
+        r"""\s+""",
+    ]
+)
+
+# Chat template tokens the gpt-4o family adds: each message is wrapped as
+# <|im_start|>{role}<|im_sep|>{content}<|im_end|>, a name costs one more token,
+# and the reply is primed with <|im_start|>assistant<|im_sep|>
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_PER_REPLY = 3
+
+
+def load_tiktoken_ranks(path: str) -> Dict[bytes, int]:
+    """
+    Read a .tiktoken vocabulary: one "<base64 token> <rank>" pair per line
+    """
+    ranks = {}
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+class BPETokenizer:
+    """
+    Byte-level BPE tokenizer compatible with tiktoken encodings
+
+    Text is split with the encoding's pattern, and each piece is merged
+    bottom-up by rank. Merge results are memoised per piece in an LRU, so
+    the common words of a batch are only merged once.
+    """
+
+    def __init__(
+        self,
+        ranks: Dict[bytes, int],
+        pattern: str = O200K_PATTERN,
+        cache_size: int = TOKENIZER_LRU_SIZE,
+    ):
+        import regex
+
+        self.ranks = ranks
+        self.pattern = regex.compile(pattern)
+        self._encode_piece = lru_cache(maxsize=cache_size)(self._byte_pair_encode)
+
+    def _byte_pair_encode(self, piece: bytes) -> tuple:
+        rank = self.ranks.get(piece)
+        if rank is not None:
+            return (rank,)
+
+        ranks = self.ranks
+        # parts[i] is the start of the i-th token; merge the adjacent pair with
+        # the lowest rank until no pair is in the vocabulary
+        parts = list(range(len(piece) + 1))
+        while len(parts) > 2:
+            best_rank = None
+            best = 0
+            for i in range(len(parts) - 2):
+                pair_rank = ranks.get(piece[parts[i] : parts[i + 2]])
+                if pair_rank is not None and (
+                    best_rank is None or pair_rank < best_rank
+                ):
+                    best_rank, best = pair_rank, i
+            if best_rank is None:
+                break
+            del parts[best + 1]
+        return tuple(ranks[piece[a:b]] for a, b in zip(parts, parts[1:]))
+
+    def encode(self, text: str) -> List[int]:
+        """
+        Encode text into token ids (special tokens are treated as plain text)
+        """
+        tokens: List[int] = []
+        for piece in self.pattern.findall(text):
+            tokens.extend(self._encode_piece(piece.encode("utf-8")))
+        return tokens
+
+    def count(self, text: str) -> int:
+        return sum(
+            len(self._encode_piece(piece.encode("utf-8")))
+            for piece in self.pattern.findall(text)
+        )
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        """
+        Count tokens of many texts, sharing the merge cache between them
+        """
+        return [self.count(text) for text in texts]
+
+    def count_chat(self, messages: Sequence[Dict[str, str]]) -> int:
+        """
+        Prompt tokens a chat completion request is billed for
+
+        Args:
+            messages: Chat messages with role, content and optionally name
+
+        Returns:
+            The usage.prompt_tokens the API reports for these messages
+        """
+        total = TOKENS_PER_REPLY
+        for message in messages:
+            total += TOKENS_PER_MESSAGE
+            for key, value in message.items():
+                total += self.count(value)
+                if key == "name":
+                    total += TOKENS_PER_NAME
+        return total
+
+    def cache_info(self):
+        return self._encode_piece.cache_info()
+
+
+def _vocab_path() -> str:
+    """
+    Local copy of the vocabulary, downloaded and verified on first use
+    """
+    name = os.path.basename(TOKENIZER_VOCAB_URL)
+    path = os.path.join(TOKENIZER_CACHE_DIR, name)
+    if os.path.exists(path):
+        return path
+
+    import httpx
+
+    response = httpx.get(TOKENIZER_VOCAB_URL, timeout=60, follow_redirects=True)
+    response.raise_for_status()
+    if hashlib.sha256(response.content).hexdigest() != TOKENIZER_VOCAB_SHA256:
+        raise ValueError(f"Checksum mismatch for {TOKENIZER_VOCAB_URL}")
+
+    os.makedirs(TOKENIZER_CACHE_DIR, exist_ok=True)
+    staging = f"{path}.{os.getpid()}.tmp"
+    with open(staging, "wb") as f:
+        f.write(response.content)
+    os.replace(staging, path)
+    return path
+
+
+_tokenizer: Optional[BPETokenizer] = None
+_lock = threading.Lock()
+
+
+def get_tokenizer() -> BPETokenizer:
+    """
+    Return the shared o200k_base tokenizer, loading the vocabulary once
+
+    Raises:
+        ImportError: the regex package is not installed
+        OSError, httpx.HTTPError: the vocabulary is not cached and cannot be
+            downloaded
+    """
+    global _tokenizer
+
+    if _tokenizer is None:
+        with _lock:
+            if _tokenizer is None:
+                _tokenizer = BPETokenizer(load_tiktoken_ranks(_vocab_path()))
+    return _tokenizer
+
+
+async def _benchmark(texts: List[str]) -> None:
+    import time
+    from app.utils.functions import count_tokens
+
+    tokenizer = get_tokenizer()
+    started = time.perf_counter()
+    counts = tokenizer.count_batch(texts)
+    seconds = time.perf_counter() - started
+    print(f"local:  {sum(counts) / seconds:,.0f} tokens/s over {len(texts)} texts")
+
+    started = time.perf_counter()
+    for text in texts[:5]:
+        answer = await count_tokens(text, local=False)
+        if answer.startswith("Error"):
+            print(f"remote: {answer}")
+            return
+    seconds = (time.perf_counter() - started) / 5
+    per_text = sum(counts[:5]) / 5
+    print(
+        f"remote: {per_text / seconds:,.0f} tokens/s ({seconds * 1000:.0f} ms per call)"
+    )
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    sample = [
+        f"Question {i}: how many tokens does the OpenAI API bill for this prompt? "
+        "Count them locally instead of sending a request every time."
+        for i in range(2000)
+    ]
+    asyncio.run(_benchmark(sample))
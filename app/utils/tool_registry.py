@@ -0,0 +1,212 @@
+import inspect
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.answer_cache import record_answer_ttl
+from app.utils.executor import POOLS, run_in_pool
+
+
+class ToolArgumentError(ValueError):
+    """
+    Raised by a solver whose arguments it cannot work with, e.g. a formula or
+    question variant it does not support
+    """
+
+
+@dataclass
+class ToolHandler:
+    """
+    A registered solver together with what is needed to bind model arguments to it
+    """
+
+    name: str
+    func: Callable
+    signature: inspect.Signature
+    is_async: bool
+    # Values used when the model omits an argument that has no default in the signature
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    # Parameter that receives the uploaded file path when the model leaves it out
+    file_arg: Optional[str] = None
+    # Where the solver runs: "loop", "thread" or "process" (see app.utils.executor)
+    pool: str = "thread"
+    # Most calls of this solver allowed to run at once, None for no limit
+    max_concurrency: Optional[int] = None
+    # Seconds an answer produced by this solver may be cached, None for the
+    # answer cache's default and 0 for answers that must never be cached
+    cache_ttl: Optional[float] = None
+
+    def bind(
+        self, arguments: Dict[str, Any], file_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Map tool-call arguments onto the solver's keyword arguments
+
+        Unknown arguments are dropped, missing ones fall back to the registered
+        defaults, the uploaded file, the signature default, or None.
+        """
+        kwargs = {}
+        for param in self.signature.parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            if param.name in arguments:
+                kwargs[param.name] = arguments[param.name]
+            elif param.name in self.defaults:
+                kwargs[param.name] = self.defaults[param.name]
+            elif param.name == self.file_arg and file_path:
+                kwargs[param.name] = file_path
+            elif param.default is param.empty:
+                kwargs[param.name] = None
+        return kwargs
+
+
+# OpenAI tool schemas keyed by tool name, in registration order
+TOOL_SCHEMAS: Dict[str, Dict[str, Any]] = {}
+
+# Dispatch table of solvers keyed by tool name
+TOOL_HANDLERS: Dict[str, ToolHandler] = {}
+
+# Pre-serialised JSON array of every schema, spliced into each request body
+_tools_json: Optional[str] = None
+
+# Pre-serialised single-tool arrays, used when the tool is already known
+_tool_json: Dict[str, str] = {}
+
+
+def register_tool_schema(
+    name: str, description: str, parameters: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Register the schema of a tool the model is allowed to call
+
+    Args:
+        name: Tool name as seen by the model
+        description: Description shown to the model
+        parameters: JSON schema of the tool arguments
+
+    Returns:
+        The OpenAI tool schema
+    """
+    global _tools_json
+
+    schema = {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": parameters,
+        },
+    }
+    TOOL_SCHEMAS[name] = schema
+    _tools_json = None
+    _tool_json.pop(name, None)
+    return schema
+
+
+def register_tool(
+    description: str,
+    parameters: Dict[str, Any],
+    name: Optional[str] = None,
+    defaults: Optional[Dict[str, Any]] = None,
+    file_arg: Optional[str] = None,
+    pool: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+    cache_ttl: Optional[float] = None,
+) -> Callable:
+    """
+    Decorator that registers a solver and its schema next to its definition
+
+    Args:
+        description: Description shown to the model
+        parameters: JSON schema of the tool arguments
+        name: Tool name, defaults to the function name
+        defaults: Fallback values for arguments the model may omit
+        file_arg: Parameter that receives the uploaded file, defaults to
+            "file_path" when the solver has one
+        pool: "loop" for solvers that await network I/O, "thread" for blocking
+            I/O, "process" for CPU-bound work. Defaults to "loop" for async
+            solvers and "thread" for sync ones.
+        max_concurrency: Most calls of this solver allowed to run at once
+        cache_ttl: Seconds its answers may be cached; 0 for solvers whose
+            answers change over time (live APIs, shell commands)
+
+    Returns:
+        Decorator returning the solver unchanged
+    """
+
+    def decorator(func: Callable) -> Callable:
+        tool_name = name or func.__name__
+        signature = inspect.signature(func)
+        is_async = inspect.iscoroutinefunction(func)
+        tool_pool = pool or ("loop" if is_async else "thread")
+        if tool_pool not in POOLS:
+            raise ValueError(f"Unknown pool for {tool_name}: {tool_pool}")
+
+        register_tool_schema(tool_name, description, parameters)
+        TOOL_HANDLERS[tool_name] = ToolHandler(
+            name=tool_name,
+            func=func,
+            signature=signature,
+            is_async=is_async,
+            defaults=dict(defaults or {}),
+            file_arg=file_arg
+            or ("file_path" if "file_path" in signature.parameters else None),
+            pool=tool_pool,
+            max_concurrency=max_concurrency,
+            cache_ttl=cache_ttl,
+        )
+        return func
+
+    return decorator
+
+
+async def call_tool(
+    name: str, arguments: Dict[str, Any], file_path: Optional[str] = None
+) -> Any:
+    """
+    Dispatch a tool call to its solver
+
+    Args:
+        name: Tool name from the model's tool call
+        arguments: Decoded tool-call arguments
+        file_path: Path of the uploaded file, if any
+
+    Returns:
+        The solver's result
+    """
+    handler = TOOL_HANDLERS.get(name)
+    if handler is None:
+        return f"Function {name} is not available"
+
+    kwargs = handler.bind(arguments, file_path)
+    # The answer built from this call is cached no longer than the solver allows
+    record_answer_ttl(handler.cache_ttl)
+
+    # Blocking and CPU-bound solvers run off the event loop on their pool
+    return await run_in_pool(
+        handler.pool,
+        handler.func,
+        kwargs,
+        limit_key=handler.name,
+        limit=handler.max_concurrency,
+    )
+
+
+def get_tools_json() -> str:
+    """
+    Return the tools array as compact JSON, serialised once and reused
+    """
+    global _tools_json
+
+    if _tools_json is None:
+        _tools_json = json.dumps(list(TOOL_SCHEMAS.values()), separators=(",", ":"))
+    return _tools_json
+
+
+def get_tool_json(name: str) -> str:
+    """
+    Return a one-element tools array for the named tool as compact JSON
+    """
+    if name not in _tool_json:
+        _tool_json[name] = json.dumps([TOOL_SCHEMAS[name]], separators=(",", ":"))
+    return _tool_json[name]
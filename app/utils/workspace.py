@@ -0,0 +1,318 @@
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+import contextlib
+import contextvars
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: only this process's own workspaces are protected
+    fcntl = None
+
+# Workspace settings, overridable from the environment
+WORKSPACE_ROOT = os.getenv(
+    "WORKSPACE_ROOT", os.path.join(tempfile.gettempdir(), "iitm-api")
+)
+WORKSPACE_MAX_AGE = float(os.getenv("WORKSPACE_MAX_AGE", "3600"))
+WORKSPACE_QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_BYTES", str(2 * 1024**3)))
+WORKSPACE_SWEEP_INTERVAL = float(os.getenv("WORKSPACE_SWEEP_INTERVAL", "60"))
+
+# Workspace of the request being handled, visible to solvers running in threads
+_current_workspace: contextvars.ContextVar[Optional["RequestWorkspace"]] = (
+    contextvars.ContextVar("current_workspace", default=None)
+)
+
+# Directories of workspaces whose request is still running; the sweeper skips them
+_active: Dict[str, "RequestWorkspace"] = {}
+
+# Lock file held by a live workspace. Other worker processes share the root, so
+# the sweeper checks this lock rather than _active alone. The kernel releases
+# it when the owning process exits, leaving crashed workers' files sweepable.
+_LOCK_NAME = ".lock"
+
+
+def _hold_lock(path: str) -> Optional[int]:
+    if fcntl is None:
+        return None
+    fd = os.open(os.path.join(path, _LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    return fd
+
+
+def _is_locked(path: str) -> bool:
+    """
+    Whether a live process, this one or another, holds the workspace lock
+    """
+    if fcntl is None or not os.path.isdir(path):
+        return False
+    try:
+        fd = os.open(os.path.join(path, _LOCK_NAME), os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+class RequestWorkspace:
+    """
+    Owns every scratch file created while handling one request and removes them
+    all when the request ends, whether it succeeded, failed or was cancelled.
+
+    Use it as an async context manager, or through the request_workspace()
+    FastAPI dependency. Code running inside it can call scratch_dir() or
+    scratch_file() without having the workspace passed in.
+    """
+
+    def __init__(self, root: str = WORKSPACE_ROOT):
+        os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="req-", dir=root)
+        self._lock_fd = _hold_lock(self.path)
+        self._token = None
+
+    @classmethod
+    def attach(cls, path: str) -> "RequestWorkspace":
+        """
+        A handle on an existing workspace directory that neither locks nor
+        removes it, for code running on the request's behalf in another process
+        """
+        workspace = cls.__new__(cls)
+        workspace.path = path
+        workspace._lock_fd = None
+        workspace._token = None
+        return workspace
+
+    def mkdtemp(self, prefix: str = "tmp-") -> str:
+        """
+        Create a fresh directory inside the workspace
+        """
+        return tempfile.mkdtemp(prefix=prefix, dir=self.path)
+
+    def file_path(self, suffix: str = "", prefix: str = "tmp-") -> str:
+        """
+        Reserve a unique file path inside the workspace
+        """
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=self.path)
+        os.close(fd)
+        return path
+
+    def cleanup(self) -> None:
+        """
+        Remove the workspace and everything in it
+        """
+        _active.pop(self.path, None)
+        shutil.rmtree(self.path, ignore_errors=True)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def __aenter__(self) -> "RequestWorkspace":
+        _active[self.path] = self
+        self._token = _current_workspace.set(self)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._token is not None:
+            _current_workspace.reset(self._token)
+            self._token = None
+        # Large extracted archives can take a while to delete
+        await asyncio.to_thread(self.cleanup)
+
+
+async def request_workspace() -> AsyncIterator[RequestWorkspace]:
+    """
+    FastAPI dependency yielding a workspace that is removed after the request
+    """
+    async with RequestWorkspace() as workspace:
+        yield workspace
+
+
+def current_workspace() -> Optional[RequestWorkspace]:
+    """
+    Return the workspace of the request being handled, if any
+    """
+    return _current_workspace.get()
+
+
+@contextlib.contextmanager
+def attached_workspace(path: Optional[str]) -> Iterator[None]:
+    """
+    Make the workspace at path current inside a worker process
+
+    Context variables do not cross into process pool workers, so the request's
+    workspace directory is passed along and re-attached there. Scratch files
+    then land inside it and are removed with it, not left under WORKSPACE_ROOT.
+    """
+    if path is None:
+        yield
+        return
+    token = _current_workspace.set(RequestWorkspace.attach(path))
+    try:
+        yield
+    finally:
+        _current_workspace.reset(token)
+
+
+def scratch_dir(prefix: str = "tmp-") -> str:
+    """
+    Create a scratch directory owned by the current request
+
+    Outside a request (scripts, startup) the directory is created directly under
+    WORKSPACE_ROOT, where the sweeper removes it once it is old enough.
+
+    Args:
+        prefix: Directory name prefix
+
+    Returns:
+        Path to the new directory
+    """
+    workspace = current_workspace()
+    if workspace is not None:
+        return workspace.mkdtemp(prefix)
+    os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=WORKSPACE_ROOT)
+
+
+def scratch_file(suffix: str = "", prefix: str = "tmp-") -> str:
+    """
+    Reserve a scratch file path owned by the current request
+
+    Args:
+        suffix: File name suffix, e.g. ".png"
+        prefix: File name prefix
+
+    Returns:
+        Path to the new, empty file
+    """
+    workspace = current_workspace()
+    if workspace is not None:
+        return workspace.file_path(suffix, prefix)
+    os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=WORKSPACE_ROOT)
+    os.close(fd)
+    return path
+
+
+def _disk_usage(path: str) -> int:
+    if not os.path.isdir(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def sweep_workspaces(
+    root: str = WORKSPACE_ROOT,
+    max_age: float = WORKSPACE_MAX_AGE,
+    quota_bytes: int = WORKSPACE_QUOTA_BYTES,
+) -> dict:
+    """
+    Remove leftover scratch files under the workspace root
+
+    Entries older than max_age are removed first. If the rest still exceeds the
+    quota, the oldest entries are removed until it fits. Workspaces of requests
+    that are still running, in any worker process, are never touched.
+
+    Args:
+        root: Workspace root directory
+        max_age: Seconds after which an idle entry is removed
+        quota_bytes: Disk budget for everything under the root
+
+    Returns:
+        Dictionary with the number of entries removed and the bytes in use
+    """
+    if not os.path.isdir(root):
+        return {"removed": 0, "bytes_in_use": 0}
+
+    now = time.time()
+    removed = 0
+    entries: List[Tuple[float, int, str]] = []
+    active_bytes = 0
+
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        size = _disk_usage(path)
+        if path in _active or _is_locked(path):
+            active_bytes += size
+            continue
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        if now - mtime > max_age:
+            _remove(path)
+            removed += 1
+        else:
+            entries.append((mtime, size, path))
+
+    in_use = active_bytes + sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if in_use <= quota_bytes:
+            break
+        _remove(path)
+        removed += 1
+        in_use -= size
+
+    return {"removed": removed, "bytes_in_use": in_use}
+
+
+async def _sweep_forever(interval: float) -> None:
+    while True:
+        try:
+            await asyncio.to_thread(sweep_workspaces)
+        except Exception as e:
+            print(f"Workspace sweep failed: {e}")
+        await asyncio.sleep(interval)
+
+
+_sweeper: Optional[asyncio.Task] = None
+
+
+def start_workspace_sweeper(interval: float = WORKSPACE_SWEEP_INTERVAL) -> None:
+    """
+    Start the background sweeper, called from the FastAPI lifespan hook
+    """
+    global _sweeper
+
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.create_task(_sweep_forever(interval))
+
+
+async def stop_workspace_sweeper() -> None:
+    """
+    Stop the background sweeper
+    """
+    global _sweeper
+
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None